@@ -1,11 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from ..models.schemas import SearchRequest, SearchResponse, IngestRequest, IngestResponse, Segment
-from ..services import transcript as transcript_service
-from ..services.search import index_segments, semantic_search
-from ..services.agent import generate_answer
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from ..models.schemas import (
+    BatchSearchRequest,
+    BatchSearchResponse,
+    SearchOptions,
+    SearchRequest,
+    SearchResponse,
+    IngestRequest,
+    IngestResponse,
+    IngestJobStatus,
+    IngestSubtitlesResponse,
+)
+from ..services.jobs import IngestConflict, IngestQueueFull, get_job_manager
+from ..services.filters import SegmentFilter, build_filter
+from ..services.search import semantic_search, semantic_search_many
+from ..services.agent import generate_answer, stream_answer
+from ..services.tracing import current_timings, span
+from ..services.uploads import discard_staged, stage_subtitles
 from uuid import uuid4
+from typing import Any, AsyncIterator, Dict, List, Optional
 import urllib.parse as urlparse
+import asyncio
 import logging
+import tempfile
+
+import orjson
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -15,6 +34,39 @@ def _rid() -> str:
     return uuid4().hex[:12]
 
 
+def _filters(payload: SearchOptions) -> Optional[SegmentFilter]:
+    return build_filter(payload.video_ids, payload.t_from, payload.t_to)
+
+
+async def _search_docs(payload: SearchRequest) -> List[Dict[str, Any]]:
+    return await semantic_search(
+        payload.query,
+        k=payload.k,
+        video_id=payload.video_id,
+        mode=payload.mode,
+        weights=(payload.vector_weight, payload.keyword_weight),
+        fusion=payload.fusion,
+        rerank=payload.rerank,
+        filters=_filters(payload),
+    )
+
+
+def _segments(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Plain dicts in the `Segment` shape: search responses are serialised straight to JSON
+    # with orjson instead of building and re-validating a pydantic model per hit.
+    return [
+        {
+            "t_start": float(d.get("start_time", 0.0)),
+            "t_end": float(d.get("end_time", 0.0)),
+            "title": d.get("title"),
+            "snippet": d.get("snippet") or d.get("text", ""),
+            "score": float(d.get("score", 0.0)),
+            "rerank_score": d.get("rerank_score"),
+        }
+        for d in docs
+    ]
+
+
 @router.post("/search_timestamps", response_model=SearchResponse)
 async def search_timestamps(payload: SearchRequest):
     if not payload.query:
@@ -23,62 +75,156 @@ async def search_timestamps(payload: SearchRequest):
     logger.info(f"[{rid}] search: query='{payload.query}' video_id={payload.video_id}")
 
     try:
-        docs = await semantic_search(payload.query, k=payload.k, video_id=payload.video_id)
-        results = [
-            Segment(
-                video_id=d.get("video_id"),
-                t_start=float(d.get("start_time", 0.0)),
-                t_end=float(d.get("end_time", 0.0)),
-                title=d.get("title"),
-                snippet=d.get("snippet") or d.get("text", ""),
-                score=float(d.get("score", 0.0)),
-            )
-            for d in docs
-        ]
+        docs = await _search_docs(payload)
+        results = _segments(docs)
 
-        answer = await generate_answer(payload.query, docs)
-        resp = SearchResponse(results=results, answer=answer)
+        with span("answer"):
+            answer = await generate_answer(payload.query, docs)
         logger.info(f"[{rid}] search returned {len(results)} results")
-        return resp
+        return ORJSONResponse(
+            {"results": results, "answer": answer, "timings": current_timings() if payload.debug else None}
+        )
 
     except Exception as e:
         logger.exception(f"[{rid}] search_timestamps failed")
         raise HTTPException(status_code=500, detail=f"Search failed: {e}")
 
 
-@router.post("/ingest_video", response_model=IngestResponse)
+@router.post("/search_timestamps:batch", response_model=BatchSearchResponse)
+async def search_timestamps_batch(payload: BatchSearchRequest):
+    """Many queries with shared options: one embedding call and one store scoring pass."""
+    if not all(payload.queries):
+        raise HTTPException(status_code=400, detail="Queries must be non-empty")
+    rid = _rid()
+    logger.info(f"[{rid}] search(batch): {len(payload.queries)} queries video_id={payload.video_id}")
+
+    try:
+        doc_lists = await semantic_search_many(
+            payload.queries,
+            k=payload.k,
+            video_id=payload.video_id,
+            mode=payload.mode,
+            weights=(payload.vector_weight, payload.keyword_weight),
+            fusion=payload.fusion,
+            rerank=payload.rerank,
+            filters=_filters(payload),
+        )
+        answers: List[Any] = [None] * len(doc_lists)
+        if payload.answer:
+            with span("answer"):
+                answers = await asyncio.gather(
+                    *(generate_answer(q, docs) for q, docs in zip(payload.queries, doc_lists))
+                )
+        items = [
+            {"query": q, "results": _segments(docs), "answer": a}
+            for q, docs, a in zip(payload.queries, doc_lists, answers)
+        ]
+        logger.info(f"[{rid}] search(batch) returned {len(items)} result lists")
+        return ORJSONResponse({"items": items, "timings": current_timings() if payload.debug else None})
+
+    except Exception as e:
+        logger.exception(f"[{rid}] search_timestamps_batch failed")
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+
+@router.post("/search_timestamps/stream")
+async def search_timestamps_stream(payload: SearchRequest):
+    """
+    NDJSON stream: a `results` event with the ranked segments as soon as retrieval is done,
+    then `token` events as the answer is generated, then a final `done` event with the full
+    answer (and timings when `debug` is set).
+    """
+    if not payload.query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    rid = _rid()
+    logger.info(f"[{rid}] search(stream): query='{payload.query}' video_id={payload.video_id}")
+
+    try:
+        docs = await _search_docs(payload)
+    except Exception as e:
+        logger.exception(f"[{rid}] search_timestamps_stream failed")
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+    results = _segments(docs)
+
+    def line(event: Dict[str, Any]) -> bytes:
+        return orjson.dumps(event) + b"\n"
+
+    async def events() -> AsyncIterator[bytes]:
+        yield line({"type": "results", "results": results})
+        parts: List[str] = []
+        with span("answer"):
+            async for text in stream_answer(payload.query, docs):
+                parts.append(text)
+                yield line({"type": "token", "text": text})
+        done: Dict[str, Any] = {"type": "done", "answer": "".join(parts).strip()}
+        if payload.debug:
+            done["timings"] = current_timings()
+        yield line(done)
+        logger.info(f"[{rid}] search(stream) returned {len(results)} results")
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _video_id_from_url(video_url: str) -> str:
+    parsed = urlparse.urlparse(video_url)
+    qs = urlparse.parse_qs(parsed.query)
+    return qs.get("v", [None])[0] or parsed.path.split("/")[-1] or video_url
+
+
+@router.post("/ingest_video", response_model=IngestResponse, status_code=202)
 async def ingest_video(payload: IngestRequest):
     if not payload.video_url:
         raise HTTPException(status_code=400, detail="video_url is required")
     rid = _rid()
     logger.info(f"[{rid}] ingest_video url={payload.video_url}")
 
+    video_id = _video_id_from_url(str(payload.video_url))
+    title = f"YouTube {video_id}"
     try:
-        # Try YouTube transcript first
-        try:
-            raw_segments = transcript_service.load_youtube_transcript(str(payload.video_url))
-            logger.info(f"[{rid}] loaded YouTube transcript")
-        except Exception as e:
-            logger.warning(f"[{rid}] transcript not available, using Whisper fallback: {e}")
-            raw_segments = transcript_service.load_whisper_transcript(str(payload.video_url))
-
-        # Normalize format
-        if raw_segments and isinstance(raw_segments[0], dict) and "text" in raw_segments[0]:
-            segments = raw_segments
-        else:
-            segments = transcript_service.segment_transcript(raw_segments)
-
-        # Parse video ID
-        parsed = urlparse.urlparse(str(payload.video_url))
-        qs = urlparse.parse_qs(parsed.query)
-        video_id = qs.get("v", [None])[0] or parsed.path.split("/")[-1] or str(payload.video_url)
-        title = f"YouTube {video_id}"
-
-        # Index in vector store
-        await index_segments(video_id, title, segments)
-        logger.info(f"[{rid}] indexed {len(segments)} segments for {video_id}")
-        return IngestResponse(video_id=video_id)
+        job = get_job_manager().submit(video_id, str(payload.video_url), title)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Ingest queue is full: {e}")
+    logger.info(f"[{rid}] ingest job {job.job_id} {job.status} for {video_id}")
+    return IngestResponse(video_id=video_id, job_id=job.job_id, status=job.status)
 
-    except Exception as e:
-        logger.exception(f"[{rid}] ingest_video failed")
-        raise HTTPException(status_code=400, detail=f"Failed to ingest video: {e}")
+
+@router.post("/ingest_subtitles", response_model=IngestSubtitlesResponse, status_code=202)
+async def ingest_subtitles(files: List[UploadFile] = File(...)):
+    """
+    Bulk ingest of .vtt/.srt caption files, or .zip/.tar archives of them (e.g. a whole course).
+    Each file becomes a video whose id is its path without the extension; files are parsed on
+    the ingest process pool and all their segments share embedding batches. Videos with an
+    ingest already in flight are skipped (409 when that is all of them).
+    """
+    rid = _rid()
+    logger.info(f"[{rid}] ingest_subtitles files={len(files)}")
+
+    workdir = tempfile.mkdtemp(prefix="subtitles-")
+    submitted = False
+    try:
+        staged = await asyncio.to_thread(stage_subtitles, [(f.filename or "", f.file) for f in files], workdir)
+        job, skipped = get_job_manager().submit_subtitles(staged, workdir)
+        submitted = True  # the job owns workdir from here and removes it when it finishes
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IngestConflict as e:
+        raise HTTPException(status_code=409, detail=f"Ingest already in progress: {e}")
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Ingest queue is full: {e}")
+    finally:
+        if not submitted:
+            discard_staged(workdir)
+    logger.info(f"[{rid}] ingest job {job.job_id} {job.status} for {len(job.videos)} caption files")
+    return IngestSubtitlesResponse(job_id=job.job_id, status=job.status, videos=job.videos, skipped=skipped)
+
+
+@router.get("/ingest_jobs/{job_id}", response_model=IngestJobStatus)
+async def ingest_job_status(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job")
+    return IngestJobStatus(**{k: v for k, v in job.to_dict().items() if k in IngestJobStatus.model_fields})
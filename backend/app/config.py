@@ -8,6 +8,9 @@ class Settings(BaseSettings):
     # environment
     ENV: str = Field(default="dev")
 
+    # Emit a Server-Timing header with per-stage latencies
+    SERVER_TIMING: bool = Field(default=True)
+
     # CORS
     CORS_ALLOW_ORIGINS: List[str] = Field(
         default=["http://localhost:5173", "http://127.0.0.1:5173"]
@@ -17,6 +20,13 @@ class Settings(BaseSettings):
     MONGODB_URI: str = Field(default="mongodb://localhost:27017")
     MONGODB_DB: str = Field(default="lecture_navigator")
     MONGODB_COLLECTION: str = Field(default="segments")
+    MONGODB_MAX_POOL_SIZE: int = Field(default=50)
+    MONGODB_MIN_POOL_SIZE: int = Field(default=0)
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = Field(default=3000)
+    MONGODB_CONNECT_TIMEOUT_MS: int = Field(default=3000)
+    MONGODB_SOCKET_TIMEOUT_MS: int = Field(default=20000)
+    # docs per cursor batch / scoring block in the cosine fallback scan
+    MONGODB_SCAN_BATCH_SIZE: int = Field(default=2000)
 
     # API Keys
     OPENAI_API_KEY: str | None = None
@@ -24,8 +34,107 @@ class Settings(BaseSettings):
 
     # Models
     EMBEDDING_MODEL: str = Field(default="sentence-transformers/all-MiniLM-L6-v2")
+    # how MongoStore persists embeddings: "float32" | "int8" (binData vectors) | "list" (legacy doubles)
+    EMBEDDING_STORAGE: str = Field(default="float32")
     LLM_MODEL: str = Field(default="gpt-4o-mini")
 
+    # Shared LLM client: keep-alive pool size, in-flight request cap and per-request timeout
+    LLM_MAX_CONNECTIONS: int = Field(default=20)
+    LLM_MAX_CONCURRENCY: int = Field(default=8)
+    LLM_TIMEOUT_S: float = Field(default=30.0)
+    # Answer latency budget: past this the snippet answer is returned while the LLM call
+    # finishes in the background (and fills the answer cache). 0 waits for the LLM.
+    ANSWER_DEADLINE_MS: float = Field(default=0.0)
+    # Circuit breaker: after this many consecutive LLM timeouts/errors skip the LLM for
+    # LLM_BREAKER_COOLDOWN_S, then let one trial call through. 0 disables the breaker.
+    LLM_BREAKER_THRESHOLD: int = Field(default=5)
+    LLM_BREAKER_COOLDOWN_S: float = Field(default=30.0)
+
+    # Query embedding micro-batching
+    EMBEDDING_BATCH_WINDOW_MS: float = Field(default=3.0)
+    EMBEDDING_MAX_BATCH: int = Field(default=32)
+    EMBEDDING_WORKERS: int = Field(default=1)
+    # document batches (ingest) run on their own worker(s) so queries never wait behind them
+    INGEST_EMBEDDING_WORKERS: int = Field(default=1)
+
+    # Content-addressed embedding cache (SQLite file + in-memory LRU; empty path disables disk)
+    EMBEDDING_CACHE_PATH: str = Field(default=".cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = Field(default=20000)
+
+    # Whisper transcription (WHISPER_MODEL empty = pick by file size; WHISPER_DEVICE empty = let
+    # Whisper choose, e.g. CUDA when present; WHISPER_WORKERS 0 = this ingest worker's share of
+    # the cores, and on a GPU chunks are transcribed serially by one model)
+    WHISPER_MODEL: str = Field(default="")
+    WHISPER_DEVICE: str = Field(default="")
+    WHISPER_MODEL_CACHE_SIZE: int = Field(default=2)
+    WHISPER_CHUNK_S: float = Field(default=300.0)
+    WHISPER_WORKERS: int = Field(default=0)
+
+    # Streaming ingest: segments are embedded and written in batches of this size
+    INGEST_BATCH_SIZE: int = Field(default=256)
+
+    # Transcript segmentation: "window" (overlapping windows) or "hierarchical" (non-overlapping
+    # leaves of SEGMENT_LEVELS[0] seconds grouped into sections of the following lengths)
+    SEGMENT_MODE: str = Field(default="window")
+    SEGMENT_LEVELS: List[float] = Field(default=[15.0, 60.0, 300.0])
+
+    # Background ingest jobs ("process" runs transcript fetch/Whisper in a process pool)
+    INGEST_EXECUTOR: str = Field(default="process")
+    INGEST_WORKERS: int = Field(default=2)
+    INGEST_MAX_CONCURRENCY: int = Field(default=2)
+    INGEST_MAX_PENDING: int = Field(default=100)
+    INGEST_JOB_HISTORY: int = Field(default=500)
+
+    # Bulk subtitle uploads: max caption files per request and max total bytes once extracted
+    SUBTITLE_MAX_FILES: int = Field(default=5000)
+    SUBTITLE_MAX_BYTES: int = Field(default=512 * 1024 * 1024)
+
+    # Atlas $vectorSearch: index name and numCandidates = clamp(k * FACTOR, MIN, 10000)
+    VECTOR_SEARCH_INDEX: str = Field(default="vector_index")
+    VECTOR_SEARCH_CANDIDATES_FACTOR: int = Field(default=10)
+    VECTOR_SEARCH_MIN_CANDIDATES: int = Field(default=100)
+
+    # Local ANN index for stores without Atlas $vectorSearch ("none" | "ivf")
+    ANN_BACKEND: str = Field(default="none")
+    ANN_NLIST: int = Field(default=0)
+    ANN_NPROBE: int = Field(default=8)
+    ANN_TRAIN_MIN: int = Field(default=2048)
+    ANN_INDEX_PATH: str = Field(default=".cache/ann_ivf.pkl")
+    # Minimum seconds between ANN snapshots after ingests (always written on shutdown)
+    ANN_PERSIST_INTERVAL_S: float = Field(default=300.0)
+
+    # Hybrid retrieval (vector + BM25 fused with reciprocal-rank fusion)
+    RRF_K: int = Field(default=60)
+    # Vector mode: below this top similarity, BM25 candidates are fused in (lexical rescue)
+    VECTOR_WEAK_SCORE: float = Field(default=0.2)
+
+    # Cross-encoder reranking (opt-in per request or globally)
+    RERANK_ENABLED: bool = Field(default=False)
+    RERANK_MODEL: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = Field(default=20)
+    RERANK_BATCH_SIZE: int = Field(default=32)
+    RERANK_DEADLINE_MS: float = Field(default=250.0)
+    RERANK_WORKERS: int = Field(default=1)
+    RERANK_CACHE_SIZE: int = Field(default=20000)
+    RERANK_CACHE_TTL_S: float = Field(default=3600.0)
+
+    # Coarse-to-fine search of hierarchically segmented videos (SEGMENT_MODE=hierarchical only):
+    # sections kept per level (0 = score every leaf), max leaves per video outline, and how
+    # many outlines stay resident
+    HIERARCHY_BEAM: int = Field(default=2)
+    HIERARCHY_MAX_LEAVES: int = Field(default=20000)
+    HIERARCHY_CACHE_SIZE: int = Field(default=64)
+    HIERARCHY_CACHE_TTL_S: float = Field(default=3600.0)
+
+    # BM25 keyword index (rebuilt from the store at startup)
+    LEXICAL_WARM_LIMIT: int = Field(default=200000)
+
+    # Result caches (size in entries, TTL in seconds; size 0 disables)
+    SEARCH_CACHE_SIZE: int = Field(default=1024)
+    SEARCH_CACHE_TTL_S: float = Field(default=300.0)
+    ANSWER_CACHE_SIZE: int = Field(default=1024)
+    ANSWER_CACHE_TTL_S: float = Field(default=600.0)
+
     # pydantic-settings v2 config
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,11 +1,29 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from loguru import logger
 import time
 
 from .api.routes import router as api_router
 from .config import settings
-from .services.metrics import inc_counter, observe_histogram, snapshot
+from .services.agent import close_llm_client
+from .services.db import close_store, init_store
+from .services.jobs import get_job_manager
+from .services.search import warm_lexical_index
+from .services.metrics import inc_counter, observe_histogram, prometheus_text, snapshot
+from .services.tracing import end_trace, start_trace, current_trace
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled store per process: connect + create indexes once at startup
+    await init_store()
+    await warm_lexical_index()
+    yield
+    await get_job_manager().shutdown()
+    await close_llm_client()
+    await close_store()
 
 
 def create_app() -> FastAPI:
@@ -16,6 +34,8 @@ def create_app() -> FastAPI:
         openapi_url="/openapi.json",
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     # CORS middleware
@@ -31,10 +51,17 @@ def create_app() -> FastAPI:
     @app.middleware("http")
     async def add_timing(request, call_next):
         start = time.perf_counter()
-        response = await call_next(request)
+        token = start_trace()
+        try:
+            trace = current_trace()
+            response = await call_next(request)
+        finally:
+            end_trace(token)
         dur_ms = (time.perf_counter() - start) * 1000
         logger.info(f"{request.method} {request.url.path} -> {response.status_code} {dur_ms:.1f}ms")
         response.headers["X-Response-Time-ms"] = f"{dur_ms:.1f}"
+        if settings.SERVER_TIMING and trace is not None and trace.timings:
+            response.headers["Server-Timing"] = trace.server_timing(dur_ms)
         inc_counter(f"requests_total:{request.url.path}")
         observe_histogram(f"latency_ms:{request.url.path}", dur_ms)
         return response
@@ -47,9 +74,11 @@ def create_app() -> FastAPI:
     async def health():
         return {"status": "ok"}
 
-    # Metrics endpoint
+    # Metrics endpoint (JSON by default; Prometheus text with ?format=prometheus or Accept: text/plain)
     @app.get("/metrics")
-    async def metrics():
+    async def metrics(request: Request, format: str | None = None):
+        if format == "prometheus" or (format is None and "text/plain" in request.headers.get("accept", "")):
+            return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
         return snapshot()
 
     return app
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, AnyUrl, Field
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 
 class Segment(BaseModel):
@@ -8,17 +8,49 @@ class Segment(BaseModel):
     title: Optional[str] = None
     snippet: str
     score: Optional[float] = None
+    rerank_score: Optional[float] = Field(default=None, description="Cross-encoder logit, when reranked")
 
 
-class SearchRequest(BaseModel):
-    query: str
+class SearchOptions(BaseModel):
     k: int = 3
     video_id: Optional[str] = None
+    video_ids: Optional[List[str]] = Field(default=None, description="Only search these videos")
+    t_from: Optional[float] = Field(default=None, ge=0.0, description="Only segments ending at/after this time (s)")
+    t_to: Optional[float] = Field(default=None, ge=0.0, description="Only segments starting at/before this time (s)")
+    mode: Literal["vector", "hybrid"] = Field(
+        default="vector", description="Retrieval mode; hybrid scores are fusion values, not similarities"
+    )
+    fusion: Literal["rrf", "score"] = Field(default="rrf", description="How hybrid rankings are fused")
+    vector_weight: float = Field(default=1.0, ge=0.0, description="Weight of the vector ranking in fusion")
+    keyword_weight: float = Field(default=1.0, ge=0.0, description="Weight of the BM25 ranking in fusion")
+    rerank: Optional[bool] = Field(default=None, description="Cross-encoder rerank (defaults to server setting)")
+    debug: bool = Field(default=False, description="Include per-stage timings (ms) in the response")
+
+
+class SearchRequest(SearchOptions):
+    query: str
 
 
 class SearchResponse(BaseModel):
     results: List[Segment]
     answer: str
+    timings: Optional[Dict[str, float]] = None
+
+
+class BatchSearchRequest(SearchOptions):
+    queries: List[str] = Field(..., min_length=1, max_length=512)
+    answer: bool = Field(default=False, description="Also generate an answer per query")
+
+
+class BatchSearchItem(BaseModel):
+    query: str
+    results: List[Segment]
+    answer: Optional[str] = None
+
+
+class BatchSearchResponse(BaseModel):
+    items: List[BatchSearchItem]
+    timings: Optional[Dict[str, float]] = None
 
 
 class IngestRequest(BaseModel):
@@ -27,6 +59,28 @@ class IngestRequest(BaseModel):
 
 class IngestResponse(BaseModel):
     video_id: str
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+
+
+class IngestSubtitlesResponse(BaseModel):
+    job_id: str
+    status: str
+    videos: List[str] = Field(..., description="Video ids derived from the caption file names")
+    skipped: List[str] = Field(default_factory=list, description="Videos left out: already being ingested")
+
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    video_id: str
+    status: str = Field(..., description="queued | running | done | failed")
+    stage: str = Field(..., description="queued | transcript | indexing | done")
+    segments_total: int = 0
+    segments_indexed: int = 0
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+    videos: List[str] = Field(default_factory=list, description="Videos of a bulk subtitle job")
 
 
 
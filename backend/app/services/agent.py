@@ -1,12 +1,21 @@
 from __future__ import annotations
 
-from typing import List, Dict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+import asyncio
+import time
+
+import httpx
 from loguru import logger
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 
 from ..config import settings  # ✅ import your .env settings
+from .cache import TTLCache, normalize_query
+from .embedding_cache import text_hash
+from .metrics import inc_counter
+from .tracing import span
 
 # Try import provider-specific LLM wrapper (OpenAI)
 try:
@@ -23,6 +32,153 @@ PROMPT = ChatPromptTemplate.from_messages([
 ])
 
 
+# LLM answers keyed by (normalized question, context segments); avoids re-asking the LLM
+_answer_cache = TTLCache("answer", settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL_S)
+
+
+def _answer_key(question: str, results: List[Dict]) -> tuple:
+    # the text hash keeps a re-ingest that edits a window in place from serving a stale answer
+    ctx = tuple(
+        (r.get("video_id"), r.get("start_time"), r.get("end_time"), text_hash(r.get("text") or ""))
+        for r in results[:3]
+    )
+    return (normalize_query(question), ctx)
+
+
+class LLMClient:
+    """
+    Process-wide chat model. One ChatOpenAI (and one keep-alive httpx pool) is reused across
+    requests instead of being rebuilt per search; a semaphore caps in-flight LLM calls.
+    Both the pool and the semaphore are loop-bound, so they are rebuilt if the loop changes.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._llm = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    @property
+    def available(self) -> bool:
+        return bool(settings.OPENAI_API_KEY) and ChatOpenAI is not None and settings.LLM_MODEL.lower() != "none"
+
+    async def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        stale, stale_loop = self._http, self._loop
+        self._loop = loop
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        )
+        self._http = httpx.AsyncClient(limits=limits, timeout=settings.LLM_TIMEOUT_S)
+        self._llm = ChatOpenAI(
+            model=settings.LLM_MODEL,
+            temperature=0.2,
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.LLM_TIMEOUT_S,
+            http_async_client=self._http,
+        )
+        self._sem = asyncio.Semaphore(max(1, settings.LLM_MAX_CONCURRENCY))
+        if stale is not None:
+            await self._close_stale(stale, stale_loop)
+
+    @staticmethod
+    async def _close_stale(http: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close the pool of a previous loop: on that loop while it still runs, else here."""
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(http.aclose(), loop)
+            return
+        try:
+            await http.aclose()
+        except Exception as e:  # connections whose loop is already closed
+            logger.debug(f"Closing stale LLM HTTP pool failed: {e}")
+
+    @asynccontextmanager
+    async def chain(self):
+        """Yield the prompt|llm chain while holding a concurrency slot."""
+        await self._bind_loop()
+        assert self._sem is not None
+        async with self._sem:
+            yield PROMPT | self._llm
+
+    async def aclose(self) -> None:
+        http, self._http, self._llm, self._loop = self._http, None, None, None
+        if http is not None:
+            await http.aclose()
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. Opens after `threshold` failures in a row, rejects calls for
+    `cooldown_s`, then lets a single trial call through (half-open): success closes it,
+    failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown_s: float) -> None:
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self.threshold <= 0:
+            return True
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Give back a half-open trial that ended without a verdict (e.g. the caller was cancelled)."""
+        self._trial = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.threshold > 0 and (self._trial or self.failures >= self.threshold):
+            if self.opened_at is None:
+                inc_counter("llm_breaker_trips")
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+
+_breaker = CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_COOLDOWN_S)
+# LLM calls that outlived the answer deadline; referenced so they can finish and fill the cache
+_background: Set[asyncio.Task] = set()
+
+_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
+
+
+async def close_llm_client() -> None:
+    if _client is not None:
+        await _client.aclose()
+
+
 def build_context(results: List[Dict]) -> str:
     """
     Build a compact text context from the top results for the LLM.
@@ -38,54 +194,146 @@ def build_context(results: List[Dict]) -> str:
     return "\n".join(lines)
 
 
+def snippet_answer(results: List[Dict]) -> str:
+    """First sentence of the top result plus its timestamp; used when no LLM answer is available."""
+    if not results:
+        return "I couldn't find a relevant timestamp in the provided lectures."
+    snippet = results[0].get("text", "")
+    first_sent = snippet.split(". ")[0].strip()[:200]
+    ts = results[0].get("start_time")
+    ts_str = f" [{int(ts)}s]" if ts is not None else ""
+    return f"{first_sent}{ts_str}"
+
+
+async def _llm_answer(client: LLMClient, question: str, results: List[Dict], key: tuple) -> str:
+    context = build_context(results)
+    async with client.chain() as chain:
+        with span("llm"):
+            out = await chain.ainvoke(
+                {"question": question, "context": context},
+                config=RunnableConfig(max_concurrency=1),
+            )
+
+    content = getattr(out, "content", None) or (out if isinstance(out, str) else str(out))
+    logger.info("✅ Answer generated using OpenAI LLM.")
+    answer = content.strip()
+    _answer_cache.set(key, answer)
+    return answer
+
+
+def _forget(task: asyncio.Task) -> None:
+    # a call that outlived the deadline reports its own verdict: slow but healthy is no failure
+    _background.discard(task)
+    if task.cancelled():
+        _breaker.release()
+    elif task.exception() is not None:
+        logger.warning(f"❌ Background LLM call failed after deadline. error={task.exception()}")
+        inc_counter("llm_errors")
+        _breaker.record_failure()
+    else:
+        _breaker.record_success()
+
+
 async def generate_answer(question: str, results: List[Dict]) -> str:
     """
     Generate a concise one-sentence answer from `results` as context.
     Uses OpenAI if API key is configured, else falls back to snippet-based answer.
+    With ANSWER_DEADLINE_MS set, the snippet answer is returned if the LLM has not answered
+    in time; the LLM call keeps running and its answer is cached for the next identical query.
     """
+    fallback = snippet_answer(results)
     if not results:
-        return "I couldn't find a relevant timestamp in the provided lectures."
-
-    context = build_context(results)
+        return fallback
 
+    client = get_llm_client()
     # Fallback if no OpenAI key is configured
-    if not settings.OPENAI_API_KEY or ChatOpenAI is None or settings.LLM_MODEL.lower() == "none":
-        snippet = results[0].get("text", "")
-        first_sent = snippet.split(". ")[0].strip()[:200]
-        ts = results[0].get("start_time")
-        ts_str = f" [{int(ts)}s]" if ts is not None else ""
+    if not client.available:
         logger.info("⚠️ Falling back to snippet answer (no LLM configured).")
-        return f"{first_sent}{ts_str}"
+        return fallback
 
-    try:
-        # ✅ Pass API key + model from settings
-        llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
-            temperature=0.2,
-            api_key=settings.OPENAI_API_KEY,
-        )
-        chain = PROMPT | llm
+    key = _answer_key(question, results)
+    cached = _answer_cache.get(key)
+    if cached is not None:
+        return cached
 
-        if hasattr(chain, "ainvoke"):
-            out = await chain.ainvoke(
-                {"question": question, "context": context},
-                config=RunnableConfig(max_concurrency=1),
-            )
-        else:
-            out = chain.invoke(
-                {"question": question, "context": context},
-                config=RunnableConfig(max_concurrency=1),
-            )
+    if not _breaker.allow():
+        inc_counter("llm_breaker_skips")
+        return fallback
 
-        content = getattr(out, "content", None) or (out if isinstance(out, str) else str(out))
-        logger.info("✅ Answer generated using OpenAI LLM.")
-        return content.strip()
+    task = asyncio.ensure_future(_llm_answer(client, question, results, key))
+    deadline_ms = settings.ANSWER_DEADLINE_MS
+    try:
+        if deadline_ms > 0:
+            await asyncio.wait({task}, timeout=deadline_ms / 1000.0)
+            if not task.done():
+                logger.warning(f"⏱️ LLM answer exceeded {deadline_ms:.0f}ms, returning snippet answer")
+                inc_counter("llm_timeouts")
+                _background.add(task)
+                task.add_done_callback(_forget)
+                return fallback
+        answer = await task
+        _breaker.record_success()
+        return answer
 
+    except asyncio.CancelledError:
+        task.cancel()
+        _breaker.release()
+        raise
     except Exception as e:
         logger.warning(f"❌ LLM call failed, using fallback snippet. error={e}")
-        snippet = results[0].get("text", "")
-        first_sent = snippet.split(". ")[0].strip()[:200]
-        ts = results[0].get("start_time")
-        ts_str = f" [{int(ts)}s]" if ts is not None else ""
-        return f"{first_sent}{ts_str}"
+        inc_counter("llm_errors")
+        _breaker.record_failure()
+        return fallback
+
+
+async def stream_answer(question: str, results: List[Dict]) -> AsyncIterator[str]:
+    """
+    Like generate_answer, but yields the answer incrementally as the LLM produces tokens.
+    Cached and snippet answers are yielded as a single chunk. If the LLM fails before
+    producing anything the snippet answer is yielded instead.
+    """
+    client = get_llm_client()
+    if not results or not client.available:
+        yield snippet_answer(results)
+        return
 
+    key = _answer_key(question, results)
+    cached = _answer_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    if not _breaker.allow():
+        inc_counter("llm_breaker_skips")
+        yield snippet_answer(results)
+        return
+
+    parts: List[str] = []
+    settled = False
+    try:
+        context = build_context(results)
+        async with client.chain() as chain:
+            with span("llm"):
+                async for chunk in chain.astream(
+                    {"question": question, "context": context},
+                    config=RunnableConfig(max_concurrency=1),
+                ):
+                    text = getattr(chunk, "content", None) or (chunk if isinstance(chunk, str) else "")
+                    if text:
+                        parts.append(text)
+                        yield text
+    except Exception as e:
+        logger.warning(f"❌ LLM stream failed after {len(parts)} chunks. error={e}")
+        inc_counter("llm_errors")
+        _breaker.record_failure()
+        settled = True
+        if not parts:
+            yield snippet_answer(results)
+        return
+    finally:
+        # client went away mid-stream (GeneratorExit / cancellation): no verdict on the LLM
+        if not settled:
+            _breaker.release()
+    _breaker.record_success()
+    if parts:
+        _answer_cache.set(key, "".join(parts).strip())
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+import os
+import pickle
+import threading
+
+import numpy as np
+from loguru import logger
+
+from ..config import settings
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _kmeans(data: np.ndarray, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) returning L2-normalised centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = ~sums.any(axis=1)
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class _Cell:
+    """One inverted list: vectors plus parallel ids and video codes, with cheap appends."""
+
+    def __init__(self, dim: int) -> None:
+        self.vecs = np.zeros((0, dim), dtype=np.float32)
+        self.codes = np.zeros(0, dtype=np.int32)
+        self.ids: List[Hashable] = []
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, vecs: np.ndarray, codes: np.ndarray, ids: Sequence[Hashable]) -> None:
+        self._pending.append((vecs, codes))
+        self.ids.extend(ids)
+
+    def consolidate(self) -> None:
+        if self._pending:
+            self.vecs = np.concatenate([self.vecs] + [v for v, _ in self._pending])
+            self.codes = np.concatenate([self.codes] + [c for _, c in self._pending])
+            self._pending = []
+
+    def drop_ids(self, ids: Set[Hashable]) -> None:
+        self.consolidate()
+        keep = np.fromiter((i not in ids for i in self.ids), dtype=bool, count=len(self.ids))
+        self.vecs = self.vecs[keep]
+        self.codes = self.codes[keep]
+        self.ids = [i for i, k in zip(self.ids, keep) if k]
+
+    def drop_code(self, code: int) -> None:
+        self.consolidate()
+        keep = self.codes != code
+        self.vecs = self.vecs[keep]
+        self.codes = self.codes[keep]
+        self.ids = [i for i, k in zip(self.ids, keep) if k]
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index for cosine similarity, in NumPy.
+    Vectors are bucketed by their nearest k-means centroid; a query scores the centroids and
+    only scans the `nprobe` best lists, so cost is ~nprobe/nlist of a full scan. Until
+    `train_min` vectors have been added the index is a single flat list (exact search).
+    Per-video searches only consider lists that actually hold that video.
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, train_min: int = 2048) -> None:
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self.dim: Optional[int] = None
+        self.centroids: Optional[np.ndarray] = None
+        self._cells: List[_Cell] = []
+        self._video_codes: Dict[str, int] = {}
+        self._video_cells: Dict[str, Set[int]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _code(self, video_id: str) -> int:
+        return self._video_codes.setdefault(video_id, len(self._video_codes))
+
+    def add(self, video_id: str, ids: Sequence[Hashable], vectors: Any) -> None:
+        vecs = np.asarray(vectors, dtype=np.float32)
+        if len(ids) == 0:
+            return
+        vecs = _normalize(vecs.reshape(len(ids), -1))
+        with self._lock:
+            if self.dim is None:
+                self.dim = vecs.shape[1]
+                self._cells = [_Cell(self.dim)]
+            elif vecs.shape[1] != self.dim:
+                raise ValueError(f"ANN dimension mismatch: index={self.dim} got={vecs.shape[1]}")
+            self._insert(video_id, list(ids), vecs)
+            if not self.trained and self._size >= self.train_min:
+                self._train()
+
+    def _insert(self, video_id: str, ids: List[Hashable], vecs: np.ndarray) -> None:
+        code = self._code(video_id)
+        codes = np.full(len(ids), code, dtype=np.int32)
+        cells = self._video_cells.setdefault(video_id, set())
+        if self.centroids is None:
+            self._cells[0].add(vecs, codes, ids)
+            cells.add(0)
+        else:
+            assign = np.argmax(vecs @ self.centroids.T, axis=1)
+            for c in np.unique(assign):
+                sel = assign == c
+                self._cells[int(c)].add(vecs[sel], codes[sel], [i for i, s in zip(ids, sel) if s])
+                cells.add(int(c))
+        self._size += len(ids)
+
+    def _train(self) -> None:
+        flat = self._cells[0]
+        flat.consolidate()
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(flat))))
+        nlist = min(nlist, len(flat))
+        logger.info(f"Training IVF index: {len(flat)} vectors -> {nlist} lists")
+        self.centroids = _kmeans(flat.vecs, nlist)
+        names = {code: vid for vid, code in self._video_codes.items()}
+        vecs, codes, ids = flat.vecs, flat.codes, flat.ids
+        self._cells = [_Cell(self.dim or vecs.shape[1]) for _ in range(nlist)]
+        self._video_cells = {}
+        self._size = 0
+        for code in np.unique(codes):
+            sel = codes == code
+            self._insert(names[int(code)], [i for i, s in zip(ids, sel) if s], vecs[sel])
+
+    def remove_video(self, video_id: str) -> None:
+        with self._lock:
+            code = self._video_codes.get(video_id)
+            for c in self._video_cells.pop(video_id, set()):
+                cell = self._cells[c]
+                before = len(cell)
+                cell.drop_code(code)
+                self._size -= before - len(cell)
+
+    def remove_ids(self, video_id: str, ids: Sequence[Hashable]) -> None:
+        drop = set(ids)
+        with self._lock:
+            for c in self._video_cells.get(video_id, set()):
+                cell = self._cells[c]
+                before = len(cell)
+                cell.drop_ids(drop)
+                self._size -= before - len(cell)
+
+    def search(
+        self,
+        query: Any,
+        k: int,
+        video_id: Optional[str] = None,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[Hashable, float]]:
+        """Return up to k (id, cosine score) pairs, best first."""
+        q = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if k <= 0 or self._size == 0 or q.shape != (self.dim,):
+                return []
+            q = q / (np.linalg.norm(q) or 1e-9)
+            if video_id is not None:
+                if video_id not in self._video_cells:
+                    return []
+                candidates = sorted(self._video_cells[video_id])
+                code = self._video_codes[video_id]
+            else:
+                candidates = list(range(len(self._cells)))
+                code = None
+            probe = max(1, nprobe or self.nprobe)
+            if self.centroids is not None and len(candidates) > probe:
+                cs = self.centroids[candidates] @ q
+                best = np.argpartition(-cs, probe - 1)[:probe]
+                candidates = [candidates[int(i)] for i in best]
+
+            scores: List[np.ndarray] = []
+            ids: List[Hashable] = []
+            for c in candidates:
+                cell = self._cells[c]
+                cell.consolidate()
+                if not len(cell):
+                    continue
+                sc = cell.vecs @ q
+                if code is not None:
+                    sc = np.where(cell.codes == code, sc, -np.inf)
+                scores.append(sc)
+                ids.extend(cell.ids)
+        if not scores:
+            return []
+        allsc = np.concatenate(scores)
+        kk = min(k, len(allsc))
+        top = np.argpartition(-allsc, kk - 1)[:kk]
+        top = top[np.argsort(-allsc[top], kind="stable")]
+        return [(ids[int(i)], float(allsc[i])) for i in top if np.isfinite(allsc[i])]
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            for cell in self._cells:
+                cell.consolidate()
+            state = {
+                "nlist": self.nlist,
+                "nprobe": self.nprobe,
+                "train_min": self.train_min,
+                "dim": self.dim,
+                "centroids": self.centroids,
+                "cells": [(c.vecs, c.codes, c.ids) for c in self._cells],
+                "video_codes": self._video_codes,
+                "video_cells": self._video_cells,
+                "size": self._size,
+            }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        idx = cls(nlist=state["nlist"], nprobe=state["nprobe"], train_min=state["train_min"])
+        idx.dim = state["dim"]
+        idx.centroids = state["centroids"]
+        for vecs, codes, ids in state["cells"]:
+            cell = _Cell(vecs.shape[1])
+            cell.vecs, cell.codes, cell.ids = vecs, codes, list(ids)
+            idx._cells.append(cell)
+        idx._video_codes = state["video_codes"]
+        idx._video_cells = state["video_cells"]
+        idx._size = state["size"]
+        return idx
+
+
+def create_ann_index() -> Optional[IVFIndex]:
+    """Build the configured local ANN index (None when ANN_BACKEND is "none")."""
+    if settings.ANN_BACKEND == "ivf":
+        return IVFIndex(nlist=settings.ANN_NLIST, nprobe=settings.ANN_NPROBE, train_min=settings.ANN_TRAIN_MIN)
+    return None
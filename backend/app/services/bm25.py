@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+import re
+import threading
+
+from .filters import SegmentFilter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how in is it its of on or that the this to was what "
+    "when where which who why with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental inverted index with Okapi BM25 scoring.
+    Postings map term -> {doc_id: term frequency}; a query only walks the postings of its
+    own terms, so cost scales with matches rather than corpus size.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._docs: Dict[int, Tuple[str, int, Dict[str, Any]]] = {}
+        self._by_video: Dict[str, Set[int]] = {}
+        self._total_len = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def has_video(self, video_id: str) -> bool:
+        return video_id in self._by_video
+
+    def add_video(self, video_id: str, segments: Iterable[Dict[str, Any]]) -> None:
+        """Index (or re-index) every segment of `video_id`, replacing what was there."""
+        with self._lock:
+            self._remove_locked(video_id)
+            self._add_locked(video_id, segments)
+
+    def add_segments(self, video_id: str, segments: Iterable[Dict[str, Any]]) -> None:
+        """Append segments to `video_id` without touching what is already indexed."""
+        with self._lock:
+            self._add_locked(video_id, segments)
+
+    def _add_locked(self, video_id: str, segments: Iterable[Dict[str, Any]]) -> None:
+        ids = self._by_video.setdefault(video_id, set())
+        for s in segments:
+            tf = Counter(tokenize(s.get("text") or ""))
+            doc_id = self._next_id
+            self._next_id += 1
+            length = sum(tf.values())
+            payload = {k: v for k, v in s.items() if k not in ("embedding", "_id", "score")}
+            payload["video_id"] = video_id
+            self._docs[doc_id] = (video_id, length, payload)
+            self._total_len += length
+            ids.add(doc_id)
+            for term, n in tf.items():
+                self._postings.setdefault(term, {})[doc_id] = n
+
+    def remove_video(self, video_id: str) -> None:
+        with self._lock:
+            self._remove_locked(video_id)
+
+    def _remove_locked(self, video_id: str) -> None:
+        ids = self._by_video.pop(video_id, None)
+        if not ids:
+            return
+        for doc_id in ids:
+            _, length, payload = self._docs.pop(doc_id)
+            self._total_len -= length
+            for term in set(tokenize(payload.get("text") or "")):
+                plist = self._postings.get(term)
+                if plist is not None:
+                    plist.pop(doc_id, None)
+                    if not plist:
+                        del self._postings[term]
+
+    def search(
+        self, query: str, k: int, video_id: Optional[str] = None, filters: Optional[SegmentFilter] = None
+    ) -> List[Dict[str, Any]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not terms or not n_docs or k <= 0:
+                return []
+            scope = self._by_video.get(video_id, set()) if video_id else None
+            if scope is not None and not scope:
+                return []
+            avgdl = (self._total_len / n_docs) or 1.0
+            allowed: Dict[int, bool] = {}
+            scores: Dict[int, float] = {}
+            for term in terms:
+                plist = self._postings.get(term)
+                if not plist:
+                    continue
+                df = len(plist)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in plist.items():
+                    if scope is not None and doc_id not in scope:
+                        continue
+                    if filters:
+                        ok = allowed.get(doc_id)
+                        if ok is None:
+                            ok = allowed[doc_id] = filters.matches(self._docs[doc_id][2])
+                        if not ok:
+                            continue
+                    dl = self._docs[doc_id][1]
+                    norm = tf + self.k1 * (1.0 - self.b + self.b * dl / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / norm
+            best = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+            return [{**self._docs[doc_id][2], "score": float(score)} for doc_id, score in best]
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import threading
+import time
+
+from .metrics import inc_counter
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTL. Hits/misses are reported as `cache_hits:<name>` counters."""
+
+    def __init__(self, name: str, maxsize: int, ttl_s: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl_s
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                hit = item[1]
+            else:
+                if item is not None:
+                    del self._data[key]
+                hit = None
+        inc_counter(f"cache_{'hits' if hit is not None else 'misses'}:{self.name}")
+        return hit
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                inc_counter(f"cache_evictions:{self.name}")
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            stale = [k for k in self._data if predicate(k)]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class IndexVersions:
+    """
+    Monotonic per-video index versions. Unscoped (all-videos) lookups key on the
+    global version, which moves whenever any video is re-indexed.
+    """
+
+    def __init__(self) -> None:
+        self._global = 0
+        self._videos: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def current(self, video_id: Optional[str]) -> int:
+        if video_id is None:
+            return self._global
+        return self._videos.get(video_id, 0)
+
+    def bump(self, video_id: str) -> None:
+        with self._lock:
+            self._global += 1
+            self._videos[video_id] = self._videos.get(video_id, 0) + 1
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
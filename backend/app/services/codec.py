@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence, Tuple
+
+import numpy as np
+from bson.binary import Binary
+
+# BSON binData subtype 9 ("vector"): 1 dtype byte + 1 padding byte, then packed little-endian data.
+# This is the layout Atlas Vector Search indexes natively.
+VECTOR_SUBTYPE = 9
+_FLOAT32 = 0x27
+_INT8 = 0x03
+
+FORMATS = ("list", "float32", "int8")
+
+
+def encode_embedding(vec: Sequence[float], fmt: str = "float32") -> Tuple[Any, Optional[float]]:
+    """
+    Encode an embedding for storage. Returns (value, scale):
+    - "list":    array of doubles (legacy layout), scale None
+    - "float32": packed float32 binData vector, scale None
+    - "int8":    symmetric scalar-quantized int8 binData vector plus its per-vector scale
+                 (value = q * scale); cosine scores are unaffected by the scale.
+    """
+    arr = np.asarray(vec, dtype=np.float32)
+    if fmt == "list":
+        return arr.tolist(), None
+    if fmt == "float32":
+        return Binary(bytes((_FLOAT32, 0)) + arr.astype("<f4").tobytes(), VECTOR_SUBTYPE), None
+    if fmt == "int8":
+        peak = float(np.max(np.abs(arr))) if arr.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        q = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        return Binary(bytes((_INT8, 0)) + q.tobytes(), VECTOR_SUBTYPE), scale
+    raise ValueError(f"Unknown embedding storage format: {fmt}")
+
+
+def embedding_format(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        if getattr(value, "subtype", None) == VECTOR_SUBTYPE:
+            return "int8" if value[0] == _INT8 else "float32"
+        return "float32"
+    return "list"
+
+
+def decode_embedding(value: Any, scale: Optional[float] = None) -> Optional[np.ndarray]:
+    """
+    Stored embedding -> float32 vector. Float32 binData is decoded zero-copy with
+    np.frombuffer; legacy arrays of doubles and int8 (de-quantized with `scale`) are copied.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        buf = memoryview(value)
+        if getattr(value, "subtype", None) == VECTOR_SUBTYPE:
+            dtype, data = buf[0], buf[2:]
+            if dtype == _INT8:
+                q = np.frombuffer(data, dtype=np.int8).astype(np.float32)
+                return q * np.float32(scale) if scale is not None else q
+            return np.frombuffer(data, dtype="<f4")
+        # raw packed float32 without the vector header
+        return np.frombuffer(buf, dtype="<f4")
+    if len(value) == 0:
+        return None
+    return np.asarray(value, dtype=np.float32)
@@ -1,117 +1,880 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import itertools
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
 from loguru import logger
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING
+from pymongo import ASCENDING, UpdateOne
 
 from ..config import settings
+from .ann import IVFIndex, create_ann_index
+from .codec import decode_embedding, embedding_format, encode_embedding
+from .filters import SegmentFilter
+from .tracing import span
+
+
+_COLUMN_KEYS = ("video_id", "title", "start_time", "end_time", "text", "embedding")
+
+# What a search hit carries back to callers. Embeddings stay in the store unless a caller
+# passes with_embedding=True.
+RESULT_FIELDS = ("video_id", "title", "start_time", "end_time", "text", "snippet")
+
+
+def segment_key(video_id: str, segment: Dict[str, Any]) -> str:
+    """
+    Content key of one retrieval window: (video_id, start, end, text hash) plus the embedding
+    model, so re-ingesting unchanged captions is a no-op but a model switch re-embeds.
+    Hierarchical leaves also key on their section numbers, which may shift without the leaf
+    itself changing.
+    """
+    text = hashlib.sha1(segment.get("text", "").encode("utf-8")).hexdigest()
+    raw = (
+        f"{video_id}|{float(segment.get('start_time', 0.0)):.3f}|{float(segment.get('end_time', 0.0)):.3f}"
+        f"|{text}|{settings.EMBEDDING_MODEL}"
+    )
+    if segment.get("hierarchy") is not None:
+        raw += f"|{','.join(map(str, segment['hierarchy']))}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def split_delta(
+    video_id: str, segments: Iterable[Dict[str, Any]], existing: Set[str], seen: Set[str]
+) -> List[Dict[str, Any]]:
+    """
+    Stamp each segment with its `seg_key`, add the keys to `seen`, and return only the
+    segments that are not stored yet (nor repeated earlier in this ingest).
+    """
+    fresh = []
+    for s in segments:
+        key = s["seg_key"] = segment_key(video_id, s)
+        if key in seen:
+            continue
+        seen.add(key)
+        if key not in existing:
+            fresh.append(s)
+    return fresh
+
+
+def _result_projection(with_embedding: bool = False) -> Dict[str, int]:
+    projection = {f: 1 for f in RESULT_FIELDS}
+    if with_embedding:
+        projection.update(embedding=1, embedding_scale=1)
+    return projection
+
+
+def _lean(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop _id and decode a projected embedding (binData / legacy list) to a float list."""
+    doc.pop("_id", None)
+    if "embedding" in doc:
+        vec = decode_embedding(doc.pop("embedding"), doc.pop("embedding_scale", None))
+        if vec is not None:
+            doc["embedding"] = vec.tolist()
+    return doc
 
 
 class InMemoryStore:
+    """
+    Matrix-backed local store.
+    Embeddings live in one contiguous float32 matrix (rows L2-normalised at insert time) so a
+    search is a single mat-vec product plus argpartition. Each video occupies a contiguous row
+    range, which makes per-video filtering a slice instead of a mask over the whole corpus.
+    """
+
     def __init__(self) -> None:
         self._videos: Dict[str, Dict[str, Any]] = {}
-        self._segments: List[Dict[str, Any]] = []
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+        self._dim: Optional[int] = None
+        self._n = 0
+        self._emb = np.zeros((0, 0), dtype=np.float32)
+        self._valid = np.zeros(0, dtype=bool)
+        self._start = np.zeros(0, dtype=np.float64)
+        self._end = np.zeros(0, dtype=np.float64)
+        self._vid = np.zeros(0, dtype=np.int32)
+        self._vid_names: List[str] = []
+        self._vid_codes: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._extras: List[Dict[str, Any]] = []
+        # stable row ids for the optional ANN index (rows move on compaction)
+        self._rid = np.zeros(0, dtype=np.int64)
+        self._next_rid = 0
+        self._row_of: Optional[Dict[int, int]] = None
+        self._ann: Optional[IVFIndex] = create_ann_index()
+        # rows of a re-ingest held back until prune_segments swaps them in: video -> [(rids, valid)]
+        self._staged: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
 
-    async def upsert_segments(self, video_id: str, title: str, segments: List[Dict[str, Any]]) -> None:
+    def __len__(self) -> int:
+        return self._n
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        if self._dim is None or self._n == 0:
+            self._dim = dim
+            if self._emb.shape[1:] != (dim,):
+                self._emb = np.zeros((0, dim), dtype=np.float32)
+        elif dim != self._dim:
+            raise ValueError(f"Embedding dimension mismatch: store={self._dim} got={dim}")
+
+        need = self._n + rows
+        cap = self._emb.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2, 1024)
+
+        def grow(arr: np.ndarray) -> np.ndarray:
+            out = np.zeros((new_cap,) + arr.shape[1:], dtype=arr.dtype)
+            out[: self._n] = arr[: self._n]
+            return out
+
+        self._emb = grow(self._emb)
+        self._valid = grow(self._valid)
+        self._start = grow(self._start)
+        self._end = grow(self._end)
+        self._vid = grow(self._vid)
+        self._rid = grow(self._rid)
+
+    def _columns(self) -> Tuple[np.ndarray, ...]:
+        return (self._emb, self._valid, self._start, self._end, self._vid, self._rid)
+
+    def _remove_video(self, video_id: str) -> None:
+        rng = self._ranges.pop(video_id, None)
+        if rng is None:
+            return
+        lo, hi = rng
+        cnt = hi - lo
+        n = self._n
+        if cnt and hi < n:
+            for arr in self._columns():
+                arr[lo : n - cnt] = arr[hi:n]
+            self._row_of = None
+        del self._texts[lo:hi]
+        del self._extras[lo:hi]
+        self._n = n - cnt
+        if cnt:
+            for vid, (a, b) in self._ranges.items():
+                if a >= hi:
+                    self._ranges[vid] = (a - cnt, b - cnt)
+
+    def _code(self, video_id: str) -> int:
+        code = self._vid_codes.get(video_id)
+        if code is None:
+            code = len(self._vid_names)
+            self._vid_codes[video_id] = code
+            self._vid_names.append(video_id)
+        return code
+
+    def _move_to_tail(self, video_id: str) -> None:
+        """Keep a video's rows contiguous when another video was appended after it."""
+        lo, hi = self._ranges[video_id]
+        if hi == self._n:
+            return
+        cols = [arr[lo:hi].copy() for arr in self._columns()]
+        texts, extras = self._texts[lo:hi], self._extras[lo:hi]
+        self._remove_video(video_id)
+        a, b = self._n, self._n + (hi - lo)
+        for arr, col in zip(self._columns(), cols):
+            arr[a:b] = col
+        self._texts.extend(texts)
+        self._extras.extend(extras)
+        self._ranges[video_id] = (a, b)
+        self._n = b
+
+    def _drop_rows(self, video_id: str, drop: np.ndarray) -> List[int]:
+        """Remove the flagged rows of one video's range, keeping every range contiguous."""
+        lo, hi = self._ranges[video_id]
+        cnt = int(drop.sum())
+        if not cnt:
+            return []
+        keep = ~drop
+        removed = self._rid[lo:hi][drop].tolist()
+        n, kept = self._n, hi - lo - cnt
+        for arr in self._columns():
+            arr[lo : lo + kept] = arr[lo:hi][keep]
+            arr[lo + kept : n - cnt] = arr[hi:n]
+        self._texts[lo:hi] = [t for t, k in zip(self._texts[lo:hi], keep) if k]
+        self._extras[lo:hi] = [e for e, k in zip(self._extras[lo:hi], keep) if k]
+        self._n = n - cnt
+        self._ranges[video_id] = (lo, hi - cnt)
+        for vid, (a, b) in self._ranges.items():
+            if a >= hi:
+                self._ranges[vid] = (a - cnt, b - cnt)
+        self._row_of = None
+        return removed
+
+    async def delete_video(self, video_id: str) -> None:
+        self._remove_video(video_id)
+        self._staged.pop(video_id, None)
+        if self._ann is not None:
+            self._ann.remove_video(video_id)
+
+    async def segment_keys(self, video_id: str) -> Set[str]:
+        lo, hi = self._ranges.get(video_id, (0, 0))
+        return {e["seg_key"] for e in self._extras[lo:hi] if "seg_key" in e}
+
+    async def prune_segments(self, video_id: str, title: str, keep: Set[str]) -> int:
+        """Drop the video's rows whose seg_key is not in `keep`; returns how many were removed."""
+        self._videos[video_id] = {"video_id": video_id, "title": title}
+        if video_id not in self._ranges:
+            return 0
+        lo, hi = self._ranges[video_id]
+        drop = np.fromiter((e.get("seg_key") not in keep for e in self._extras[lo:hi]), dtype=bool, count=hi - lo)
+        # no await from here on: stale rows leave and staged rows appear in one step for readers
+        removed = self._drop_rows(video_id, drop)
+        if removed and self._ann is not None:
+            self._ann.remove_ids(video_id, removed)
+        self._reveal(video_id)
+        return len(removed)
+
+    def _reveal(self, video_id: str) -> None:
+        staged = self._staged.pop(video_id, [])
+        if not staged:
+            return
+        if self._row_of is None:
+            self._row_of = {int(r): i for i, r in enumerate(self._rid[: self._n])}
+        for rids, valid in staged:
+            rows = np.asarray([self._row_of[int(r)] for r in rids], dtype=np.int64)
+            self._valid[rows] = valid
+            if self._ann is not None:
+                self._ann.add(video_id, rids[valid].tolist(), self._emb[rows[valid]])
+
+    async def append_segments(
+        self, video_id: str, title: str, segments: List[Dict[str, Any]], staged: bool = False
+    ) -> None:
+        """
+        Append rows for `video_id`. With staged=True (a re-ingest of a stored video) the rows
+        stay hidden from searches until prune_segments swaps them in for the stale ones.
+        """
         self._videos[video_id] = {"video_id": video_id, "title": title}
-        self._segments = [s for s in self._segments if s.get("video_id") != video_id]
         for s in segments:
             s["video_id"] = video_id
-        self._segments.extend(segments)
+        if not segments:
+            return
+
+        dim = next((len(s["embedding"]) for s in segments if s.get("embedding") is not None), self._dim or 0)
+        mat = np.zeros((len(segments), dim), dtype=np.float32)
+        valid = np.zeros(len(segments), dtype=bool)
+        for i, s in enumerate(segments):
+            emb = s.get("embedding")
+            if emb is not None and len(emb) == dim:
+                mat[i] = emb
+                valid[i] = True
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        mat /= norms
+
+        self._reserve(len(segments), dim)
+        if video_id in self._ranges:
+            self._move_to_tail(video_id)
+        lo, hi = self._n, self._n + len(segments)
+        self._emb[lo:hi] = mat
+        self._valid[lo:hi] = False if staged else valid
+        self._start[lo:hi] = [float(s.get("start_time", 0.0)) for s in segments]
+        self._end[lo:hi] = [float(s.get("end_time", 0.0)) for s in segments]
+        self._vid[lo:hi] = self._code(video_id)
+        rids = np.arange(self._next_rid, self._next_rid + len(segments), dtype=np.int64)
+        self._next_rid += len(segments)
+        self._rid[lo:hi] = rids
+        if self._row_of is not None:
+            self._row_of.update(zip(rids.tolist(), range(lo, hi)))
+        if staged:
+            self._staged.setdefault(video_id, []).append((rids, valid))
+        elif self._ann is not None:
+            self._ann.add(video_id, rids[valid].tolist(), mat[valid])
+        self._texts.extend(s.get("text", "") for s in segments)
+        self._extras.extend({k: v for k, v in s.items() if k not in _COLUMN_KEYS} for s in segments)
+        self._ranges[video_id] = (self._ranges.get(video_id, (lo, lo))[0], hi)
+        self._n = hi
+
+    async def upsert_segments(self, video_id: str, title: str, segments: List[Dict[str, Any]]) -> None:
+        """Delta upsert: append windows whose content key is new, then prune the vanished ones."""
+        keep: Set[str] = set()
+        existing = await self.segment_keys(video_id)
+        fresh = split_delta(video_id, segments, existing, keep)
+        await self.append_segments(video_id, title, fresh, staged=bool(existing))
+        await self.prune_segments(video_id, title, keep)
+
+    async def persist(self, force: bool = False) -> None:
+        # nothing durable to write: the in-memory store (and its ANN index) die with the process
+        return None
+
+    def _row(self, i: int, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        video_id = self._vid_names[int(self._vid[i])]
+        extras = self._extras[i]
+        if fields is not None:
+            extras = {k: v for k, v in extras.items() if k in fields}
+        return {
+            **extras,
+            "video_id": video_id,
+            "title": self._videos.get(video_id, {}).get("title"),
+            "start_time": float(self._start[i]),
+            "end_time": float(self._end[i]),
+            "text": self._texts[i],
+        }
+
+    def _bounds(self, video_id: Optional[str]) -> Tuple[int, int]:
+        if video_id:
+            return self._ranges.get(video_id, (0, 0))
+        return 0, self._n
 
-    async def search(self, query_embedding: List[float], k: int, video_id: Optional[str]) -> List[Dict[str, Any]]:
-        import numpy as np
+    def _excluded(self, lo: int, hi: int, filters: Optional[SegmentFilter]) -> np.ndarray:
+        """Rows in [lo, hi) that must not be returned: deleted, or outside `filters`."""
+        drop = ~self._valid[lo:hi]
+        if filters:
+            if filters.video_ids is not None:
+                codes = [self._vid_codes[v] for v in filters.video_ids if v in self._vid_codes]
+                drop |= ~np.isin(self._vid[lo:hi], codes)
+            if filters.t_from is not None:
+                drop |= self._end[lo:hi] < filters.t_from
+            if filters.t_to is not None:
+                drop |= self._start[lo:hi] > filters.t_to
+        return drop
+
+    def _hit(self, i: int, score: float, with_embedding: bool) -> Dict[str, Any]:
+        d = self._row(i, RESULT_FIELDS)
+        d["score"] = score
+        if with_embedding:
+            d["embedding"] = self._emb[i].tolist()
+        return d
+
+    def _ann_search(
+        self, qe: np.ndarray, k: int, video_id: Optional[str], with_embedding: bool = False
+    ) -> List[Dict[str, Any]]:
+        assert self._ann is not None
+        if self._row_of is None:
+            self._row_of = {int(r): i for i, r in enumerate(self._rid[: self._n])}
+        return [self._hit(self._row_of[rid], score, with_embedding) for rid, score in self._ann.search(qe, k, video_id)]
+
+    def _top(self, scores: np.ndarray, lo: int, k: int, with_embedding: bool = False) -> List[Dict[str, Any]]:
+        kk = min(k, len(scores))
+        top = np.argpartition(-scores, kk - 1)[:kk]
+        top = top[np.argsort(-scores[top], kind="stable")]
 
-        qe = np.array(query_embedding)
         results = []
-        for s in self._segments:
-            if video_id and s.get("video_id") != video_id:
-                continue
-            emb = np.array(s["embedding"]) if "embedding" in s else None
-            if emb is None or emb.shape != qe.shape:
-                continue
-            denom = (np.linalg.norm(qe) * np.linalg.norm(emb)) or 1e-9
-            score = float(np.dot(qe, emb) / denom)
-            results.append({**s, "score": score})
-        results.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-        return results[:k]
+        for i in top:
+            if not np.isfinite(scores[i]):
+                break
+            results.append(self._hit(lo + int(i), float(scores[i]), with_embedding))
+        return results
+
+    async def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        video_id: Optional[str],
+        filters: Optional[SegmentFilter] = None,
+        with_embedding: bool = False,
+    ) -> List[Dict[str, Any]]:
+        qe = np.asarray(query_embedding, dtype=np.float32)
+        lo, hi = self._bounds(video_id)
+        if k <= 0 or hi <= lo or qe.shape != (self._dim,):
+            return []
+        qe = qe / (np.linalg.norm(qe) or 1e-9)
+        # the ANN index only knows video scopes; filtered queries take the exact masked scan
+        if self._ann is not None and self._ann.trained and not filters:
+            return self._ann_search(qe, k, video_id, with_embedding)
 
-    async def list_segments(self, video_id: Optional[str], limit: int = 2000) -> List[Dict[str, Any]]:
-        items = [s for s in self._segments if (not video_id or s.get("video_id") == video_id)]
-        return items[:limit]
+        scores = self._emb[lo:hi] @ qe
+        scores[self._excluded(lo, hi, filters)] = -np.inf
+        return self._top(scores, lo, k, with_embedding)
+
+    async def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        video_id: Optional[str],
+        filters: Optional[SegmentFilter] = None,
+        with_embedding: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """Top-k for several queries at once: one (queries x rows) mat-mat product per block."""
+        m = len(query_embeddings)
+        qs = np.asarray(query_embeddings, dtype=np.float32).reshape(m, -1)
+        lo, hi = self._bounds(video_id)
+        if m == 0 or k <= 0 or hi <= lo or qs.shape[1] != self._dim:
+            return [[] for _ in range(m)]
+        norms = np.linalg.norm(qs, axis=1, keepdims=True)
+        norms[norms == 0] = 1e-9
+        qs = qs / norms
+        if self._ann is not None and self._ann.trained and not filters:
+            return [self._ann_search(q, k, video_id, with_embedding) for q in qs]
+
+        invalid = self._excluded(lo, hi, filters)
+        # bound the score matrix to ~16M floats regardless of corpus size
+        step = max(1, (1 << 24) // (hi - lo))
+        results: List[List[Dict[str, Any]]] = []
+        for b in range(0, m, step):
+            scores = qs[b : b + step] @ self._emb[lo:hi].T
+            scores[:, invalid] = -np.inf
+            results.extend(self._top(row, lo, k, with_embedding) for row in scores)
+        return results
+
+    async def list_segments(
+        self,
+        video_id: Optional[str],
+        limit: int = 2000,
+        with_embedding: bool = False,
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> List[Dict[str, Any]]:
+        lo, hi = self._bounds(video_id)
+        rows = []
+        for i in range(lo, min(hi, lo + limit)):
+            row = self._row(i, fields)
+            if with_embedding and self._valid[i]:
+                row["embedding"] = self._emb[i].tolist()
+            rows.append(row)
+        return rows
 
 
 class MongoStore:
-    def __init__(self) -> None:
-        self.client = AsyncIOMotorClient(settings.MONGODB_URI)
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None) -> None:
+        self.client = client or create_mongo_client()
         self.db = self.client[settings.MONGODB_DB]
         self.col = self.db[settings.MONGODB_COLLECTION]
+        self.ann: Optional[IVFIndex] = create_ann_index()
+        # ANN changes not yet written to ANN_INDEX_PATH, and when it was last written
+        self._ann_dirty = False
+        self._ann_saved_at = time.monotonic()
+        # Ingest generations: every doc carries a `gen`; searches skip the generations in
+        # _hidden. A re-ingest writes its new windows under a hidden generation and
+        # prune_segments swaps them in (see there). Per process, like the ingest job queue.
+        self._gens = itertools.count(time.time_ns())
+        self._hidden: Set[int] = set()
+        self._staged: Dict[str, Tuple[int, List[Any], List[Any]]] = {}  # video -> (gen, ANN ids, vectors)
 
     async def ensure_indexes(self) -> None:
-        await self.col.create_index([("video_id", ASCENDING)])
+        # (video_id, seg_key) serves per-video queries and the delta diff of re-ingests
+        await self.col.create_index([("video_id", ASCENDING), ("seg_key", ASCENDING)])
 
-    async def upsert_segments(self, video_id: str, title: str, segments: List[Dict[str, Any]]) -> None:
+    async def load_ann(self) -> None:
+        """Load the local ANN index from disk, or rebuild it from the collection."""
+        if self.ann is None:
+            return
+        path = settings.ANN_INDEX_PATH
+        if path and os.path.exists(path):
+            ann = await asyncio.to_thread(IVFIndex.load, path)
+            # snapshots are periodic: one older than the collection (e.g. after a crash) is rebuilt
+            stored = await self.col.count_documents({"embedding": {"$exists": True}})
+            if len(ann) == stored:
+                self.ann = ann
+                logger.info(f"Loaded ANN index with {len(self.ann)} vectors from {path}")
+                return
+            logger.warning(f"ANN snapshot has {len(ann)} vectors, collection {stored}; rebuilding")
+        batch: Dict[str, Tuple[List[Any], List[Any]]] = {}
+        cursor = self.col.find({"embedding": {"$exists": True}}, projection={"embedding": 1, "video_id": 1})
+        async for d in cursor:
+            ids, vecs = batch.setdefault(d.get("video_id"), ([], []))
+            ids.append(d["_id"])
+            vecs.append(decode_embedding(d["embedding"]))
+        for vid, (ids, vecs) in batch.items():
+            self.ann.add(vid, ids, vecs)
+        self._ann_dirty = bool(path)
+        logger.info(f"Rebuilt ANN index with {len(self.ann)} vectors")
+
+    async def persist(self, force: bool = False) -> None:
+        """
+        Snapshot the ANN index if it changed, at most every ANN_PERSIST_INTERVAL_S (called after
+        each ingest); `force` writes it regardless of the interval (shutdown).
+        """
+        if self.ann is None or not settings.ANN_INDEX_PATH or not self._ann_dirty:
+            return
+        if not force and time.monotonic() - self._ann_saved_at < settings.ANN_PERSIST_INTERVAL_S:
+            return
+        self._ann_dirty = False
+        self._ann_saved_at = time.monotonic()
+        await asyncio.to_thread(self.ann.save, settings.ANN_INDEX_PATH)
+
+    def _visible(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """`query` restricted to visible ingest generations (a $vectorSearch filter or find())."""
+        if not self._hidden:
+            return query
+        clause = {"gen": {"$nin": sorted(self._hidden)}}
+        if not query:
+            return clause
+        return {"$and": [*query.get("$and", [query]), clause]}
+
+    async def delete_video(self, video_id: str) -> None:
+        staged = self._staged.pop(video_id, None)
+        if staged is not None:
+            self._hidden.discard(staged[0])
         await self.col.delete_many({"video_id": video_id})
+        if self.ann is not None:
+            self.ann.remove_video(video_id)
+            self._ann_dirty = True
+
+    async def append_segments(
+        self, video_id: str, title: str, segments: List[Dict[str, Any]], staged: bool = False
+    ) -> None:
+        # staged rows go under the video's pending generation, hidden until prune_segments
+        if staged:
+            if video_id not in self._staged:
+                gen = next(self._gens)
+                self._hidden.add(gen)
+                self._staged[video_id] = (gen, [], [])
+            gen = self._staged[video_id][0]
+        else:
+            gen = next(self._gens)
+        vectors: List[Any] = []
         for s in segments:
             s["video_id"] = video_id
             s["title"] = title
+            s["gen"] = gen
+            emb = s.get("embedding")
+            vectors.append(emb)
+            if emb is not None:
+                s["embedding"], scale = encode_embedding(emb, settings.EMBEDDING_STORAGE)
+                if scale is not None:
+                    s["embedding_scale"] = scale
         if segments:
-            await self.col.insert_many(segments)
+            await self.col.insert_many(segments, ordered=False)
+            if self.ann is not None:
+                with_emb = [(s["_id"], v) for s, v in zip(segments, vectors) if v is not None]
+                if staged:
+                    _, ids, vecs = self._staged[video_id]
+                    ids.extend(i for i, _ in with_emb)
+                    vecs.extend(v for _, v in with_emb)
+                else:
+                    self.ann.add(video_id, [i for i, _ in with_emb], [v for _, v in with_emb])
+                    self._ann_dirty = True
 
-    async def search(self, query_embedding: List[float], k: int, video_id: Optional[str]) -> List[Dict[str, Any]]:
-        filter_query: Dict[str, Any] = {}
-        if video_id:
-            filter_query["video_id"] = video_id
+    async def migrate_embeddings(self, fmt: Optional[str] = None, batch_size: int = 1000) -> int:
+        """Re-encode stored embeddings into `fmt` (default EMBEDDING_STORAGE) with bulk updates."""
+        fmt = fmt or settings.EMBEDDING_STORAGE
+        ops: List[UpdateOne] = []
+        migrated = 0
+        cursor = self.col.find(
+            {"embedding": {"$exists": True}}, projection={"embedding": 1, "embedding_scale": 1}, batch_size=batch_size
+        )
+        async for d in cursor:
+            if embedding_format(d["embedding"]) == fmt:
+                continue
+            vec = decode_embedding(d["embedding"], d.get("embedding_scale"))
+            value, scale = encode_embedding(vec, fmt)
+            update: Dict[str, Any] = {"$set": {"embedding": value}}
+            if scale is not None:
+                update["$set"]["embedding_scale"] = scale
+            else:
+                update["$unset"] = {"embedding_scale": ""}
+            ops.append(UpdateOne({"_id": d["_id"]}, update))
+            if len(ops) >= batch_size:
+                await self.col.bulk_write(ops, ordered=False)
+                migrated += len(ops)
+                ops = []
+        if ops:
+            await self.col.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+        logger.info(f"Migrated {migrated} embeddings to {fmt}")
+        return migrated
+
+    async def segment_keys(self, video_id: str) -> Set[str]:
+        cursor = self.col.find({"video_id": video_id}, projection={"seg_key": 1, "_id": 0})
+        return {d["seg_key"] async for d in cursor if d.get("seg_key")}
+
+    async def prune_segments(self, video_id: str, title: str, keep: Set[str]) -> int:
+        """
+        Delete the video's docs whose seg_key is not in `keep` (including legacy docs without
+        one) and retitle the rest if needed.
+        Without transactions the swap is versioned: stale docs are first moved to a retired
+        generation (still visible), then one in-process step hides it and reveals the staged
+        generation, so a search sees either the old or the new version of the video, never
+        both. Retired docs are deleted afterwards.
+        """
+        cursor = self.col.find({"video_id": video_id}, projection={"seg_key": 1})
+        stale = [d["_id"] async for d in cursor if d.get("seg_key") not in keep]
+        retired = next(self._gens)
+        for i in range(0, len(stale), 1000):
+            await self.col.update_many({"_id": {"$in": stale[i : i + 1000]}}, {"$set": {"gen": retired}})
+        staged = self._staged.pop(video_id, None)
+        # the swap: no awaits between hiding the stale docs and revealing the staged ones
+        self._hidden.add(retired)
+        if staged is not None:
+            self._hidden.discard(staged[0])
+        if self.ann is not None:
+            if stale:
+                self.ann.remove_ids(video_id, stale)
+            if staged is not None and staged[1]:
+                self.ann.add(video_id, staged[1], staged[2])
+            self._ann_dirty = self._ann_dirty or bool(stale) or staged is not None
+        if stale:
+            await self.col.delete_many({"gen": retired})
+        self._hidden.discard(retired)
+        await self.col.update_many({"video_id": video_id, "title": {"$ne": title}}, {"$set": {"title": title}})
+        return len(stale)
+
+    async def upsert_segments(self, video_id: str, title: str, segments: List[Dict[str, Any]]) -> None:
+        """Delta upsert: insert windows whose content key is new, then prune the vanished ones."""
+        keep: Set[str] = set()
+        existing = await self.segment_keys(video_id)
+        fresh = split_delta(video_id, segments, existing, keep)
+        await self.append_segments(video_id, title, fresh, staged=bool(existing))
+        await self.prune_segments(video_id, title, keep)
+
+    def _num_candidates(self, k: int) -> int:
+        # Atlas caps numCandidates at 10000 and requires numCandidates >= limit
+        n = max(k * settings.VECTOR_SEARCH_CANDIDATES_FACTOR, settings.VECTOR_SEARCH_MIN_CANDIDATES)
+        return max(k, min(n, 10000))
+
+    async def _vector_search(
+        self, query_embedding: List[float], k: int, filter_query: Dict[str, Any], projection: Dict[str, int]
+    ) -> List[Dict[str, Any]]:
+        # $vectorSearch must be the first stage; filtering happens inside it on indexed filter fields
+        stage: Dict[str, Any] = {
+            "index": settings.VECTOR_SEARCH_INDEX,
+            "path": "embedding",
+            "queryVector": [float(x) for x in query_embedding],
+            "numCandidates": self._num_candidates(k),
+            "limit": k,
+        }
+        if filter_query:
+            stage["filter"] = filter_query
+        pipeline = [
+            {"$vectorSearch": stage},
+            {"$project": {"_id": 0, **projection, "score": {"$meta": "vectorSearchScore"}}},
+        ]
+        cursor = self.col.aggregate(pipeline)
+        return [_lean(doc) async for doc in cursor]
+
+    async def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        video_id: Optional[str],
+        filters: Optional[SegmentFilter] = None,
+        with_embedding: bool = False,
+    ) -> List[Dict[str, Any]]:
+        filter_query = self._visible((filters or SegmentFilter()).to_mongo(video_id))
+        projection = _result_projection(with_embedding)
+        try:
+            return await self._vector_search(query_embedding, k, filter_query, projection)
+        except Exception as e:
+            if self.ann is not None and len(self.ann) and not filters:
+                logger.warning(f"VectorSearch not available, using local ANN index: {e}")
+                with span("fallback_ann"):
+                    return await self._ann_search(query_embedding, k, video_id, projection)
+            logger.warning(f"VectorSearch not available, falling back to cosine in Mongo: {e}")
+            with span("fallback_scan"):
+                return await self._scan_search(query_embedding, k, filter_query, projection)
+
+    async def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        video_id: Optional[str],
+        filters: Optional[SegmentFilter] = None,
+        with_embedding: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Top-k for several queries. $vectorSearch takes one query vector per pipeline, so those
+        run concurrently over the pool; without it the cosine fallback scans the collection
+        once for all queries.
+        """
+        if not query_embeddings:
+            return []
+        filter_query = self._visible((filters or SegmentFilter()).to_mongo(video_id))
+        projection = _result_projection(with_embedding)
         try:
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "path": "embedding",
-                        "queryVector": query_embedding,
-                        "numCandidates": max(k * 10, 100),
-                        "limit": k,
-                    }
-                },
-                {"$addFields": {"score": {"$meta": "vectorSearchScore"}}},
-            ]
-            if filter_query:
-                pipeline.insert(0, {"$match": filter_query})
-            cursor = self.col.aggregate(pipeline)
-            return [doc async for doc in cursor]
+            first = await self._vector_search(query_embeddings[0], k, filter_query, projection)
         except Exception as e:
+            if self.ann is not None and len(self.ann) and not filters:
+                logger.warning(f"VectorSearch not available, using local ANN index: {e}")
+                with span("fallback_ann"):
+                    return list(
+                        await asyncio.gather(*(self._ann_search(q, k, video_id, projection) for q in query_embeddings))
+                    )
             logger.warning(f"VectorSearch not available, falling back to cosine in Mongo: {e}")
-            import numpy as np
-            qe = np.array(query_embedding)
-            docs = [d async for d in self.col.find(filter_query)]
-            results: List[Dict[str, Any]] = []
-            for d in docs:
-                emb = d.get("embedding")
-                if not emb:
-                    continue
-                emb_arr = np.array(emb)
-                denom = (np.linalg.norm(qe) * np.linalg.norm(emb_arr)) or 1e-9
-                score = float(np.dot(qe, emb_arr) / denom)
-                d["score"] = score
-                results.append(d)
-            results.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-            return results[:k]
-
-    async def list_segments(self, video_id: Optional[str], limit: int = 2000) -> List[Dict[str, Any]]:
+            with span("fallback_scan"):
+                return await self._scan_search_many(query_embeddings, k, filter_query, projection)
+        rest = await asyncio.gather(
+            *(self.search(q, k, video_id, filters, with_embedding) for q in query_embeddings[1:])
+        )
+        return [first, *rest]
+
+    async def _fetch(self, ids: List[Any], projection: Dict[str, int]) -> Dict[Any, Dict[str, Any]]:
+        """Projected docs by _id."""
+        docs = self.col.find({"_id": {"$in": ids}}, projection=projection)
+        return {d["_id"]: _lean(d) async for d in docs}
+
+    @staticmethod
+    def _scored(docs: Dict[Any, Dict[str, Any]], scores: Dict[Any, float]) -> List[Dict[str, Any]]:
+        out = [{**docs[i], "score": sc} for i, sc in scores.items() if i in docs]
+        out.sort(key=lambda x: x["score"], reverse=True)
+        return out
+
+    async def _hydrate(self, scores: Dict[Any, float], projection: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Fetch the result fields for the final top-k ids only."""
+        return self._scored(await self._fetch(list(scores), projection), scores)
+
+    async def _ann_search(
+        self, query_embedding: List[float], k: int, video_id: Optional[str], projection: Dict[str, int]
+    ) -> List[Dict[str, Any]]:
+        assert self.ann is not None
+        return await self._hydrate(dict(self.ann.search(query_embedding, k, video_id)), projection)
+
+    async def _scan_search(
+        self, query_embedding: List[float], k: int, filter_query: Dict[str, Any], projection: Dict[str, int]
+    ) -> List[Dict[str, Any]]:
+        return (await self._scan_search_many([query_embedding], k, filter_query, projection))[0]
+
+    async def _scan_search_many(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        filter_query: Dict[str, Any],
+        projection: Dict[str, int],
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Exact cosine scan without $vectorSearch. Only _id + embedding are streamed, in large
+        batches; each batch is scored against every query with one mat-mat product and merged
+        into a bounded per-query top-k buffer, and only the winners are hydrated (in one find).
+        """
+        m = len(query_embeddings)
+        qs = np.asarray(query_embeddings, dtype=np.float32).reshape(m, -1)
+        qn = np.linalg.norm(qs, axis=1, keepdims=True)
+        qn[qn == 0] = 1e-9
+        qs = qs / qn
+        batch_size = max(1, settings.MONGODB_SCAN_BATCH_SIZE)
+        top_scores = [np.empty(0, dtype=np.float32) for _ in range(m)]
+        top_ids: List[List[Any]] = [[] for _ in range(m)]
+        ids: List[Any] = []
+        vecs: List[np.ndarray] = []
+
+        def merge() -> None:
+            mat = np.stack(vecs)
+            norms = np.linalg.norm(mat, axis=1)
+            norms[norms == 0] = 1.0
+            block = (qs @ mat.T) / norms
+            for j in range(m):
+                scores = np.concatenate([top_scores[j], block[j]])
+                pool = top_ids[j] + ids
+                if len(scores) > k:
+                    keep = np.argpartition(-scores, k - 1)[:k]
+                    top_scores[j], top_ids[j] = scores[keep], [pool[int(i)] for i in keep]
+                else:
+                    top_scores[j], top_ids[j] = scores, pool
+            ids.clear()
+            vecs.clear()
+
+        cursor = self.col.find(filter_query, projection={"embedding": 1}, batch_size=batch_size)
+        async for d in cursor:
+            vec = decode_embedding(d.get("embedding"))
+            if vec is None or vec.shape != (qs.shape[1],):
+                continue
+            ids.append(d["_id"])
+            vecs.append(vec)
+            if len(ids) >= batch_size:
+                merge()
+        if ids:
+            merge()
+        if k <= 0 or not any(top_ids):
+            return [[] for _ in range(m)]
+        per_query = [{i: float(sc) for i, sc in zip(t_ids, t_sc)} for t_ids, t_sc in zip(top_ids, top_scores)]
+        docs = await self._fetch(list({i for scores in per_query for i in scores}), projection)
+        return [self._scored(docs, scores) for scores in per_query]
+
+    async def list_segments(
+        self,
+        video_id: Optional[str],
+        limit: int = 2000,
+        with_embedding: bool = False,
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> List[Dict[str, Any]]:
         q: Dict[str, Any] = {}
         if video_id:
             q["video_id"] = video_id
-        cursor = self.col.find(q, projection={"embedding": 0}).limit(limit)
+        q = self._visible(q)
+        if fields is not None or with_embedding:
+            projection: Dict[str, int] = {f: 1 for f in fields} if fields is not None else {}
+            if with_embedding and projection:
+                projection.update(embedding=1, embedding_scale=1)
+            cursor = self.col.find(q, projection=projection or None).limit(limit)
+            return [_lean(doc) async for doc in cursor]
+        cursor = self.col.find(q, projection={"embedding": 0, "embedding_scale": 0}).limit(limit)
         return [doc async for doc in cursor]
 
 
+def create_mongo_client() -> AsyncIOMotorClient:
+    """Build a pooled Motor client from settings (pool size + timeouts)."""
+    return AsyncIOMotorClient(
+        settings.MONGODB_URI,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGODB_SOCKET_TIMEOUT_MS,
+    )
+
+
+class StoreRegistry:
+    """
+    Process-wide holder for the active vector store.
+    Opens one pooled Mongo client and creates indexes once; if Mongo is unreachable
+    the same InMemoryStore is handed out for the lifetime of the process.
+    """
+
+    def __init__(self) -> None:
+        self._store: Any = None
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._memory = InMemoryStore()
+        self._lock = asyncio.Lock()
+
+    @property
+    def memory(self) -> InMemoryStore:
+        return self._memory
+
+    async def startup(self) -> Any:
+        async with self._lock:
+            if self._store is not None:
+                return self._store
+            client: Optional[AsyncIOMotorClient] = None
+            try:
+                client = create_mongo_client()
+                store = MongoStore(client)
+                await store.ensure_indexes()
+                await store.load_ann()
+                self._client = client
+                self._store = store
+                logger.info("Using MongoStore")
+            except Exception as e:
+                logger.warning(f"Mongo unavailable, using InMemoryStore: {e}")
+                if client is not None:
+                    client.close()
+                self._store = self._memory
+            return self._store
+
+    async def get(self) -> Any:
+        if self._store is None:
+            return await self.startup()
+        return self._store
+
+    def use(self, store: Any) -> None:
+        """Pin the active store without connecting (offline benchmarks, tools)."""
+        self._store = store
+
+    async def shutdown(self) -> None:
+        async with self._lock:
+            if self._store is not None:
+                await self._store.persist(force=True)
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._store = None
+
+
+_registry = StoreRegistry()
+
+
+def get_registry() -> StoreRegistry:
+    return _registry
+
+
+async def init_store() -> Any:
+    return await _registry.startup()
+
+
+async def close_store() -> None:
+    await _registry.shutdown()
+
+
 async def get_store() -> Any:
-    try:
-        store = MongoStore()
-        await store.ensure_indexes()
-        logger.info("Using MongoStore")
-        return store
-    except Exception as e:
-        logger.warning(f"Mongo unavailable, using InMemoryStore: {e}")
-        return InMemoryStore()
+    return await _registry.get()
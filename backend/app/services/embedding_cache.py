@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+
+from .metrics import inc_counter
+
+_CHUNK = 500  # stay under SQLite's bound-parameter limit
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (model name, sha1(text)).
+    A small in-memory LRU sits in front of an optional SQLite file so re-ingesting
+    a video (or repeating a query) only encodes texts that were never seen before.
+    """
+
+    def __init__(self, path: Optional[str], memory_items: int = 20000) -> None:
+        self.memory_items = memory_items
+        self._mem: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, text_hash TEXT NOT NULL, vec BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    def _remember(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        if self.memory_items <= 0:
+            return
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        hashes = [text_hash(t) for t in texts]
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            missing: Dict[str, List[int]] = {}
+            for i, h in enumerate(hashes):
+                vec = self._mem.get((model, h))
+                if vec is not None:
+                    self._mem.move_to_end((model, h))
+                    out[i] = vec
+                else:
+                    missing.setdefault(h, []).append(i)
+
+            if missing and self._db is not None:
+                keys = list(missing)
+                for lo in range(0, len(keys), _CHUNK):
+                    chunk = keys[lo : lo + _CHUNK]
+                    marks = ",".join("?" * len(chunk))
+                    rows = self._db.execute(
+                        f"SELECT text_hash, vec FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                        [model, *chunk],
+                    ).fetchall()
+                    for h, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        self._remember((model, h), vec)
+                        for i in missing[h]:
+                            out[i] = vec
+
+        hits = sum(1 for v in out if v is not None)
+        inc_counter("cache_hits:embedding", hits)
+        inc_counter("cache_misses:embedding", len(out) - hits)
+        return out
+
+    def put_many(
+        self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]], persist: bool = True
+    ) -> None:
+        """
+        Remember vectors in the LRU and, with `persist`, in SQLite. Query vectors are not
+        persisted: user traffic would grow the file without bound, while documents are bounded
+        by what has been ingested.
+        """
+        rows = []
+        with self._lock:
+            for t, v in zip(texts, vectors):
+                vec = np.asarray(v, dtype=np.float32)
+                h = text_hash(t)
+                self._remember((model, h), vec)
+                rows.append((model, h, vec.tobytes()))
+            if self._db is not None and rows and persist:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 from loguru import logger
 
 from sentence_transformers import SentenceTransformer
 from ..config import settings
+from .embedding_cache import EmbeddingCache
 
 _model: SentenceTransformer | None = None
+_executor: ThreadPoolExecutor | None = None
+_ingest_executor: ThreadPoolExecutor | None = None
+_embedding_cache: EmbeddingCache | None = None
 
 
 def get_model() -> SentenceTransformer:
@@ -17,10 +23,131 @@ def get_model() -> SentenceTransformer:
     return _model
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    model = get_model()
-    vectors = model.encode(texts, normalize_embeddings=True).tolist()
-    return vectors
+def get_executor() -> ThreadPoolExecutor:
+    """Dedicated worker thread(s) for query model.encode so the event loop never blocks on it."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.EMBEDDING_WORKERS), thread_name_prefix="embed"
+        )
+    return _executor
 
 
+def get_ingest_executor() -> ThreadPoolExecutor:
+    """Separate worker(s) for document batches, so queries never queue behind an ingest batch."""
+    global _ingest_executor
+    if _ingest_executor is None:
+        _ingest_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.INGEST_EMBEDDING_WORKERS), thread_name_prefix="embed-ingest"
+        )
+    return _ingest_executor
 
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MEMORY_ITEMS)
+    return _embedding_cache
+
+
+def embed_texts(texts: List[str], persist: bool = True) -> List[List[float]]:
+    """
+    Embed texts, encoding only those not already in the embedding cache. New vectors go to the
+    on-disk cache only with `persist` (documents); query vectors stay in the in-memory LRU.
+    """
+    cache = get_embedding_cache()
+    cached = cache.get_many(settings.EMBEDDING_MODEL, texts)
+    todo = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    fresh = {}
+    if todo:
+        model = get_model()
+        encoded = model.encode(todo, normalize_embeddings=True)
+        cache.put_many(settings.EMBEDDING_MODEL, todo, encoded, persist=persist)
+        fresh = dict(zip(todo, encoded))
+    return [(v if v is not None else fresh[t]).tolist() for t, v in zip(texts, cached)]
+
+
+async def run_in_worker(
+    texts: List[str], executor: Optional[ThreadPoolExecutor] = None, persist: bool = True
+) -> List[List[float]]:
+    loop = asyncio.get_running_loop()
+    # resolve embed_texts at call time so it can be swapped (tests, alternate backends)
+    return await loop.run_in_executor(executor or get_executor(), lambda: embed_texts(texts, persist=persist))
+
+
+class QueryBatcher:
+    """
+    Collects concurrent query texts for a short window (or until `max_batch` items)
+    and encodes them with a single embed_texts call on the embedding worker.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int) -> None:
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # futures are loop-bound; drop anything queued on a previous loop
+            self._loop, self._pending, self._timer = loop, [], None
+        fut: asyncio.Future = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch and self._loop is not None:
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await run_in_worker(unique, persist=False)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        by_text = dict(zip(unique, vectors))
+        for text, fut in batch:
+            if not fut.done():
+                fut.set_result(by_text[text])
+
+
+_batcher: QueryBatcher | None = None
+
+
+def get_batcher() -> QueryBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = QueryBatcher(settings.EMBEDDING_BATCH_WINDOW_MS, settings.EMBEDDING_MAX_BATCH)
+    return _batcher
+
+
+async def embed_query(text: str) -> List[float]:
+    """Embed a single query, micro-batched with other in-flight queries."""
+    return await get_batcher().embed(text)
+
+
+async def embed_queries(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of queries in one call on the query worker; vectors stay out of the disk cache."""
+    if not texts:
+        return []
+    return await run_in_worker(texts, persist=False)
+
+
+async def embed_documents(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of documents off the event loop, on the ingest embedding worker."""
+    if not texts:
+        return []
+    return await run_in_worker(texts, get_ingest_executor())
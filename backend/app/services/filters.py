@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class SegmentFilter:
+    """
+    Constraints on retrieved segments beyond the single `video_id` scope: a set of videos and
+    a time range. A segment is in range when it overlaps [t_from, t_to]. Every retriever
+    (Atlas $vectorSearch, the local stores and BM25) applies it before ranking, so filtered
+    queries still return k hits when k exist. Hashable, so it can be part of cache keys.
+    """
+
+    video_ids: Optional[Tuple[str, ...]] = None
+    t_from: Optional[float] = None
+    t_to: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return self.video_ids is not None or self.t_from is not None or self.t_to is not None
+
+    def matches(self, doc: Dict[str, Any]) -> bool:
+        if self.video_ids is not None and doc.get("video_id") not in self.video_ids:
+            return False
+        if self.t_from is not None and float(doc.get("end_time", 0.0)) < self.t_from:
+            return False
+        if self.t_to is not None and float(doc.get("start_time", 0.0)) > self.t_to:
+            return False
+        return True
+
+    def to_mongo(self, video_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        MQL for both find() and $vectorSearch.filter (which only accepts the operators used
+        here, on fields declared as "filter" in atlas/vector_index.json).
+        """
+        clauses: List[Dict[str, Any]] = []
+        if video_id:
+            clauses.append({"video_id": {"$eq": video_id}})
+        if self.video_ids is not None:
+            clauses.append({"video_id": {"$in": list(self.video_ids)}})
+        if self.t_from is not None:
+            clauses.append({"end_time": {"$gte": self.t_from}})
+        if self.t_to is not None:
+            clauses.append({"start_time": {"$lte": self.t_to}})
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def build_filter(
+    video_ids: Optional[List[str]] = None, t_from: Optional[float] = None, t_to: Optional[float] = None
+) -> Optional[SegmentFilter]:
+    f = SegmentFilter(tuple(dict.fromkeys(video_ids)) if video_ids is not None else None, t_from, t_to)
+    return f if f else None
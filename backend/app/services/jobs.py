@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import multiprocessing
+import time
+from uuid import uuid4
+from loguru import logger
+
+from ..config import settings
+from . import transcript as transcript_service
+from .search import index_segments, index_videos
+from .uploads import discard_staged
+
+
+class IngestQueueFull(RuntimeError):
+    pass
+
+
+class IngestConflict(RuntimeError):
+    pass
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    video_id: str
+    video_url: str
+    title: str
+    status: str = "queued"  # queued | running | done | failed
+    stage: str = "queued"  # queued | transcript | indexing | done
+    segments_total: int = 0
+    segments_indexed: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # bulk subtitle jobs ingest several videos (video_id/video_url are then empty)
+    videos: List[str] = field(default_factory=list)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def load_transcript(video_url: str) -> List[Dict[str, Any]]:
+    """
+    Blocking transcript stage (YouTube captions, else Whisper), run on the ingest worker pool.
+    Returns segment dicts ready for index_segments.
+    """
+    try:
+        raw_segments = transcript_service.load_youtube_transcript(video_url)
+        logger.info(f"loaded YouTube transcript for {video_url}")
+    except Exception as e:
+        logger.warning(f"transcript not available, using Whisper fallback: {e}")
+        raw_segments = transcript_service.load_whisper_transcript(video_url)
+
+    # Normalize format
+    if raw_segments and isinstance(raw_segments[0], dict) and "text" in raw_segments[0]:
+        return list(raw_segments)
+    return transcript_service.segment_transcript(raw_segments)
+
+
+class IngestJobManager:
+    """
+    Runs ingest jobs in the background with bounded concurrency.
+    A job for a video that is already queued or running is de-duplicated to the in-flight job.
+    """
+
+    def __init__(self) -> None:
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._inflight: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._executor: Optional[Executor] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(max(1, settings.INGEST_MAX_CONCURRENCY))
+        return loop
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            workers = max(1, settings.INGEST_WORKERS)
+            if settings.INGEST_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        return self._executor
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def submit(self, video_id: str, video_url: str, title: str) -> IngestJob:
+        self._bind_loop()
+        existing = self._inflight.get(video_id)
+        if existing is not None:
+            return self._jobs[existing]
+        job = self._new_job(video_id=video_id, video_url=video_url, title=title)
+        self._start(job, [video_id], lambda: self._ingest_video(job))
+        return job
+
+    def submit_subtitles(self, files: List[Tuple[str, str, str]], workdir: str) -> Tuple[IngestJob, List[str]]:
+        """
+        Queue a bulk ingest of staged caption files, given as (video_id, title, path) (see
+        stage_subtitles). `workdir` is removed once the job finishes. Videos that already have
+        a job in flight are skipped (their ids are returned) so no video is indexed by two jobs
+        at once; IngestConflict is raised when that leaves nothing to do.
+        """
+        self._bind_loop()
+        skipped = [video_id for video_id, _, _ in files if video_id in self._inflight]
+        files = [f for f in files if f[0] not in self._inflight]
+        if not files:
+            raise IngestConflict(f"all {len(skipped)} videos already have an ingest job in flight")
+        videos = [video_id for video_id, _, _ in files]
+        job = self._new_job(video_id="", video_url="", title=f"{len(files)} subtitle files", videos=videos)
+        self._start(job, videos, lambda: self._ingest_subtitles(job, files), cleanup=lambda: discard_staged(workdir))
+        return job, skipped
+
+    def _new_job(self, **fields: Any) -> IngestJob:
+        pending = sum(1 for j in self._jobs.values() if not j.finished)
+        if pending >= settings.INGEST_MAX_PENDING:
+            raise IngestQueueFull(f"{pending} ingest jobs already pending")
+        return IngestJob(job_id=uuid4().hex[:12], **fields)
+
+    def _start(
+        self,
+        job: IngestJob,
+        videos: List[str],
+        work: Callable[[], Awaitable[None]],
+        cleanup: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self._jobs[job.job_id] = job
+        for video_id in videos:
+            self._inflight[video_id] = job.job_id
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job, videos, work, cleanup))
+        self._trim_history()
+
+    def _trim_history(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.finished]
+        for jid in finished[: max(0, len(finished) - settings.INGEST_JOB_HISTORY)]:
+            del self._jobs[jid]
+
+    def _progress(self, job: IngestJob, done: int) -> None:
+        job.segments_indexed = done
+
+    async def _ingest_video(self, job: IngestJob) -> None:
+        job.stage = "transcript"
+        loop = asyncio.get_running_loop()
+        segments = await loop.run_in_executor(self._get_executor(), load_transcript, job.video_url)
+        job.segments_total = len(segments)
+
+        job.stage = "indexing"
+        await index_segments(job.video_id, job.title, segments, on_progress=lambda n: self._progress(job, n))
+
+    async def _ingest_subtitles(self, job: IngestJob, files: List[Tuple[str, str, str]]) -> None:
+        """
+        Parse caption files on the ingest pool (at most 2 per worker in flight) and index them
+        as they finish, so all videos share embedding batches. Unparseable files are skipped
+        and reported in job.error.
+        """
+        job.stage = "transcript"
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        errors: List[str] = []
+
+        async def parse(video_id: str, title: str, path: str) -> Tuple[str, str, List[Dict[str, Any]]]:
+            try:
+                return video_id, title, await loop.run_in_executor(executor, transcript_service.load_subtitles, path)
+            except Exception as e:
+                logger.warning(f"[{job.job_id}] could not parse subtitles for {video_id}: {e}")
+                errors.append(f"{video_id}: {e}")
+                return video_id, title, []
+
+        async def parsed() -> AsyncIterator[Tuple[str, str, List[Dict[str, Any]]]]:
+            todo = iter(files)
+            limit = 2 * max(1, settings.INGEST_WORKERS)
+            running: set = set()
+            try:
+                while True:
+                    while len(running) < limit:
+                        item = next(todo, None)
+                        if item is None:
+                            break
+                        running.add(asyncio.ensure_future(parse(*item)))
+                    if not running:
+                        return
+                    done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        video_id, title, segments = task.result()
+                        job.segments_total += len(segments)
+                        job.stage = "indexing"
+                        yield video_id, title, segments
+            finally:
+                for task in running:
+                    task.cancel()
+
+        try:
+            await index_videos(parsed(), on_progress=lambda n: self._progress(job, n))
+        finally:
+            if errors:
+                job.error = "; ".join(errors)
+
+    async def _run(
+        self,
+        job: IngestJob,
+        videos: List[str],
+        work: Callable[[], Awaitable[None]],
+        cleanup: Optional[Callable[[], None]] = None,
+    ) -> None:
+        assert self._sem is not None
+        try:
+            async with self._sem:
+                job.status = "running"
+                await work()
+                job.stage = "done"
+                job.status = "done"
+                target = job.video_id or f"{len(videos)} videos"
+                logger.info(f"[{job.job_id}] indexed {job.segments_indexed} segments for {target}")
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            logger.exception(f"[{job.job_id}] ingest failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            for video_id in videos:
+                if self._inflight.get(video_id) == job.job_id:
+                    del self._inflight[video_id]
+            self._tasks.pop(job.job_id, None)
+            if cleanup is not None:
+                cleanup()
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_manager = IngestJobManager()
+
+
+def get_job_manager() -> IngestJobManager:
+    return _manager
@@ -1,13 +1,102 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+import math
+import re
 import threading
 import time
 
 _lock = threading.Lock()
 _counters: Dict[str, int] = defaultdict(int)
-_histograms: Dict[str, List[float]] = defaultdict(list)
+
+# Log-bucketed histograms: bucket i covers [GROWTH**i, GROWTH**(i+1)), i.e. ~2% relative error
+# with a fixed number of buckets regardless of how many samples are recorded.
+GROWTH = 1.02
+_LOG_GROWTH = math.log(GROWTH)
+_ZERO_BUCKET = -(10**6)
+
+# Rolling window: WINDOW_SLOTS slots of WINDOW_S / WINDOW_SLOTS seconds each
+WINDOW_S = 60.0
+WINDOW_SLOTS = 6
+_SLOT_S = WINDOW_S / WINDOW_SLOTS
+
+_QUANTILES = (0.50, 0.95, 0.99)
+
+
+def _bucket(value: float) -> int:
+    if value <= 0.0:
+        return _ZERO_BUCKET
+    return math.floor(math.log(value) / _LOG_GROWTH)
+
+
+def _bucket_value(b: int) -> float:
+    if b == _ZERO_BUCKET:
+        return 0.0
+    # geometric midpoint of the bucket
+    return GROWTH ** (b + 0.5)
+
+
+class _Stats:
+    __slots__ = ("counts", "n", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, b: int, value: float) -> None:
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.n += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "_Stats") -> None:
+        for b, c in list(other.counts.items()):
+            self.counts[b] = self.counts.get(b, 0) + c
+        self.n += other.n
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+class _Histogram:
+    """Per-thread histogram shard: cumulative stats plus a ring of rolling-window slots."""
+
+    __slots__ = ("all", "slots", "epochs")
+
+    def __init__(self) -> None:
+        self.all = _Stats()
+        self.slots: List[_Stats] = [_Stats() for _ in range(WINDOW_SLOTS)]
+        self.epochs: List[int] = [-1] * WINDOW_SLOTS
+
+    def record(self, value: float, now: float) -> None:
+        b = _bucket(value)
+        self.all.record(b, value)
+        epoch = int(now // _SLOT_S)
+        i = epoch % WINDOW_SLOTS
+        if self.epochs[i] != epoch:
+            self.slots[i] = _Stats()
+            self.epochs[i] = epoch
+        self.slots[i].record(b, value)
+
+
+# Each recording thread owns a shard, so observe_histogram takes no lock;
+# snapshot() merges the shards.
+_shards: List[Dict[str, _Histogram]] = []
+_shards_lock = threading.Lock()
+_local = threading.local()
+
+
+def _shard() -> Dict[str, _Histogram]:
+    shard = getattr(_local, "histograms", None)
+    if shard is None:
+        shard = {}
+        _local.histograms = shard
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
 
 
 def inc_counter(name: str, value: int = 1) -> None:
@@ -16,32 +105,103 @@ def inc_counter(name: str, value: int = 1) -> None:
 
 
 def observe_histogram(name: str, value_ms: float) -> None:
-    with _lock:
-        _histograms[name].append(float(value_ms))
+    shard = _shard()
+    h = shard.get(name)
+    if h is None:
+        h = shard[name] = _Histogram()
+    h.record(float(value_ms), time.time())
 
 
-def snapshot() -> Dict[str, object]:
-    with _lock:
-        return {
-            "counters": dict(_counters),
-            "histograms": {k: _summary(v) for k, v in _histograms.items()},
-        }
-
-
-def _summary(values: List[float]) -> Dict[str, float]:
-    if not values:
-        return {"count": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
-    vs = sorted(values)
-    n = len(vs)
-    def pct(p):
-        idx = min(n - 1, max(0, int(p * n) - 1))
-        return vs[idx]
+def _merged(now: float) -> Dict[str, Tuple[_Stats, _Stats]]:
+    """name -> (cumulative stats, rolling-window stats), merged across shards."""
+    current = int(now // _SLOT_S)
+    out: Dict[str, Tuple[_Stats, _Stats]] = {}
+    with _shards_lock:
+        shards = list(_shards)
+    for shard in shards:
+        for name, h in list(shard.items()):
+            total, window = out.setdefault(name, (_Stats(), _Stats()))
+            total.merge(h.all)
+            for epoch, slot in zip(list(h.epochs), list(h.slots)):
+                if current - epoch < WINDOW_SLOTS:
+                    window.merge(slot)
+    return out
+
+
+def _quantile(stats: _Stats, q: float) -> float:
+    if not stats.n:
+        return 0.0
+    rank = max(1, math.ceil(q * stats.n))
+    seen = 0
+    for b in sorted(stats.counts):
+        seen += stats.counts[b]
+        if seen >= rank:
+            return min(_bucket_value(b), stats.max)
+    return stats.max
+
+
+def _summary(stats: _Stats) -> Dict[str, float]:
+    if not stats.n:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
     return {
-        "count": float(n),
-        "p50": pct(0.50),
-        "p95": pct(0.95),
-        "max": vs[-1],
+        "count": float(stats.n),
+        "p50": _quantile(stats, 0.50),
+        "p95": _quantile(stats, 0.95),
+        "p99": _quantile(stats, 0.99),
+        "max": stats.max,
     }
 
 
+def snapshot() -> Dict[str, object]:
+    with _lock:
+        counters = dict(_counters)
+    histograms: Dict[str, object] = {}
+    for name, (total, window) in _merged(time.time()).items():
+        summary: Dict[str, object] = dict(_summary(total))
+        summary[f"last_{int(WINDOW_S)}s"] = _summary(window)
+        histograms[name] = summary
+    return {"counters": counters, "histograms": histograms}
+
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _prom_name(name: str) -> Tuple[str, Optional[str]]:
+    # "latency_ms:/api/search" -> ("latency_ms", "/api/search")
+    base, _, key = name.partition(":")
+    return _NAME_RE.sub("_", base), (key or None)
+
 
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_labels(key: Optional[str], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = ([("key", key)] if key is not None else []) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def prometheus_text() -> str:
+    """Render counters and histograms (as summaries) in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+    lines: List[str] = []
+    typed = set()
+    for name in sorted(counters):
+        base, key = _prom_name(name)
+        if base not in typed:
+            lines.append(f"# TYPE {base} counter")
+            typed.add(base)
+        lines.append(f"{base}{_prom_labels(key)} {counters[name]}")
+    for name, (total, _) in sorted(_merged(time.time()).items()):
+        base, key = _prom_name(name)
+        if base not in typed:
+            lines.append(f"# TYPE {base} summary")
+            typed.add(base)
+        for q in _QUANTILES:
+            lines.append(f"{base}{_prom_labels(key, [('quantile', str(q))])} {_quantile(total, q)}")
+        lines.append(f"{base}_sum{_prom_labels(key)} {total.total}")
+        lines.append(f"{base}_count{_prom_labels(key)} {total.n}")
+    return "\n".join(lines) + "\n"
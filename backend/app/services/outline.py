@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .db import RESULT_FIELDS
+from .filters import SegmentFilter
+
+
+class Outline:
+    """
+    Section tree of one hierarchically segmented video (see iter_hierarchical_segments).
+    Holds the leaf vectors plus, per coarser level, each leaf's section number and one
+    embedding per section: the normalised mean of its leaves. Pooling leaf vectors rather than
+    embedding a 5-minute chapter's text keeps the whole chapter in view (the sentence encoder
+    truncates long inputs) and costs no extra embedding calls.
+    A search walks the levels coarse-to-fine and only scores leaves under the best sections.
+    """
+
+    def __init__(self, docs: List[Dict[str, Any]], vecs: np.ndarray, sections: np.ndarray) -> None:
+        self.docs = docs
+        self.vecs = vecs
+        self.sections = sections  # (leaves, levels), finest level first
+        self._uniq: List[np.ndarray] = []
+        self._centroids: List[np.ndarray] = []
+        for lvl in range(sections.shape[1]):
+            uniq, inv = np.unique(sections[:, lvl], return_inverse=True)
+            sums = np.zeros((len(uniq), vecs.shape[1]), dtype=np.float32)
+            np.add.at(sums, inv, vecs)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._uniq.append(uniq)
+            self._centroids.append(sums / norms)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def levels(self) -> int:
+        return self.sections.shape[1]
+
+    @classmethod
+    def from_docs(cls, docs: Sequence[Dict[str, Any]]) -> "Outline":
+        """Build from stored leaves (with embeddings); videos without a hierarchy get 0 levels."""
+        rows = [d for d in docs if d.get("embedding") is not None and d.get("hierarchy")]
+        depth = len(rows[0]["hierarchy"]) if rows else 0
+        rows = [d for d in rows if len(d["hierarchy"]) == depth]
+        if not rows:
+            return cls([], np.zeros((0, 1), dtype=np.float32), np.zeros((0, 0), dtype=np.int64))
+        vecs = np.asarray([d["embedding"] for d in rows], dtype=np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        sections = np.asarray([d["hierarchy"] for d in rows], dtype=np.int64)
+        leaves = [{k: d[k] for k in RESULT_FIELDS if k in d} for d in rows]
+        return cls(leaves, vecs / norms, sections)
+
+    def search(
+        self, query: Any, k: int, beam: int, filters: Optional[SegmentFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k leaves for `query`. At each level (coarsest first) keep the best `beam` sections
+        among those still in play, widening until they hold at least k leaves.
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+        active = np.ones(len(self.docs), dtype=bool)
+        if filters:
+            active &= np.fromiter((filters.matches(d) for d in self.docs), dtype=bool, count=len(self.docs))
+
+        for lvl in range(self.levels - 1, -1, -1):
+            ids = self.sections[:, lvl]
+            present, counts = np.unique(ids[active], return_counts=True)
+            if not len(present):
+                return []
+            scores = self._centroids[lvl][np.searchsorted(self._uniq[lvl], present)] @ q
+            order = np.argsort(-scores, kind="stable")
+            covered = np.cumsum(counts[order])
+            keep = max(beam, int(np.searchsorted(covered, k)) + 1)
+            active &= np.isin(ids, present[order[:keep]])
+
+        rows = np.flatnonzero(active)
+        scores = self.vecs[rows] @ q
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [{**self.docs[int(rows[i])], "score": float(scores[i])} for i in top]
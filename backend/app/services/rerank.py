@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import asyncio
+from loguru import logger
+
+from ..config import settings
+from .cache import TTLCache, normalize_query
+from .embedding_cache import text_hash
+from .metrics import inc_counter
+
+_model: Any = None
+_executor: ThreadPoolExecutor | None = None
+
+# cross-encoder scores keyed by (normalized query, sha1(segment text))
+_pair_cache = TTLCache("rerank", settings.RERANK_CACHE_SIZE, settings.RERANK_CACHE_TTL_S)
+
+
+def get_cross_encoder() -> Any:
+    global _model
+    if _model is None:
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Loading cross-encoder: {settings.RERANK_MODEL}")
+        _model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+    return _model
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, settings.RERANK_WORKERS), thread_name_prefix="rerank")
+    return _executor
+
+
+def score_pairs(query: str, texts: List[str]) -> List[float]:
+    """Batched cross-encoder inference over (query, text) pairs."""
+    model = get_cross_encoder()
+    scores = model.predict([(query, t) for t in texts], batch_size=settings.RERANK_BATCH_SIZE)
+    return [float(s) for s in scores]
+
+
+def _score_and_cache(query: str, texts: List[str]) -> List[float]:
+    # populates the cache even if the caller already gave up on the deadline
+    scores = score_pairs(query, texts)
+    nq = normalize_query(query)
+    for t, sc in zip(texts, scores):
+        _pair_cache.set((nq, text_hash(t)), sc)
+    return scores
+
+
+async def rerank(
+    query: str,
+    docs: List[Dict[str, Any]],
+    k: int,
+    budget: Optional[int] = None,
+    deadline_ms: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Re-order the first `budget` candidates by cross-encoder score and return the top k.
+    The raw (unbounded) logit goes in `rerank_score`; `score` keeps the first-stage value.
+    If scoring misses the deadline or fails, the first-stage order is returned unchanged.
+    """
+    budget = settings.RERANK_CANDIDATES if budget is None else budget
+    deadline_ms = settings.RERANK_DEADLINE_MS if deadline_ms is None else deadline_ms
+    pool = docs[: max(budget, k)]
+    if len(pool) <= 1:
+        return pool[:k]
+
+    nq = normalize_query(query)
+    texts = [d.get("text") or "" for d in pool]
+    scores: List[Optional[float]] = [_pair_cache.get((nq, text_hash(t))) for t in texts]
+    todo = list(dict.fromkeys(t for t, sc in zip(texts, scores) if sc is None))
+    if todo:
+        loop = asyncio.get_running_loop()
+        try:
+            fresh = await asyncio.wait_for(
+                loop.run_in_executor(get_executor(), _score_and_cache, query, todo),
+                timeout=deadline_ms / 1000.0,
+            )
+        except asyncio.TimeoutError:
+            inc_counter("rerank_timeouts")
+            logger.warning(f"Rerank missed its {deadline_ms:.0f}ms deadline; keeping first-stage order")
+            return docs[:k]
+        except Exception as e:
+            inc_counter("rerank_errors")
+            logger.warning(f"Rerank failed, keeping first-stage order: {e}")
+            return docs[:k]
+        by_text = dict(zip(todo, fresh))
+        scores = [sc if sc is not None else by_text[t] for t, sc in zip(texts, scores)]
+
+    reranked = []
+    for d, sc in zip(pool, scores):
+        reranked.append({**d, "rerank_score": float(sc)})
+    reranked.sort(key=lambda x: x["rerank_score"], reverse=True)
+    return reranked[:k]
@@ -1,101 +1,445 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+import asyncio
 from loguru import logger
-from functools import lru_cache
 
-from .embeddings import embed_texts
-from .db import get_store
+from ..config import settings
+from .bm25 import BM25Index
+from .cache import IndexVersions, TTLCache, normalize_query
+from .embeddings import embed_documents, embed_queries, embed_query
+from .filters import SegmentFilter
+from .db import RESULT_FIELDS, get_store, split_delta
+from .outline import Outline
+from .rerank import rerank as rerank_candidates
+from .tracing import span
 
 
-# simple in-process cache keyed by (video_id, query) - note: lru_cache here only caches keys,
-# actual cached values would require a sync store. Kept for compatibility with earlier design.
-@lru_cache(maxsize=512)
-def _cache_key(video_id: Optional[str], query: str) -> Tuple[Optional[str], str]:
-    return (video_id, query)
+# query-result cache keyed by (normalized query, k, video_id, index version, retrieval options)
+_result_cache = TTLCache("search", settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_S)
+_versions = IndexVersions()
 
+# in-process BM25 index kept in sync by index_segments
+_lexical = BM25Index()
 
-async def index_segments(video_id: str, title: str, segments: List[Dict[str, Any]]) -> None:
+# section trees of hierarchically segmented videos, built lazily from the store per video
+_outlines = TTLCache("outline", settings.HIERARCHY_CACHE_SIZE, settings.HIERARCHY_CACHE_TTL_S)
+
+
+def _cache_key(query: str, k: int, video_id: Optional[str], *options: Any) -> Tuple[Any, ...]:
+    return (normalize_query(query), k, video_id, _versions.current(video_id), *options)
+
+
+def invalidate_video(video_id: str) -> None:
+    """Drop cached results that may include `video_id` (its own and all unscoped queries)."""
+    _versions.bump(video_id)
+    _result_cache.discard_where(lambda key: key[2] is None or key[2] == video_id)
+    _outlines.discard_where(lambda key: key == video_id)
+
+
+def _batched(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+async def index_segments(
+    video_id: str,
+    title: str,
+    segments: Iterable[Dict[str, Any]],
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
     """
     Compute embeddings for each segment and upsert into vector store.
     Each stored doc will include: video_id, title, start_time, end_time, text, embedding, metadata
+    Segments are consumed lazily in INGEST_BATCH_SIZE batches: each batch is embedded while the
+    previous one is being written, and becomes searchable as soon as its write lands.
+    Re-ingests are a delta against what is stored: windows whose content key (see segment_key)
+    already exists are neither re-embedded nor rewritten, new ones are appended, and the ones
+    that vanished are pruned at the end, so the video stays searchable throughout.
+    Returns the number of segments indexed.
     """
-    if not segments:
-        logger.info(f"No segments to index for {video_id}")
-        return
 
-    texts = [s["text"] for s in segments]
-    vectors = embed_texts(texts)
-    for s, v in zip(segments, vectors):
-        s["embedding"] = v
-        s["video_id"] = video_id
-        s["title"] = title
-        # optionally precompute snippet
-        s["snippet"] = s["text"][:300]
+    async def one() -> AsyncIterator[Tuple[str, str, Iterable[Dict[str, Any]]]]:
+        yield video_id, title, segments
 
-    store = await get_store()
-    await store.upsert_segments(video_id, title, segments)
-    logger.info(f"Indexed {len(segments)} segments for video {video_id}")
+    counts = await index_videos(one(), on_progress)
+    return counts.get(video_id, 0)
 
 
-async def _keyword_fallback(query: str, k: int, video_id: Optional[str]) -> List[Dict[str, Any]]:
+async def index_videos(
+    videos: AsyncIterable[Tuple[str, str, Iterable[Dict[str, Any]]]],
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, int]:
     """
-    Very small fallback that scans stored segments and ranks by simple term frequency.
+    index_segments for a stream of (video_id, title, segments): segments of consecutive videos
+    share INGEST_BATCH_SIZE embedding batches, so many short videos (a course's worth of
+    caption files) cost about as many embedding calls as one long one. `on_progress` gets the
+    running segment count across all videos. Returns the segment count per video.
     """
+    size = max(1, settings.INGEST_BATCH_SIZE)
     store = await get_store()
-    docs = await store.list_segments(video_id, limit=5000)
-    q = query.lower()
-    scored: List[Tuple[float, Dict[str, Any]]] = []
-    q_tokens = [tok for tok in q.split() if tok]
+    titles: Dict[str, str] = {}
+    existing: Dict[str, Set[str]] = {}
+    lexical_had: Dict[str, bool] = {}
+    seen: Dict[str, Set[str]] = {}
+    counts: Dict[str, int] = {}
+    fresh_counts: Dict[str, int] = {}
+    buf: List[Tuple[str, Dict[str, Any]]] = []
+    total = 0
+    pending: Optional[asyncio.Task] = None
+
+    def report(done: int) -> None:
+        if on_progress is not None:
+            on_progress(done)
+
+    async def write(groups: Dict[str, List[Dict[str, Any]]], done: int) -> None:
+        with span("ingest_write"):
+            for vid, docs in groups.items():
+                # re-ingests are staged and swapped in by prune_segments (atomically where the
+                # store can); BM25 for those videos is rebuilt at the end instead
+                reingest = bool(existing[vid])
+                await store.append_segments(vid, titles[vid], docs, staged=reingest)
+                if not reingest:
+                    _lexical.add_segments(vid, docs)
+        for vid in groups:
+            invalidate_video(vid)
+        report(done)
+
+    async def flush(batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        nonlocal pending
+        with span("ingest_embed"):
+            vectors = await embed_documents([s["text"] for _, s in batch])
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for (vid, s), v in zip(batch, vectors):
+            groups.setdefault(vid, []).append(
+                {
+                    **s,
+                    "embedding": v,
+                    "video_id": vid,
+                    "title": titles[vid],
+                    # optionally precompute snippet
+                    "snippet": s["text"][:300],
+                }
+            )
+            fresh_counts[vid] = fresh_counts.get(vid, 0) + 1
+        if pending is not None:
+            await pending
+        pending = asyncio.create_task(write(groups, total))
+
+    try:
+        async for video_id, title, segments in videos:
+            titles[video_id] = title
+            if video_id not in existing:
+                lexical_had[video_id] = _lexical.has_video(video_id)
+                existing[video_id] = await store.segment_keys(video_id)
+                seen[video_id] = set()
+            for chunk in _batched(segments, size):
+                total += len(chunk)
+                counts[video_id] = counts.get(video_id, 0) + len(chunk)
+                fresh = split_delta(video_id, chunk, existing[video_id], seen[video_id])
+                buf.extend((video_id, s) for s in fresh)
+                while len(buf) >= size:
+                    batch, buf = buf[:size], buf[size:]
+                    await flush(batch)
+                if not fresh and not buf:
+                    # nothing new left to embed: keep progress moving over unchanged windows
+                    if pending is not None:
+                        await pending
+                        pending = None
+                    report(total)
+        if buf:
+            await flush(buf)
+    finally:
+        if pending is not None:
+            await pending
+
+    for video_id in titles:
+        if not counts.get(video_id):
+            logger.info(f"No segments to index for {video_id}")
+            continue
+        with span("ingest_write"):
+            pruned = await store.prune_segments(video_id, titles[video_id], seen[video_id])
+        fresh = fresh_counts.get(video_id, 0)
+        if existing[video_id] or not lexical_had[video_id]:
+            # BM25 postings are per video: rebuild from the store so unchanged windows (which a
+            # cold-started BM25 may lack) and the swapped-in ones are indexed, stale ones gone
+            _lexical.add_video(video_id, await store.list_segments(video_id, limit=len(seen[video_id])))
+        invalidate_video(video_id)
+        logger.info(
+            f"Indexed {counts[video_id]} segments for video {video_id} "
+            f"({fresh} new, {counts[video_id] - fresh} unchanged, {pruned} removed)"
+        )
+    if counts:
+        await store.persist()
+    return counts
+
+
+async def warm_lexical_index() -> None:
+    """Rebuild the BM25 index from whatever the store already holds (called at startup)."""
+    store = await get_store()
+    docs = await store.list_segments(None, limit=settings.LEXICAL_WARM_LIMIT)
+    by_video: Dict[str, List[Dict[str, Any]]] = {}
     for d in docs:
-        text = (d.get("text") or "").lower()
-        score = sum(text.count(tok) for tok in q_tokens)
-        if score > 0:
-            d2 = dict(d)
-            d2["score"] = float(score)
-            scored.append((float(score), d2))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [d for _, d in scored[:k]]
+        by_video.setdefault(d.get("video_id"), []).append(d)
+    for vid, segs in by_video.items():
+        if vid and not _lexical.has_video(vid):
+            _lexical.add_video(vid, segs)
+    logger.info(f"BM25 index warmed with {len(_lexical)} segments")
+
+
+async def _keyword_fallback(
+    query: str, k: int, video_id: Optional[str], filters: Optional[SegmentFilter] = None
+) -> List[Dict[str, Any]]:
+    """
+    BM25 keyword search over the in-process inverted index.
+    """
+    with span("keyword"):
+        return _lexical.search(query, k, video_id, filters)
+
+
+def _doc_key(d: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    return (d.get("video_id"), d.get("start_time"), d.get("end_time"))
+
+
+def fuse_results(
+    vector: List[Dict[str, Any]],
+    keyword: List[Dict[str, Any]],
+    weights: Tuple[float, float] = (1.0, 1.0),
+    method: str = "rrf",
+) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked vector and keyword lists into one ranking.
+    "rrf" sums w / (RRF_K + rank); "score" min-max normalises each list's scores before a
+    weighted sum. The original scores are kept as vector_score / keyword_score.
+    """
+    fused: Dict[Tuple[Any, Any, Any], Dict[str, Any]] = {}
+    for docs, weight, field in ((vector, weights[0], "vector_score"), (keyword, weights[1], "keyword_score")):
+        if not docs or weight <= 0:
+            continue
+        raw = [float(d.get("score", 0.0)) for d in docs]
+        lo, hi = min(raw), max(raw)
+        for rank, (d, sc) in enumerate(zip(docs, raw), start=1):
+            if method == "score":
+                part = weight * ((sc - lo) / (hi - lo) if hi > lo else 1.0)
+            else:
+                part = weight / (settings.RRF_K + rank)
+            key = _doc_key(d)
+            out = fused.get(key)
+            if out is None:
+                out = fused[key] = {**d, "score": 0.0}
+            out[field] = sc
+            out["score"] += part
+    ranked = list(fused.values())
+    ranked.sort(key=lambda x: (x["score"], x.get("end_time", 0.0)), reverse=True)
+    return ranked
 
 
-async def semantic_search(query: str, k: int = 3, video_id: Optional[str] = None) -> List[Dict[str, Any]]:
+async def semantic_search(
+    query: str,
+    k: int = 3,
+    video_id: Optional[str] = None,
+    mode: str = "vector",
+    weights: Tuple[float, float] = (1.0, 1.0),
+    fusion: str = "rrf",
+    rerank: Optional[bool] = None,
+    filters: Optional[SegmentFilter] = None,
+) -> List[Dict[str, Any]]:
     """
-    Perform vector search using the embedding of the query.
-    Returns top-k documents (each doc is a dict containing at least: video_id, start_time, end_time, text, score).
-    If the vector scores are weak, attempt keyword fallback and merge results.
+    Retrieve top-k documents for `query` (each doc is a dict containing at least:
+    video_id, start_time, end_time, text, score).
+    mode="vector" (default) uses vector search only, with BM25 as a fallback when the vector
+    store returns nothing; `score` is the similarity. mode="hybrid" runs vector and BM25
+    candidate generation concurrently and fuses the two rankings (see fuse_results), so
+    `score` is the fused value (~0.01-0.03 with RRF), not a similarity.
+    Queries scoped to a hierarchically segmented video score its chapters first and then only
+    the leaves under the best ones (see Outline.search).
+    With rerank (default: settings.RERANK_ENABLED) the first RERANK_CANDIDATES results are
+    re-scored by a cross-encoder under a latency deadline.
+    `filters` (more videos, a time range) are applied inside every retriever.
+    Results are served from the query-result cache when the same query was answered
+    against the same index version.
     """
-    # Obtain query vector
-    qv = embed_texts([query])[0]
+    rerank = settings.RERANK_ENABLED if rerank is None else rerank
+    key = _cache_key(query, k, video_id, mode, tuple(weights), fusion, rerank, filters)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        return [dict(d) for d in cached]
 
+    n = max(k, settings.RERANK_CANDIDATES) if rerank else k
+    if mode == "vector":
+        results = await _vector_search(query, n, video_id, filters)
+    else:
+        results = await _hybrid_search(query, n, video_id, weights, fusion, filters)
+    if rerank:
+        with span("rerank"):
+            results = await rerank_candidates(query, results, k)
+    _result_cache.set(key, [dict(d) for d in results])
+    return results
+
+
+async def semantic_search_many(
+    queries: List[str],
+    k: int = 3,
+    video_id: Optional[str] = None,
+    mode: str = "vector",
+    weights: Tuple[float, float] = (1.0, 1.0),
+    fusion: str = "rrf",
+    rerank: Optional[bool] = None,
+    filters: Optional[SegmentFilter] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    semantic_search for many queries sharing the same options, returning one result list per
+    query (in order). Cache misses are embedded with a single embedding call and scored with
+    one store.search_many call (a mat-mat product on the in-memory store); keyword search,
+    fusion and reranking then run per query as in semantic_search.
+    """
+    rerank = settings.RERANK_ENABLED if rerank is None else rerank
+    options = (mode, tuple(weights), fusion, rerank, filters)
+    out: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+    misses: Dict[Tuple[Any, ...], List[int]] = {}
+    for i, query in enumerate(queries):
+        key = _cache_key(query, k, video_id, *options)
+        cached = _result_cache.get(key)
+        if cached is not None:
+            out[i] = [dict(d) for d in cached]
+        else:
+            misses.setdefault(key, []).append(i)
+
+    if misses:
+        n = max(k, settings.RERANK_CANDIDATES) if rerank else k
+        todo = [(key, idx, queries[idx[0]]) for key, idx in misses.items()]
+        with span("embed"):
+            vectors = await embed_queries([q for _, _, q in todo])
+        store = await get_store()
+        with span("retrieve"):
+            outline = await _outline(store, video_id)
+            if outline is not None:
+                candidate_lists = [outline.search(v, n * 4, settings.HIERARCHY_BEAM, filters) for v in vectors]
+            else:
+                candidate_lists = await store.search_many(vectors, n * 4, video_id, filters)
+
+        async def finish(query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            candidates = _sort_candidates(candidates)
+            if mode == "vector":
+                results = await _vector_results(query, candidates, n, video_id, filters)
+            else:
+                keyword = await _keyword_fallback(query, n * 4, video_id, filters)
+                with span("fuse"):
+                    results = fuse_results(candidates, keyword, weights, fusion)[:n]
+            if rerank:
+                with span("rerank"):
+                    results = await rerank_candidates(query, results, k)
+            return results
+
+        finished = await asyncio.gather(*(finish(q, c) for (_, _, q), c in zip(todo, candidate_lists)))
+        for (key, idx, _), results in zip(todo, finished):
+            _result_cache.set(key, [dict(d) for d in results])
+            for i in idx:
+                out[i] = [dict(d) for d in results]
+    return [r or [] for r in out]
+
+
+async def _vector_candidates(
+    query: str, n: int, video_id: Optional[str], filters: Optional[SegmentFilter] = None
+) -> List[Dict[str, Any]]:
+    with span("embed"):
+        qv = await embed_query(query)
     store = await get_store()
-    # Ask for a larger candidate set to allow reranking/merging
-    candidates = await store.search(qv, k * 4, video_id)
-    if not candidates:
-        # fallback immediately to keyword search
-        fb = await _keyword_fallback(query, k, video_id)
-        return fb
+    with span("retrieve"):
+        outline = await _outline(store, video_id)
+        if outline is not None:
+            candidates = outline.search(qv, n, settings.HIERARCHY_BEAM, filters)
+        else:
+            candidates = await store.search(qv, n, video_id, filters)
+    return _sort_candidates(candidates)
+
+
+async def _outline(store: Any, video_id: Optional[str]) -> Optional[Outline]:
+    """
+    Section tree for coarse-to-fine search of `video_id`, or None when hierarchical segmentation
+    is off, the query is not scoped to one video, the video was segmented flat, or it has more
+    than HIERARCHY_MAX_LEAVES leaves. Only lean leaf fields and embeddings are loaded.
+    """
+    if not video_id or settings.SEGMENT_MODE != "hierarchical" or settings.HIERARCHY_BEAM <= 0:
+        return None
+    outline = _outlines.get(video_id)
+    if outline is None:
+        limit = settings.HIERARCHY_MAX_LEAVES
+        docs = await store.list_segments(
+            video_id, limit=limit, with_embedding=True, fields=RESULT_FIELDS + ("hierarchy",)
+        )
+        outline = Outline.from_docs(docs if len(docs) < limit else [])
+        _outlines.set(video_id, outline)
+    return outline if outline.levels else None
 
+
+def _sort_candidates(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # sort primarily by score, secondarily by end_time (prefer later occurrences for context)
     candidates.sort(key=lambda x: (x.get("score", 0.0), x.get("end_time", 0.0)), reverse=True)
-    topk = candidates[:k]
-
-    # If the top score is weak, attempt keyword fallback and merge
-    top_score = topk[0].get("score", 0.0) if topk else 0.0
-    if top_score < 0.2:
-        fb = await _keyword_fallback(query, k, video_id)
-
-        def key(d):
-            return (d.get("video_id"), d.get("start_time"), d.get("end_time"))
-
-        seen = set()
-        merged: List[Dict[str, Any]] = []
-        for d in (topk + fb):
-            kx = key(d)
-            if kx in seen:
-                continue
-            seen.add(kx)
-            merged.append(d)
-        merged.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-        return merged[:k]
-
-    return topk
+    return candidates
+
+
+async def _vector_search(
+    query: str, k: int, video_id: Optional[str], filters: Optional[SegmentFilter] = None
+) -> List[Dict[str, Any]]:
+    # Ask for a larger candidate set to allow reranking/merging
+    candidates = await _vector_candidates(query, k * 4, video_id, filters)
+    return await _vector_results(query, candidates, k, video_id, filters)
+
+
+async def _vector_results(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    k: int,
+    video_id: Optional[str],
+    filters: Optional[SegmentFilter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Top-k of sorted vector `candidates`. With no candidates, keyword search answers instead;
+    when the best similarity is below VECTOR_WEAK_SCORE, BM25 candidates are fused in (RRF)
+    so exact-term matches are not lost. `score` stays the vector similarity (0.0 for hits only
+    BM25 found, which carry keyword_score).
+    """
+    if not candidates:
+        return await _keyword_fallback(query, k, video_id, filters)
+    if candidates[0].get("score", 0.0) >= settings.VECTOR_WEAK_SCORE:
+        return candidates[:k]
+    keyword = await _keyword_fallback(query, k * 4, video_id, filters)
+    if not keyword:
+        return candidates[:k]
+    with span("fuse"):
+        fused = fuse_results(candidates, keyword)[:k]
+    return [{**d, "score": d.get("vector_score", 0.0)} for d in fused]
+
+
+async def _hybrid_search(
+    query: str,
+    k: int,
+    video_id: Optional[str],
+    weights: Tuple[float, float],
+    fusion: str,
+    filters: Optional[SegmentFilter] = None,
+) -> List[Dict[str, Any]]:
+    vector, keyword = await asyncio.gather(
+        _vector_candidates(query, k * 4, video_id, filters),
+        _keyword_fallback(query, k * 4, video_id, filters),
+    )
+    with span("fuse"):
+        return fuse_results(vector, keyword, weights, fusion)[:k]
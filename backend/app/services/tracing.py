@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, Optional
+import time
+
+from .metrics import observe_histogram
+
+
+class Trace:
+    """Per-request stage timings (ms). Repeated spans with the same name accumulate."""
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, ms: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.timings.items()]
+        if total_ms is not None:
+            parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def start_trace() -> Token:
+    return _current.set(Trace())
+
+
+def end_trace(token: Token) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_timings() -> Dict[str, float]:
+    trace = _current.get()
+    return {k: round(v, 3) for k, v in trace.timings.items()} if trace is not None else {}
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time a pipeline stage. Always feeds the `stage_ms:<name>` histogram; also recorded on the
+    current request's Trace when there is one (asyncio tasks inherit it via contextvars).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        observe_histogram(f"stage_ms:{name}", ms)
+        trace = _current.get()
+        if trace is not None:
+            trace.add(name, ms)
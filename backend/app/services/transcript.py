@@ -1,13 +1,31 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Deque, Iterable, Iterator, Optional, Sequence, Tuple
 from loguru import logger
+import multiprocessing
+import re
+import threading
+
+import numpy as np
 
 from youtube_transcript_api import YouTubeTranscriptApi
-import webvtt
 import srt
 import tempfile, os, shutil
 
+from ..config import settings
+
+# Resident Whisper models (LRU by model name) and the chunk-transcription pool
+_whisper_models: "OrderedDict[str, Any]" = OrderedDict()
+_whisper_lock = threading.Lock()
+_whisper_pool: Optional[ProcessPoolExecutor] = None
+
+SUBTITLE_SUFFIXES = (".vtt", ".srt")
+# WebVTT cue timing line ("[hh:]mm:ss.ttt --> [hh:]mm:ss.ttt [settings]") and inline cue tags
+_CUE_TIMING = re.compile(r"((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})")
+_CUE_TAG = re.compile(r"<[^>]*>")
+
 
 def _clean_text(text: str) -> str:
     t = text.strip()
@@ -17,45 +35,116 @@ def _clean_text(text: str) -> str:
     return t
 
 
-def _segment_chunks(
-    sentences: List[Tuple[float, float, str]],
+def iter_segment_chunks(
+    sentences: Iterable[Tuple[float, float, str]],
     window: float = 45.0,
     overlap: float = 15.0,
-) -> List[Dict[str, Any]]:
-    """Segment sentences into overlapping windows for retrieval."""
-    segments: List[Dict[str, Any]] = []
-    n = len(sentences)
-    if n == 0:
-        return segments
-
-    i = 0
-    while i < n:
-        start = sentences[i][0]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily segment sentences into overlapping windows for retrieval.
+    Only the sentences of the current window are buffered, so arbitrarily long
+    transcripts can be streamed through without materialising them.
+    """
+    src = iter(sentences)
+    buf: Deque[Tuple[float, float, str]] = deque()
+    exhausted = False
+
+    def pull() -> bool:
+        nonlocal exhausted
+        if exhausted:
+            return False
+        try:
+            buf.append(next(src))
+            return True
+        except StopIteration:
+            exhausted = True
+            return False
+
+    while buf or pull():
+        start = buf[0][0]
         end = start
         texts: List[str] = []
-        j = i
-        while j < n and (sentences[j][1] - start) <= window:
-            texts.append(sentences[j][2])
-            end = sentences[j][1]
+        j = 0
+        while (j < len(buf) or pull()) and (buf[j][1] - start) <= window:
+            texts.append(buf[j][2])
+            end = buf[j][1]
             j += 1
 
         snippet = _clean_text(" ".join(texts))
         if snippet:
-            segments.append({
+            yield {
                 "start_time": float(start),
                 "end_time": float(end),
                 "text": snippet,
                 "metadata": {},
-            })
+            }
 
-        # advance index with overlap
+        # advance with overlap: drop sentences starting before the next window (at least one)
         advance_to = start + max(window - overlap, 1.0)
-        k = i
-        while k < n and sentences[k][0] < advance_to:
-            k += 1
-        i = max(k, i + 1)
+        drop = 0
+        while (drop < len(buf) or pull()) and buf[drop][0] < advance_to:
+            drop += 1
+        for _ in range(max(drop, 1)):
+            buf.popleft()
+
+
+def iter_hierarchical_segments(
+    sentences: Iterable[Tuple[float, float, str]],
+    levels: Sequence[float] = (15.0, 60.0, 300.0),
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily segment sentences into non-overlapping leaf windows of `levels[0]` seconds, grouped
+    into coarser sections of `levels[1:]` seconds (e.g. 60s parents inside 5-minute chapters).
+    Each leaf carries `hierarchy`: the number of its enclosing section at each coarser level,
+    finest first. Every sentence lands in exactly one leaf, so no audio is embedded twice.
+    """
+    leaf_len, section_lens = levels[0], list(levels[1:])
+    opened: List[Optional[float]] = [None] * len(section_lens)
+    numbers = [-1] * len(section_lens)
+
+    def leaf(buf: List[Tuple[float, float, str]]) -> Optional[Dict[str, Any]]:
+        text = _clean_text(" ".join(t for _, _, t in buf))
+        if not text:
+            return None
+        start, end = buf[0][0], buf[-1][1]
+        # open a new section at the coarsest level this leaf overflows and at every finer one
+        for lvl in range(len(section_lens) - 1, -1, -1):
+            if opened[lvl] is None or end - opened[lvl] > section_lens[lvl]:
+                for j in range(lvl + 1):
+                    opened[j] = start
+                    numbers[j] += 1
+                break
+        return {
+            "start_time": float(start),
+            "end_time": float(end),
+            "text": text,
+            "metadata": {},
+            "hierarchy": list(numbers),
+        }
+
+    buf: List[Tuple[float, float, str]] = []
+    for sent in sentences:
+        if buf and sent[1] - buf[0][0] > leaf_len:
+            out = leaf(buf)
+            if out is not None:
+                yield out
+            buf = []
+        buf.append(sent)
+    if buf:
+        out = leaf(buf)
+        if out is not None:
+            yield out
 
-    return segments
+
+def _segment_chunks(
+    sentences: Iterable[Tuple[float, float, str]],
+    window: float = 45.0,
+    overlap: float = 15.0,
+) -> List[Dict[str, Any]]:
+    """Segment sentences for retrieval (overlapping windows, or a hierarchy per SEGMENT_MODE)."""
+    if settings.SEGMENT_MODE == "hierarchical":
+        return list(iter_hierarchical_segments(sentences, levels=settings.SEGMENT_LEVELS))
+    return list(iter_segment_chunks(sentences, window=window, overlap=overlap))
 
 
 def segment_transcript(
@@ -86,13 +175,150 @@ def load_youtube_transcript(video_url: str, window: float = 30.0, overlap: float
     return _segment_chunks(sentences, window=window, overlap=overlap)
 
 
+def get_whisper_model(model_name: str) -> Any:
+    """Return a loaded Whisper model, keeping the most recently used sizes resident."""
+    import whisper
+
+    with _whisper_lock:
+        model = _whisper_models.get(model_name)
+        if model is not None:
+            _whisper_models.move_to_end(model_name)
+            return model
+        device = settings.WHISPER_DEVICE or None  # None: Whisper picks CUDA when available
+        logger.info(f"Loading Whisper model={model_name} device={device or 'auto'}")
+        model = whisper.load_model(model_name, device=device)
+        _whisper_models[model_name] = model
+        while len(_whisper_models) > max(1, settings.WHISPER_MODEL_CACHE_SIZE):
+            _whisper_models.popitem(last=False)
+        return model
+
+
+def _silence_split_points(
+    audio: np.ndarray,
+    sr: int,
+    target_s: float,
+    search_s: float = 20.0,
+    frame_s: float = 0.03,
+) -> List[int]:
+    """
+    Sample offsets that cut `audio` into roughly `target_s` chunks, each cut placed on the
+    quietest frame (lowest RMS) within +/- `search_s` of the nominal boundary.
+    """
+    frame = max(1, int(sr * frame_s))
+    n_frames = len(audio) // frame
+    target = int(target_s * sr)
+    if n_frames == 0 or target <= 0 or len(audio) <= target * 1.5:
+        return []
+    energy = np.sqrt(np.mean(np.square(audio[: n_frames * frame].reshape(n_frames, frame), dtype=np.float64), axis=1))
+
+    cuts: List[int] = []
+    pos = 0
+    search = int(search_s * sr)
+    while len(audio) - pos > target * 1.5:
+        lo = max(pos + 1, pos + target - search) // frame
+        hi = min(n_frames, (pos + target + search) // frame + 1)
+        if hi <= lo:
+            break
+        best = lo + int(np.argmin(energy[lo:hi]))
+        cut = best * frame + frame // 2
+        cuts.append(cut)
+        pos = cut
+    return cuts
+
+
+def _init_whisper_worker(threads: int) -> None:
+    try:
+        import torch
+
+        torch.set_num_threads(max(1, threads))
+    except Exception:
+        pass
+
+
+def _transcribe_chunk(model_name: str, audio: np.ndarray, offset: float) -> List[Tuple[float, float, str]]:
+    model = get_whisper_model(model_name)
+    result = model.transcribe(audio, fp16=model.device.type == "cuda")
+    sentences = []
+    for seg in result["segments"]:
+        text = _clean_text(seg["text"])
+        if text:
+            sentences.append((offset + float(seg["start"]), offset + float(seg["end"]), text))
+    return sentences
+
+
+def _whisper_core_budget() -> int:
+    """
+    CPU cores one transcription may use. Transcriptions run inside the ingest pool, so up to
+    min(INGEST_WORKERS, INGEST_MAX_CONCURRENCY) of them (each with its own chunk pool) share
+    the machine.
+    """
+    cores = os.cpu_count() or 1
+    concurrent = max(1, min(settings.INGEST_WORKERS, settings.INGEST_MAX_CONCURRENCY))
+    return max(1, cores // concurrent)
+
+
+def _cuda_available() -> bool:
+    if settings.WHISPER_DEVICE:
+        return settings.WHISPER_DEVICE.startswith("cuda")
+    try:
+        import torch
+
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+def _whisper_workers() -> int:
+    """Chunk workers per transcription: WHISPER_WORKERS (0 = all) capped by the core budget."""
+    if _cuda_available():
+        return 1  # one model on the GPU; chunk processes would each load their own copy
+    budget = _whisper_core_budget()
+    return max(1, min(settings.WHISPER_WORKERS or budget, budget))
+
+
+def _get_whisper_pool(workers: int) -> ProcessPoolExecutor:
+    global _whisper_pool
+    if _whisper_pool is None:
+        _whisper_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_whisper_worker,
+            initargs=(max(1, _whisper_core_budget() // workers),),
+        )
+    return _whisper_pool
+
+
+def transcribe_audio(path: str, model_name: str) -> List[Tuple[float, float, str]]:
+    """
+    Transcribe an audio file. Long audio is cut at silences into ~WHISPER_CHUNK_S chunks that
+    are transcribed in parallel across a process pool; timestamps are shifted back by each
+    chunk's offset and stitched in order.
+    """
+    import whisper
+
+    sr = whisper.audio.SAMPLE_RATE
+    audio = whisper.load_audio(path)
+    cuts = _silence_split_points(audio, sr, settings.WHISPER_CHUNK_S)
+    workers = _whisper_workers()
+    if not cuts or workers <= 1:
+        return _transcribe_chunk(model_name, audio, 0.0)
+
+    bounds = list(zip([0] + cuts, cuts + [len(audio)]))
+    logger.info(f"Transcribing {len(bounds)} chunks on {workers} Whisper workers (model={model_name})")
+    pool = _get_whisper_pool(workers)
+    futures = [pool.submit(_transcribe_chunk, model_name, audio[a:b], a / sr) for a, b in bounds]
+    sentences: List[Tuple[float, float, str]] = []
+    for fut in futures:
+        sentences.extend(fut.result())
+    return sentences
+
+
 def load_whisper_transcript(video_url: str, window: float = 30.0, overlap: float = 15.0) -> List[Dict[str, Any]]:
     """
     Download audio from YouTube and transcribe using Whisper (local).
     Requires: yt-dlp, openai-whisper, ffmpeg
     """
     import yt_dlp
-    import whisper
 
     tmpdir = tempfile.mkdtemp()
     out_file = os.path.join(tmpdir, "audio.mp3")
@@ -105,25 +331,15 @@ def load_whisper_transcript(video_url: str, window: float = 30.0, overlap: float
             ydl.download([video_url])
 
         # Step 2: Pick model
-        file_size_mb = os.path.getsize(out_file) / (1024 * 1024)
-        if file_size_mb > 50:  # heuristic: use tiny for long videos
-            model_name = "tiny"
-        else:
-            model_name = "small"
+        model_name = settings.WHISPER_MODEL
+        if not model_name:
+            file_size_mb = os.path.getsize(out_file) / (1024 * 1024)
+            model_name = "tiny" if file_size_mb > 50 else "small"  # heuristic: use tiny for long videos
 
         logger.info(f"Running Whisper transcription with model={model_name}...")
-        model = whisper.load_model(model_name)
-        result = model.transcribe(out_file)
+        sentences = transcribe_audio(out_file, model_name)
 
         # Step 3: Convert to segment format
-        sentences = []
-        for seg in result["segments"]:
-            start = float(seg["start"])
-            end = float(seg["end"])
-            text = _clean_text(seg["text"])
-            if text:
-                sentences.append((start, end, text))
-
         return _segment_chunks(sentences, window=window, overlap=overlap)
 
     finally:
@@ -134,31 +350,60 @@ def load_whisper_transcript(video_url: str, window: float = 30.0, overlap: float
             pass
 
 
+def _iter_blocks(lines: Iterable[str]) -> Iterator[List[str]]:
+    """Group caption file lines into blank-line separated blocks, one block in memory at a time."""
+    block: List[str] = []
+    for line in lines:
+        line = line.rstrip("\r\n").lstrip("\ufeff")
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def iter_vtt_sentences(lines: Iterable[str]) -> Iterator[Tuple[float, float, str]]:
+    """Stream WebVTT cues as (start, end, text); header, NOTE and STYLE blocks have no timing line."""
+    for block in _iter_blocks(lines):
+        for i, line in enumerate(block):
+            m = _CUE_TIMING.search(line)
+            if m:  # an optional cue identifier precedes the timing line
+                text = _clean_text(_CUE_TAG.sub("", " ".join(block[i + 1 :])))
+                if text:
+                    yield _to_seconds(m.group(1)), _to_seconds(m.group(2)), text
+                break
+
+
+def iter_srt_sentences(lines: Iterable[str]) -> Iterator[Tuple[float, float, str]]:
+    """Stream SubRip cues as (start, end, text), parsing one cue block at a time."""
+    for block in _iter_blocks(lines):
+        for sub in srt.parse("\n".join(block) + "\n"):
+            text = _clean_text(sub.content)
+            if text:
+                yield sub.start.total_seconds(), sub.end.total_seconds(), text
+
+
 def load_vtt(file_path: str, window: float = 30.0, overlap: float = 15.0) -> List[Dict[str, Any]]:
-    sentences: List[Tuple[float, float, str]] = []
-    for caption in webvtt.read(file_path):
-        start = _to_seconds(caption.start)
-        end = _to_seconds(caption.end)
-        text = _clean_text(caption.text)
-        if text:
-            sentences.append((start, end, text))
-    return _segment_chunks(sentences, window=window, overlap=overlap)
+    with open(file_path, "r", encoding="utf-8") as f:
+        return _segment_chunks(iter_vtt_sentences(f), window=window, overlap=overlap)
 
 
 def load_srt(file_path: str, window: float = 30.0, overlap: float = 15.0) -> List[Dict[str, Any]]:
-    sentences: List[Tuple[float, float, str]] = []
     with open(file_path, "r", encoding="utf-8") as f:
-        subs = list(srt.parse(f.read()))
-    for sub in subs:
-        start = sub.start.total_seconds()
-        end = sub.end.total_seconds()
-        text = _clean_text(sub.content)
-        if text:
-            sentences.append((start, end, text))
-    return _segment_chunks(sentences, window=window, overlap=overlap)
+        return _segment_chunks(iter_srt_sentences(f), window=window, overlap=overlap)
+
+
+def load_subtitles(file_path: str, window: float = 30.0, overlap: float = 15.0) -> List[Dict[str, Any]]:
+    """Segment a .vtt or .srt file (picklable entry point for the ingest process pool)."""
+    if file_path.lower().endswith(".srt"):
+        return load_srt(file_path, window=window, overlap=overlap)
+    return load_vtt(file_path, window=window, overlap=overlap)
 
 
 def _to_seconds(hhmmss: str) -> float:
-    h, m, s = hhmmss.replace(",", ".").split(":")
-    return int(h) * 3600 + int(m) * 60 + float(s)
+    *hm, s = hhmmss.replace(",", ".").split(":")
+    h, m = ([0] * (2 - len(hm)) + [int(x) for x in hm])[-2:]
+    return h * 3600 + m * 60 + float(s)
 
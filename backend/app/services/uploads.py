@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterator, List, Tuple
+import os
+import shutil
+import tarfile
+import zipfile
+
+from ..config import settings
+from .transcript import SUBTITLE_SUFFIXES
+
+_TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def subtitle_video_id(name: str) -> Tuple[str, str]:
+    """(video_id, title) for a caption file name: its archive path without the extension."""
+    path = PurePosixPath(name.replace("\\", "/"))
+    parts = [p for p in path.with_suffix("").parts if p not in ("/", ".", "..")]
+    return "/".join(parts), path.stem
+
+
+def _is_caption(name: str) -> bool:
+    base = PurePosixPath(name).name
+    return base.lower().endswith(SUBTITLE_SUFFIXES) and not base.startswith(".") and "__MACOSX/" not in name
+
+
+def _archive_members(name: str, fileobj: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _is_caption(info.filename):
+                    with zf.open(info) as member:
+                        yield info.filename, member
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as tf:
+            for info in tf:
+                if info.isfile() and _is_caption(info.name):
+                    member = tf.extractfile(info)
+                    if member is not None:
+                        yield info.name, member
+
+
+def stage_subtitles(uploads: List[Tuple[str, BinaryIO]], dest: str) -> List[Tuple[str, str, str]]:
+    """
+    Copy uploaded .vtt/.srt files, and the caption members of .zip/.tar[.gz] archives, into
+    `dest` so the ingest process pool can parse them by path. Members are streamed out of the
+    archive and written under generated names (never the member path).
+    Returns (video_id, title, path) per caption file; raises ValueError for unsupported files,
+    duplicate video ids, or uploads over SUBTITLE_MAX_FILES / SUBTITLE_MAX_BYTES.
+    """
+    staged: List[Tuple[str, str, str]] = []
+    seen = set()
+    budget = settings.SUBTITLE_MAX_BYTES
+
+    def copy(name: str, src: BinaryIO) -> None:
+        nonlocal budget
+        video_id, title = subtitle_video_id(name)
+        if not video_id:
+            raise ValueError(f"Cannot derive a video id from {name!r}")
+        if video_id in seen:
+            raise ValueError(f"Duplicate video id {video_id!r}")
+        if len(staged) >= settings.SUBTITLE_MAX_FILES:
+            raise ValueError(f"More than {settings.SUBTITLE_MAX_FILES} caption files")
+        seen.add(video_id)
+        path = os.path.join(dest, f"{len(staged):05d}{PurePosixPath(name).suffix.lower()}")
+        with open(path, "wb") as out:
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    break
+                budget -= len(chunk)
+                if budget < 0:
+                    raise ValueError(f"Uploads exceed {settings.SUBTITLE_MAX_BYTES} bytes")
+                out.write(chunk)
+        staged.append((video_id, title, path))
+
+    for name, fileobj in uploads:
+        lower = name.lower()
+        if lower.endswith(SUBTITLE_SUFFIXES):
+            copy(name, fileobj)
+        elif lower.endswith(".zip") or lower.endswith(_TAR_SUFFIXES):
+            try:
+                for member, src in _archive_members(name, fileobj):
+                    copy(member, src)
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                raise ValueError(f"Unreadable archive {name!r}: {e}") from e
+        else:
+            raise ValueError(f"Unsupported file {name!r} (expected .vtt, .srt, .zip or .tar[.gz])")
+    if not staged:
+        raise ValueError("No .vtt/.srt files in upload")
+    return staged
+
+
+def discard_staged(dest: str) -> None:
+    shutil.rmtree(dest, ignore_errors=True)
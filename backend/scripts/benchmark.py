@@ -0,0 +1,313 @@
+"""
+Offline retrieval benchmark: synthetic lecture corpus + deterministic hashing embedder, so
+runs are reproducible without Mongo, model downloads or an LLM.
+
+Measures segmentation and ingest throughput, InMemoryStore.search and semantic_search latency
+percentiles, QPS under concurrency, memory high-water mark, and retrieval quality
+(MRR@10, recall@1/@10). Results are written as JSON for comparing commits.
+
+Usage (from backend/):
+    python -m scripts.benchmark --segments 10000 --queries 500 --out bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services import embeddings as embeddings_service
+from app.services import search as search_service
+from app.services.db import InMemoryStore, get_registry
+from app.services.transcript import iter_segment_chunks
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words embedder: signed feature hashing of tokens, L2-normalised."""
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+        self._slots: Dict[str, Tuple[int, float]] = {}
+
+    def _slot(self, token: str) -> Tuple[int, float]:
+        slot = self._slots.get(token)
+        if slot is None:
+            h = zlib.crc32(token.encode())
+            slot = self._slots[token] = (h % self.dim, 1.0 if (h >> 31) & 1 else -1.0)
+        return slot
+
+    def __call__(self, texts: List[str], persist: bool = True) -> List[List[float]]:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                j, sign = self._slot(token)
+                out[i, j] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).tolist()
+
+
+def make_corpus(
+    n_segments: int, n_videos: int, seed: int = 0, vocab_size: int = 20000, words_per_sentence: int = 12
+) -> Dict[str, List[Tuple[float, float, str]]]:
+    """
+    Synthetic transcripts: video_id -> timed sentences (start, end, text). Each video draws
+    mostly from its own topic slice of the vocabulary so queries have a right answer.
+    Sentence count is chosen so segmentation yields roughly `n_segments` windows overall.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    # 45s windows with 15s overlap over ~5s sentences: ~6 sentences per window, stride 30s
+    sentences_per_video = max(10, int(np.ceil(n_segments / n_videos * 6)))
+    topic = max(50, vocab_size // max(1, n_videos))
+    corpus: Dict[str, List[Tuple[float, float, str]]] = {}
+    for v in range(n_videos):
+        base = (v * topic) % vocab_size
+        local = rng.integers(base, base + topic, size=(sentences_per_video, words_per_sentence)) % vocab_size
+        common = rng.integers(0, vocab_size, size=(sentences_per_video, 2))
+        words = np.concatenate([local, common], axis=1)
+        t = 0.0
+        sentences = []
+        for row in words:
+            dur = float(rng.uniform(3.0, 7.0))
+            sentences.append((t, t + dur, " ".join(vocab[row])))
+            t += dur
+        corpus[f"vid{v:05d}"] = sentences
+    return corpus
+
+
+def make_queries(
+    segments: Dict[str, List[Dict[str, Any]]], n_queries: int, seed: int = 0, words: int = 6
+) -> List[Tuple[str, str, float]]:
+    """(query, video_id, start_time) triples: a random word sample from one target segment."""
+    rng = np.random.default_rng(seed + 1)
+    videos = sorted(segments)
+    out = []
+    for _ in range(n_queries):
+        vid = videos[int(rng.integers(len(videos)))]
+        seg = segments[vid][int(rng.integers(len(segments[vid])))]
+        tokens = seg["text"].split()
+        pick = rng.choice(len(tokens), size=min(words, len(tokens)), replace=False)
+        out.append((" ".join(tokens[int(i)] for i in pick), vid, float(seg["start_time"])))
+    return out
+
+
+def percentiles(samples_ms: Sequence[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"count": 0}
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "count": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(arr.max()),
+    }
+
+
+def quality(ranked: List[List[Dict[str, Any]]], truth: List[Tuple[str, str, float]]) -> Dict[str, float]:
+    rr, r1, r10 = [], [], []
+    for docs, (_, vid, start) in zip(ranked, truth):
+        rank = next(
+            (i + 1 for i, d in enumerate(docs[:10]) if d.get("video_id") == vid and float(d.get("start_time", -1)) == start),
+            None,
+        )
+        rr.append(1.0 / rank if rank else 0.0)
+        r1.append(1.0 if rank == 1 else 0.0)
+        r10.append(1.0 if rank else 0.0)
+    n = max(1, len(truth))
+    return {"mrr@10": sum(rr) / n, "recall@1": sum(r1) / n, "recall@10": sum(r10) / n}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_benchmark(
+    segments: int = 10000,
+    videos: int = 20,
+    queries: int = 200,
+    concurrency: int = 16,
+    dim: int = 384,
+    k: int = 10,
+    mode: str = "hybrid",
+    seed: int = 0,
+    trace_memory: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run every stage and return the JSON-serialisable report. `trace_memory` adds the Python
+    heap peak via tracemalloc, which slows everything else down several-fold.
+    """
+    embedder = HashEmbedder(dim)
+    # offline wiring: hashing embedder, pinned in-memory store, no result cache
+    embeddings_service.embed_texts = embedder
+    store = InMemoryStore()
+    get_registry().use(store)
+    search_service._result_cache.maxsize = 0
+    search_service._result_cache.clear()
+
+    if trace_memory:
+        tracemalloc.start()
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "params": {
+                "segments": segments, "videos": videos, "queries": queries, "concurrency": concurrency,
+                "dim": dim, "k": k, "mode": mode, "seed": seed, "ann_backend": settings.ANN_BACKEND,
+                "trace_memory": trace_memory,
+            },
+        }
+    }
+
+    corpus = make_corpus(segments, videos, seed=seed)
+    n_sentences = sum(len(s) for s in corpus.values())
+    t0 = time.perf_counter()
+    chunked = {vid: list(iter_segment_chunks(sentences)) for vid, sentences in corpus.items()}
+    dt = time.perf_counter() - t0
+    n_chunks = sum(len(c) for c in chunked.values())
+    report["segmentation"] = {
+        "sentences": n_sentences, "segments": n_chunks, "seconds": dt, "sentences_per_s": n_sentences / max(dt, 1e-9),
+    }
+
+    t0 = time.perf_counter()
+    for vid, segs in chunked.items():
+        await search_service.index_segments(vid, f"Lecture {vid}", segs)
+    dt = time.perf_counter() - t0
+    report["ingest"] = {"segments": n_chunks, "seconds": dt, "segments_per_s": n_chunks / max(dt, 1e-9)}
+
+    qs = make_queries(chunked, queries, seed=seed)
+    qvecs = embedder([q for q, _, _ in qs])
+
+    store_lat: List[float] = []
+    for qv in qvecs:
+        t0 = time.perf_counter()
+        await store.search(qv, k, None)
+        store_lat.append((time.perf_counter() - t0) * 1000)
+    report["store_search"] = percentiles(store_lat)
+
+    search_lat: List[float] = []
+    ranked: List[List[Dict[str, Any]]] = []
+    for q, _, _ in qs:
+        t0 = time.perf_counter()
+        ranked.append(await search_service.semantic_search(q, k=k, mode=mode))
+        search_lat.append((time.perf_counter() - t0) * 1000)
+    report["semantic_search"] = percentiles(search_lat)
+    report["quality"] = quality(ranked, qs)
+
+    pending = list(qs)
+    conc_lat: List[float] = []
+
+    async def worker() -> None:
+        while pending:
+            q, _, _ = pending.pop()
+            t0 = time.perf_counter()
+            await search_service.semantic_search(q, k=k, mode=mode)
+            conc_lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    dt = time.perf_counter() - t0
+    report["concurrent_search"] = {
+        "concurrency": concurrency, "qps": len(conc_lat) / max(dt, 1e-9), **percentiles(conc_lat),
+    }
+
+    t0 = time.perf_counter()
+    batch = await search_service.semantic_search_many([q for q, _, _ in qs], k=k, mode=mode)
+    dt = time.perf_counter() - t0
+    report["batch_search"] = {"queries": len(batch), "seconds": dt, "qps": len(batch) / max(dt, 1e-9)}
+
+    report["memory"] = {"max_rss_mb": _max_rss_mb()}
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["memory"]["tracemalloc_peak_mb"] = peak / (1024 * 1024)
+    return report
+
+
+def _flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for key, value in report.items():
+        if key == "meta":
+            continue
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}{key}"] = float(value)
+    return out
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """One line per shared metric: baseline -> current and the relative change."""
+    base, cur = _flatten(baseline), _flatten(current)
+    lines = []
+    for name in sorted(base.keys() & cur.keys()):
+        b, c = base[name], cur[name]
+        delta = f"{(c - b) / b * 100:+.1f}%" if b else "n/a"
+        lines.append(f"{name:40s} {b:14.3f} -> {c:14.3f}  {delta}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark")
+    parser.add_argument("--segments", type=int, default=10000, help="approximate corpus size (1k-1M)")
+    parser.add_argument("--videos", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--mode", choices=["hybrid", "vector"], default="hybrid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak (slow)")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run to diff against")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(
+        run_benchmark(
+            segments=args.segments, videos=args.videos, queries=args.queries, concurrency=args.concurrency,
+            dim=args.dim, k=args.k, mode=args.mode, seed=args.seed, trace_memory=args.trace_memory,
+        )
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Wrote {args.out}")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(baseline, report)))
+
+
+if __name__ == "__main__":
+    main()
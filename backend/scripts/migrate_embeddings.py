@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+
+from app.config import settings
+from app.services.db import MongoStore
+
+# Usage: python -m scripts.migrate_embeddings [float32|int8|list]
+if __name__ == "__main__":
+    fmt = sys.argv[1] if len(sys.argv) > 1 else settings.EMBEDDING_STORAGE
+
+    async def main() -> None:
+        store = MongoStore()
+        try:
+            n = await store.migrate_embeddings(fmt)
+            print(f"Migrated {n} embeddings to {fmt}")
+        finally:
+            store.client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import itertools
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+_VECTOR_INDEX = json.loads((Path(__file__).resolve().parents[1] / "atlas" / "vector_index.json").read_text())
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict[str, Any]]) -> None:
+        self._docs = docs
+
+    def limit(self, n: int) -> "FakeCursor":
+        return FakeCursor(self._docs[:n] if n else self._docs)
+
+    def __aiter__(self):
+        self._it = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+                if op == "$exists" and (key in doc) != bool(arg):
+                    return False
+                if op == "$eq" and value != arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Dict[str, Any] | None) -> Dict[str, Any]:
+    if not projection:
+        return dict(doc)
+    meta = {k: doc.get("_vs_score") for k, v in projection.items() if v == {"$meta": "vectorSearchScore"}}
+    fields = {k: v for k, v in projection.items() if k != "_id" and k not in meta}
+    if any(fields.values()):
+        keep_id = projection.get("_id", 1)
+        return {**{k: v for k, v in doc.items() if fields.get(k) or (k == "_id" and keep_id)}, **meta}
+    return {**{k: v for k, v in doc.items() if k not in projection}, **meta}
+
+
+def _filter_paths(query: Dict[str, Any]) -> List[str]:
+    paths = []
+    for key, cond in query.items():
+        if key == "$and":
+            for q in cond:
+                paths.extend(_filter_paths(q))
+        else:
+            paths.append(key)
+    return paths
+
+
+class FakeCollection:
+    """
+    Minimal in-process stand-in for a Motor collection (find/insert/update/delete/aggregate).
+    With vector_search=True, aggregate() emulates Atlas $vectorSearch (exact cosine, with
+    Atlas' stage-order, filter-field and numCandidates rules); otherwise it raises like a
+    deployment without Atlas Search.
+    """
+
+    def __init__(self, vector_search: bool = False) -> None:
+        self.docs: List[Dict[str, Any]] = []
+        self.find_calls: List[Dict[str, Any]] = []
+        self.aggregate_calls: List[List[Dict[str, Any]]] = []
+        self.vector_search = vector_search
+        self._ids = itertools.count(1)
+
+    async def create_index(self, *args, **kwargs) -> None:
+        return None
+
+    async def insert_many(self, docs, ordered=True):
+        for d in docs:
+            d.setdefault("_id", next(self._ids))
+            self.docs.append(dict(d))
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+
+    async def update_many(self, query, update):
+        for d in self.docs:
+            if _matches(d, query):
+                d.update(update.get("$set", {}))
+
+    async def bulk_write(self, ops, ordered=True):
+        by_id = {d["_id"]: d for d in self.docs}
+        for op in ops:
+            doc = by_id.get(op._filter["_id"])
+            if doc is None:
+                continue
+            doc.update(op._doc.get("$set", {}))
+            for key in op._doc.get("$unset", {}):
+                doc.pop(key, None)
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    def find(self, query=None, projection=None, batch_size=None):
+        self.find_calls.append({"query": query or {}, "projection": projection})
+        return FakeCursor([_project(d, projection) for d in self.docs if _matches(d, query or {})])
+
+    def aggregate(self, pipeline):
+        self.aggregate_calls.append(pipeline)
+        if not self.vector_search:
+            raise RuntimeError("$vectorSearch is not supported by this deployment")
+        for i, stage in enumerate(pipeline):
+            if "$vectorSearch" in stage and i != 0:
+                raise RuntimeError("$vectorSearch is only valid as the first stage in a pipeline")
+        out: List[Dict[str, Any]] = [dict(d) for d in self.docs]
+        for stage in pipeline:
+            (op, arg), = stage.items()
+            if op == "$vectorSearch":
+                out = self._vector_search(arg)
+            elif op == "$addFields":
+                out = [{**d, **{k: d["_vs_score"] for k, v in arg.items() if v == {"$meta": "vectorSearchScore"}}} for d in out]
+            elif op == "$project":
+                out = [_project(d, arg) for d in out]
+            elif op == "$match":
+                out = [d for d in out if _matches(d, arg)]
+            elif op == "$limit":
+                out = out[:arg]
+            else:
+                raise RuntimeError(f"unsupported stage {op}")
+        return FakeCursor([{k: v for k, v in d.items() if k != "_vs_score"} for d in out])
+
+    def _vector_search(self, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from app.services.codec import decode_embedding
+
+        fields = {f["path"]: f["type"] for f in _VECTOR_INDEX["fields"]}
+        if fields.get(spec["path"]) != "vector" or spec.get("index") != "vector_index":
+            raise RuntimeError("unknown vector index/path")
+        if not spec["limit"] <= spec["numCandidates"] <= 10000:
+            raise RuntimeError("numCandidates must be >= limit and <= 10000")
+        filt = spec.get("filter") or {}
+        for path in _filter_paths(filt):
+            if fields.get(path) != "filter":
+                raise RuntimeError(f"Path '{path}' needs to be indexed as filter")
+        q = np.asarray(spec["queryVector"], dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        hits = []
+        for d in self.docs:
+            vec = decode_embedding(d.get(spec["path"]))
+            if vec is None or not _matches(d, filt):
+                continue
+            cos = float(vec @ q / (np.linalg.norm(vec) or 1.0))
+            hits.append({**d, "_vs_score": (1.0 + cos) / 2.0})
+        hits.sort(key=lambda d: d["_vs_score"], reverse=True)
+        return hits[: spec["limit"]]
+
+
+class _FakeDB:
+    def __init__(self, collection: FakeCollection) -> None:
+        self.collection = collection
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+class FakeClient:
+    def __init__(self, vector_search: bool = False) -> None:
+        self.collection = FakeCollection(vector_search)
+
+    def __getitem__(self, name):
+        # client[db][collection] -> the single fake collection
+        return _FakeDB(self.collection)
+
+    def close(self) -> None:
+        return None
+
+
+@pytest.fixture
+def fake_mongo_store():
+    from app.services.db import MongoStore
+
+    return MongoStore(FakeClient())
+
+
+@pytest.fixture
+def search_backend(monkeypatch):
+    """
+    Point app.services.search at `store`, with optional fake embedders: embed_documents(texts)
+    and embed_query(text) return vectors synchronously and are wrapped as coroutines.
+    """
+    from app.services import search as search_service
+
+    def use(store, embed_documents=None, embed_query=None):
+        async def fake_get_store():
+            return store
+
+        monkeypatch.setattr(search_service, "get_store", fake_get_store)
+        if embed_documents is not None:
+            async def fake_embed_documents(texts):
+                return embed_documents(texts)
+
+            monkeypatch.setattr(search_service, "embed_documents", fake_embed_documents)
+        if embed_query is not None:
+            async def fake_embed_query(text):
+                return embed_query(text)
+
+            monkeypatch.setattr(search_service, "embed_query", fake_embed_query)
+        return store
+
+    return use
+
+
+@pytest.fixture
+def fake_atlas_store():
+    """MongoStore over a collection that supports $vectorSearch."""
+    from app.services.db import MongoStore
+
+    return MongoStore(FakeClient(vector_search=True))
@@ -0,0 +1,245 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.services import agent
+
+
+DOCS = [{"video_id": "v1", "start_time": 12.0, "end_time": 20.0, "text": "Gradient descent updates weights. More text."}]
+
+
+def _fake_llm(monkeypatch, answer="Use gradient descent [12s-20s]."):
+    built = []
+
+    def factory(**kwargs):
+        built.append(kwargs)
+        return FakeListChatModel(responses=[answer] * 100)
+
+    monkeypatch.setattr(agent.settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(agent, "ChatOpenAI", factory)
+    monkeypatch.setattr(agent, "_client", None)
+    agent._answer_cache.clear()
+    return built
+
+
+def test_llm_client_is_reused_across_calls(monkeypatch):
+    built = _fake_llm(monkeypatch)
+
+    async def run():
+        a = await agent.generate_answer("what is gd?", DOCS)
+        b = await agent.generate_answer("how do weights update?", DOCS)
+        await agent.close_llm_client()
+        return a, b
+
+    a, b = asyncio.run(run())
+    assert a == b == "Use gradient descent [12s-20s]."
+    assert len(built) == 1
+    assert "http_async_client" in built[0]
+
+
+def test_answer_cache_misses_when_window_text_changes(monkeypatch):
+    _fake_llm(monkeypatch)
+    edited = [{**DOCS[0], "text": "Momentum smooths the updates."}]
+
+    async def run():
+        await agent.generate_answer("what is gd?", DOCS)
+        return agent._answer_cache.get(agent._answer_key("what is gd?", edited))
+
+    assert asyncio.run(run()) is None
+    assert agent._answer_key("what is gd?", DOCS) == agent._answer_key("What is GD?", [dict(d) for d in DOCS])
+
+
+def test_llm_client_closes_its_pool_when_the_loop_changes(monkeypatch):
+    _fake_llm(monkeypatch)
+    client = agent.LLMClient()
+
+    async def bind():
+        async with client.chain():
+            return client._http
+
+    first = asyncio.run(bind())
+    second = asyncio.run(bind())
+    assert first is not second
+    assert first.is_closed and not second.is_closed
+    asyncio.run(client.aclose())
+    assert second.is_closed
+
+
+def test_stream_answer_yields_chunks_and_caches(monkeypatch):
+    _fake_llm(monkeypatch)
+
+    async def run():
+        chunks = [c async for c in agent.stream_answer("what is gd?", DOCS)]
+        cached = [c async for c in agent.stream_answer("what is gd?", DOCS)]
+        return chunks, cached
+
+    chunks, cached = asyncio.run(run())
+    assert len(chunks) > 1
+    assert "".join(chunks) == "Use gradient descent [12s-20s]."
+    assert cached == ["Use gradient descent [12s-20s]."]
+
+
+def test_stream_answer_without_llm_yields_snippet(monkeypatch):
+    monkeypatch.setattr(agent.settings, "OPENAI_API_KEY", None)
+
+    async def run():
+        return [c async for c in agent.stream_answer("q", DOCS)]
+
+    assert asyncio.run(run()) == ["Gradient descent updates weights [12s]"]
+
+
+def test_stream_endpoint_sends_results_before_tokens(monkeypatch):
+    from app.main import app
+
+    _fake_llm(monkeypatch, answer="Streamed answer.")
+
+    async def fake_search(query, **kwargs):
+        return DOCS
+
+    monkeypatch.setattr("app.api.routes.semantic_search", fake_search)
+    with TestClient(app) as client:
+        r = client.post("/api/search_timestamps/stream", json={"query": "gd"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(l) for l in r.text.splitlines() if l]
+    assert events[0]["type"] == "results"
+    assert events[0]["results"][0]["t_start"] == 12.0
+    assert {e["type"] for e in events[1:-1]} == {"token"}
+    assert events[-1] == {"type": "done", "answer": "Streamed answer."}
+
+
+class _SlowLLM:
+    """Stands in for the prompt|llm chain yielded by LLMClient.chain()."""
+
+    def __init__(self, delay_s, answer="Slow LLM answer.", error=None):
+        self.delay_s = delay_s
+        self.answer = answer
+        self.error = error
+        self.calls = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+
+def _patch_chain(monkeypatch, llm):
+    from contextlib import asynccontextmanager
+
+    @asynccontextmanager
+    async def chain(self):
+        yield llm
+
+    monkeypatch.setattr(agent.settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(agent.LLMClient, "chain", chain)
+    monkeypatch.setattr(agent, "_client", None)
+    agent._answer_cache.clear()
+
+
+def test_deadline_returns_snippet_and_caches_late_answer(monkeypatch):
+    llm = _SlowLLM(0.2)
+    _patch_chain(monkeypatch, llm)
+    monkeypatch.setattr(agent.settings, "ANSWER_DEADLINE_MS", 20.0)
+    monkeypatch.setattr(agent, "_breaker", agent.CircuitBreaker(threshold=0, cooldown_s=30))
+
+    async def run():
+        first = await agent.generate_answer("q", DOCS)
+        await asyncio.gather(*agent._background)
+        second = await agent.generate_answer("q", DOCS)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == agent.snippet_answer(DOCS)
+    assert second == "Slow LLM answer."
+    assert llm.calls == 1
+
+
+def test_deadline_misses_report_the_late_outcome_to_the_breaker(monkeypatch):
+    llm = _SlowLLM(0.05)
+    _patch_chain(monkeypatch, llm)
+    monkeypatch.setattr(agent.settings, "ANSWER_DEADLINE_MS", 5.0)
+    breaker = agent.CircuitBreaker(threshold=2, cooldown_s=30)
+    monkeypatch.setattr(agent, "_breaker", breaker)
+
+    async def run():
+        # slow but healthy: every call misses the deadline, none counts as a failure
+        for i in range(3):
+            assert await agent.generate_answer(f"slow{i}", DOCS) == agent.snippet_answer(DOCS)
+        await asyncio.gather(*agent._background)
+        healthy = (breaker.state, breaker.failures)
+        llm.error = RuntimeError("upstream down")
+        for i in range(2):
+            await agent.generate_answer(f"failing{i}", DOCS)
+        await asyncio.gather(*agent._background, return_exceptions=True)
+        return healthy, breaker.state
+
+    healthy, after_failures = asyncio.run(run())
+    assert healthy == ("closed", 0)
+    assert after_failures == "open"
+
+
+def test_breaker_opens_after_failures_and_recovers(monkeypatch):
+    from app.services.metrics import snapshot
+
+    llm = _SlowLLM(0.0, error=RuntimeError("upstream down"))
+    _patch_chain(monkeypatch, llm)
+    monkeypatch.setattr(agent.settings, "ANSWER_DEADLINE_MS", 1000.0)
+    breaker = agent.CircuitBreaker(threshold=2, cooldown_s=0.05)
+    monkeypatch.setattr(agent, "_breaker", breaker)
+    skips_before = snapshot()["counters"].get("llm_breaker_skips", 0)
+
+    async def run():
+        for i in range(2):
+            await agent.generate_answer(f"q{i}", DOCS)
+        assert breaker.state == "open"
+        await agent.generate_answer("q-skip", DOCS)
+        assert llm.calls == 2
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+        llm.error = None
+        return await agent.generate_answer("q-trial", DOCS)
+
+    assert asyncio.run(run()) == "Slow LLM answer."
+    assert breaker.state == "closed"
+    assert snapshot()["counters"]["llm_breaker_skips"] == skips_before + 1
+
+
+def test_cancelled_half_open_trial_releases_breaker(monkeypatch):
+    llm = _SlowLLM(1.0)
+    _patch_chain(monkeypatch, llm)
+    monkeypatch.setattr(agent.settings, "ANSWER_DEADLINE_MS", 0.0)
+    breaker = agent.CircuitBreaker(threshold=1, cooldown_s=0.01)
+    monkeypatch.setattr(agent, "_breaker", breaker)
+
+    async def run():
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+        assert breaker.state == "half_open"
+        # client disconnects during the trial call
+        task = asyncio.ensure_future(agent.generate_answer("q-cancel", DOCS))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert breaker.allow()
+        breaker.release()
+
+        # same for a stream closed by the client after its first token
+        class _Streaming:
+            async def astream(self, inputs, config=None):
+                yield "partial"
+                await asyncio.sleep(1.0)
+                yield " never"
+
+        _patch_chain(monkeypatch, _Streaming())
+        assert breaker.allow()
+        breaker.release()
+        stream = agent.stream_answer("q-stream", DOCS)
+        assert await stream.__anext__() == "partial"
+        await stream.aclose()
+        return breaker.allow()
+
+    assert asyncio.run(run()) is True
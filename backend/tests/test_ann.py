@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+
+from app.services import db
+from app.services.ann import IVFIndex
+
+
+def _clustered(n, dim=16, clusters=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    return (centers[labels] + 0.05 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_ivf_matches_exact_search_and_filters_by_video(tmp_path):
+    data = _clustered(600)
+    idx = IVFIndex(nlist=8, nprobe=2, train_min=300)
+    idx.add("a", list(range(300)), data[:300])
+    idx.add("b", list(range(300, 600)), data[300:])
+    assert idx.trained and len(idx) == 600
+
+    q = data[123]
+    normed = data / np.linalg.norm(data, axis=1, keepdims=True)
+    exact = set(np.argsort(-(normed @ (q / np.linalg.norm(q))))[:5].tolist())
+    approx = {i for i, _ in idx.search(q, 5)}
+    assert len(exact & approx) >= 4
+
+    assert all(i >= 300 for i, _ in idx.search(q, 5, video_id="b"))
+
+    path = str(tmp_path / "ann.pkl")
+    idx.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.search(q, 5) == idx.search(q, 5)
+
+    idx.remove_video("a")
+    assert len(idx) == 300
+    assert all(i >= 300 for i, _ in idx.search(q, 10))
+
+
+def test_memory_store_uses_ann_when_enabled(monkeypatch):
+    monkeypatch.setattr(db.settings, "ANN_BACKEND", "ivf")
+    monkeypatch.setattr(db.settings, "ANN_TRAIN_MIN", 100)
+    store = db.InMemoryStore()
+    data = _clustered(200, seed=1)
+    segs = [{"start_time": float(i), "end_time": float(i + 1), "text": str(i), "embedding": v.tolist()} for i, v in enumerate(data)]
+
+    async def run():
+        await store.upsert_segments("a", "A", segs[:100])
+        await store.upsert_segments("b", "B", segs[100:])
+        await store.upsert_segments("a", "A", segs[:100])  # moves "a" after "b"
+        return await store.search(data[150].tolist(), 3, None), await store.search(data[10].tolist(), 3, "a")
+
+    top_any, top_a = asyncio.run(run())
+    assert store._ann is not None and store._ann.trained
+    assert top_any[0]["text"] == "150" and abs(top_any[0]["score"] - 1.0) < 1e-5
+    assert top_a[0]["text"] == "10" and all(d["video_id"] == "a" for d in top_a)
+
+
+def test_mongo_store_snapshots_ann_periodically_and_on_shutdown(monkeypatch, tmp_path, fake_mongo_store):
+    path = str(tmp_path / "ann.pkl")
+    monkeypatch.setattr(db.settings, "ANN_BACKEND", "ivf")
+    monkeypatch.setattr(db.settings, "ANN_INDEX_PATH", path)
+    monkeypatch.setattr(db.settings, "ANN_PERSIST_INTERVAL_S", 3600.0)
+    saves = []
+    monkeypatch.setattr(IVFIndex, "save", lambda self, p: saves.append(len(self)))
+    client = fake_mongo_store.client
+    store = db.MongoStore(client)
+    data = _clustered(40, seed=2)
+    segs = [{"start_time": float(i), "end_time": float(i + 1), "text": str(i), "embedding": v.tolist()} for i, v in enumerate(data)]
+
+    async def run():
+        for i in range(4):
+            await store.upsert_segments(f"v{i}", "T", [dict(s) for s in segs[i * 10 : (i + 1) * 10]])
+            await store.persist()
+        registry = db.StoreRegistry()
+        registry.use(store)
+        await registry.shutdown()
+        await store.persist(force=True)  # nothing changed since the last snapshot
+
+    asyncio.run(run())
+    assert saves == [40]
+
+
+def test_mongo_store_rebuilds_stale_ann_snapshot(monkeypatch, tmp_path, fake_mongo_store):
+    path = str(tmp_path / "ann.pkl")
+    monkeypatch.setattr(db.settings, "ANN_BACKEND", "ivf")
+    monkeypatch.setattr(db.settings, "ANN_INDEX_PATH", path)
+    client = fake_mongo_store.client
+    store = db.MongoStore(client)
+    data = _clustered(20, seed=3)
+    segs = [{"start_time": float(i), "end_time": float(i + 1), "text": str(i), "embedding": v.tolist()} for i, v in enumerate(data)]
+
+    async def run():
+        await store.upsert_segments("a", "A", [dict(s) for s in segs[:10]])
+        await store.persist(force=True)
+        await store.upsert_segments("b", "B", [dict(s) for s in segs[10:]])  # never snapshotted
+        reloaded = db.MongoStore(client)
+        await reloaded.load_ann()
+        return reloaded
+
+    reloaded = asyncio.run(run())
+    assert len(reloaded.ann) == 20
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import time
+
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config import settings
 
 # Monkeypatch transcript and embeddings to avoid network/model load
 from app.services import transcript as transcript_service
@@ -17,7 +20,7 @@ def fake_load_youtube_transcript(url: str):
     ]
 
 
-def fake_embed_texts(texts):
+def fake_embed_texts(texts, persist=True):
     # tiny deterministic vectors
     import numpy as np
     vecs = []
@@ -37,23 +40,116 @@ def test_health():
     assert r.json().get('status') == 'ok'
 
 
+def _wait_for_job(client, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while True:
+        r = client.get(f'/api/ingest_jobs/{job_id}')
+        assert r.status_code == 200
+        job = r.json()
+        if job['status'] in ('done', 'failed') or time.time() > deadline:
+            return job
+        time.sleep(0.05)
+
+
 def test_ingest_and_search(monkeypatch):
     monkeypatch.setattr(transcript_service, 'load_youtube_transcript', fake_load_youtube_transcript)
     monkeypatch.setattr(embeddings_service, 'embed_texts', fake_embed_texts)
-
+    # run the transcript stage in-process so the monkeypatched loader is used
+    monkeypatch.setattr(settings, 'INGEST_EXECUTOR', 'thread')
+
+    with TestClient(app) as client:
+        # ingest (background job)
+        r = client.post('/api/ingest_video', json={"video_url": "https://www.youtube.com/watch?v=TEST123"})
+        assert r.status_code == 202
+        vid = r.json()['video_id']
+        job = _wait_for_job(client, r.json()['job_id'])
+        assert job['status'] == 'done', job
+        assert job['segments_indexed'] == 3
+
+        # search
+        r2 = client.post('/api/search_timestamps', json={"query": "what is machine learning", "k": 3, "video_id": vid})
+        assert r2.status_code == 200
+        data = r2.json()
+        assert 'results' in data and len(data['results']) >= 1
+        assert isinstance(data.get('answer', ''), str)
+
+        # batch search: one result list per query, answers only on request
+        r3 = client.post('/api/search_timestamps:batch', json={"queries": ["machine learning", "neural networks"], "k": 2, "video_id": vid})
+        assert r3.status_code == 200
+        items = r3.json()['items']
+        assert [i['query'] for i in items] == ["machine learning", "neural networks"]
+        assert all(len(i['results']) >= 1 and i['answer'] is None for i in items)
+        r4 = client.post('/api/search_timestamps:batch', json={"queries": ["machine learning"], "answer": True, "video_id": vid})
+        assert isinstance(r4.json()['items'][0]['answer'], str)
+
+
+def test_unknown_ingest_job():
     client = TestClient(app)
-
-    # ingest
-    r = client.post('/api/ingest_video', json={"video_url": "https://www.youtube.com/watch?v=TEST123"})
-    assert r.status_code == 200
-    vid = r.json()['video_id']
-
-    # search
-    r2 = client.post('/api/search_timestamps', json={"query": "what is machine learning", "k": 3, "video_id": vid})
-    assert r2.status_code == 200
-    data = r2.json()
-    assert 'results' in data and len(data['results']) >= 1
-    assert isinstance(data.get('answer', ''), str)
-
-
-
+    assert client.get('/api/ingest_jobs/nope').status_code == 404
+
+
+def test_ingest_subtitles_bulk_upload(monkeypatch):
+    import io
+    import zipfile
+
+    calls = []
+
+    def counting_embed_texts(texts, persist=True):
+        calls.append(len(texts))
+        return fake_embed_texts(texts)
+
+    monkeypatch.setattr(embeddings_service, 'embed_texts', counting_embed_texts)
+    monkeypatch.setattr(settings, 'INGEST_EXECUTOR', 'thread')
+
+    def vtt(topic, n):
+        cues = "".join(
+            f"\n{i // 60:02d}:{i % 60:02d}.000 --> {(i + 4) // 60:02d}:{(i + 4) % 60:02d}.000\n<v Prof>{topic} part {i}</v>\n"
+            for i in range(0, n * 5, 5)
+        )
+        return "WEBVTT\n" + cues
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("course/week1/bulkgradients.vtt", vtt("gradient descent", 20))
+        zf.writestr("course/week2/bulkkernels.vtt", vtt("kernel methods", 20))
+        zf.writestr("course/README.txt", "not a caption file")
+    srt_text = "1\n00:00:00,000 --> 00:00:04,000\nbackpropagation recap\n\n2\n00:00:05,000 --> 00:00:09,000\nchain rule\n"
+
+    with TestClient(app) as client:
+        r = client.post('/api/ingest_subtitles', files=[
+            ("files", ("semester.zip", archive.getvalue(), "application/zip")),
+            ("files", ("bulkbackprop.srt", srt_text.encode(), "application/x-subrip")),
+        ])
+        assert r.status_code == 202, r.text
+        body = r.json()
+        assert sorted(body['videos']) == ["bulkbackprop", "course/week1/bulkgradients", "course/week2/bulkkernels"]
+        job = _wait_for_job(client, body['job_id'])
+        assert job['status'] == 'done', job
+        assert job['segments_total'] == job['segments_indexed'] > 0
+        assert len(calls) == 1  # all three files shared one embedding batch
+
+        hits = client.post('/api/search_timestamps', json={"query": "kernel methods", "k": 1, "video_id": "course/week2/bulkkernels"})
+        assert hits.json()['results'][0]['snippet'].startswith("kernel methods")
+
+        bad = client.post('/api/ingest_subtitles', files=[("files", ("notes.pdf", b"%PDF", "application/pdf"))])
+        assert bad.status_code == 400
+
+
+def test_ingest_subtitles_removes_workdir_on_unexpected_errors(monkeypatch, tmp_path):
+    from app.api import routes
+
+    workdir = tmp_path / "subtitles-upload"
+
+    def mkdtemp(prefix=""):
+        workdir.mkdir()
+        return str(workdir)
+
+    def broken_stage(uploads, dest):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(routes.tempfile, 'mkdtemp', mkdtemp)
+    monkeypatch.setattr(routes, 'stage_subtitles', broken_stage)
+    client = TestClient(app, raise_server_exceptions=False)
+    r = client.post('/api/ingest_subtitles', files=[("files", ("a.vtt", b"WEBVTT\n", "text/vtt"))])
+    assert r.status_code == 500
+    assert not workdir.exists()
@@ -0,0 +1,33 @@
+import asyncio
+
+from app.services import db
+from app.services import embeddings as embeddings_service
+from app.services import search as search_service
+from app.services.bm25 import BM25Index
+from app.services.cache import TTLCache
+from scripts import benchmark
+
+
+def test_hash_embedder_is_deterministic():
+    a = benchmark.HashEmbedder(64)(["gradient descent step", ""])
+    b = benchmark.HashEmbedder(64)(["gradient descent step", ""])
+    assert a == b
+    assert abs(sum(x * x for x in a[0]) - 1.0) < 1e-5
+    assert not any(a[1])
+
+
+def test_small_benchmark_run_reports_all_stages(monkeypatch):
+    # run_benchmark rewires these module globals; let monkeypatch restore them
+    monkeypatch.setattr(embeddings_service, "embed_texts", embeddings_service.embed_texts)
+    monkeypatch.setattr(db, "_registry", db.StoreRegistry())
+    monkeypatch.setattr(search_service, "_result_cache", TTLCache("search", 16, 60))
+    monkeypatch.setattr(search_service, "_lexical", BM25Index())
+
+    report = asyncio.run(benchmark.run_benchmark(segments=300, videos=3, queries=20, concurrency=4, dim=64))
+
+    for section in ("segmentation", "ingest", "store_search", "semantic_search", "concurrent_search", "batch_search", "memory"):
+        assert section in report
+    assert report["ingest"]["segments"] == report["segmentation"]["segments"] > 0
+    assert report["semantic_search"]["count"] == 20
+    assert report["quality"]["mrr@10"] > 0.5
+    assert any(line.startswith("ingest.segments ") for line in benchmark.compare(report, report))
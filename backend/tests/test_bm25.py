@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from app.services.bm25 import BM25Index, tokenize
+from app.services.filters import SegmentFilter
+
+
+def _seg(start, text):
+    return {"start_time": start, "end_time": start + 30.0, "text": text, "embedding": [0.0]}
+
+
+def test_bm25_ranking_and_whole_word_matching():
+    idx = BM25Index()
+    idx.add_video("v1", [
+        _seg(0.0, "gradient descent updates the weights"),
+        _seg(30.0, "we learn about learning rates and gradient descent in detail"),
+        _seg(60.0, "deep learning architectures"),
+    ])
+    idx.add_video("v2", [_seg(0.0, "stochastic gradient descent on minibatches")])
+
+    hits = idx.search("gradient descent", k=10)
+    assert len(hits) == 3
+    assert "embedding" not in hits[0]
+    assert [h["video_id"] for h in idx.search("gradient", k=10, video_id="v2")] == ["v2"]
+    ranged = idx.search("gradient descent", k=10, filters=SegmentFilter(video_ids=("v1",), t_from=40.0))
+    assert [h["start_time"] for h in ranged] == [30.0]
+
+    # "learn" must not match "learning"
+    learn = idx.search("learn", k=10)
+    assert [h["start_time"] for h in learn] == [30.0]
+    assert tokenize("What is ML?") == ["ml"]
+
+
+def test_bm25_reindex_replaces_video():
+    idx = BM25Index()
+    idx.add_video("v1", [_seg(0.0, "old topic")])
+    idx.add_video("v1", [_seg(0.0, "new topic")])
+    assert idx.search("old", k=5) == []
+    assert len(idx) == 1 and idx.search("new", k=5)[0]["text"] == "new topic"
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import time
+
+from app.services.cache import IndexVersions, TTLCache, normalize_query
+from app.services import metrics
+
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache("t_lru", maxsize=2, ttl_s=60.0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b" (least recently used)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    short = TTLCache("t_ttl", maxsize=4, ttl_s=0.01)
+    short.set("x", 1)
+    time.sleep(0.02)
+    assert short.get("x") is None
+
+    counters = metrics.snapshot()["counters"]
+    assert counters["cache_hits:t_lru"] == 3
+    assert counters["cache_misses:t_lru"] == 1
+
+
+def test_index_versions_and_normalization():
+    versions = IndexVersions()
+    assert versions.current("v1") == 0 and versions.current(None) == 0
+    versions.bump("v1")
+    assert versions.current("v1") == 1 and versions.current(None) == 1
+    assert versions.current("v2") == 0
+    assert normalize_query("  What IS   ML ") == "what is ml"
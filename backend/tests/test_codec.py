@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+from bson import BSON
+
+from app.services.codec import VECTOR_SUBTYPE, decode_embedding, embedding_format, encode_embedding
+
+
+def test_float32_and_int8_roundtrip_and_size():
+    rng = np.random.default_rng(0)
+    vec = rng.normal(size=384).astype(np.float32)
+
+    f32, scale = encode_embedding(vec, "float32")
+    assert scale is None and f32.subtype == VECTOR_SUBTYPE
+    assert np.array_equal(decode_embedding(f32), vec)
+
+    i8, scale = encode_embedding(vec, "int8")
+    back = decode_embedding(i8, scale)
+    cos = float(back @ vec / (np.linalg.norm(back) * np.linalg.norm(vec)))
+    assert cos > 0.999
+    assert embedding_format(i8) == "int8" and embedding_format(vec.tolist()) == "list"
+
+    legacy = len(BSON.encode({"embedding": vec.tolist()}))
+    assert len(BSON.encode({"embedding": f32})) * 2 < legacy
+    assert len(BSON.encode({"embedding": i8})) * 7 < legacy
+
+
+def test_migrate_legacy_list_embeddings(fake_mongo_store):
+    store = fake_mongo_store
+    store.col.docs = [
+        {"_id": i, "video_id": "v", "embedding": [float(i), 1.0, 0.0]} for i in range(5)
+    ]
+    migrated = asyncio.run(store.migrate_embeddings("int8", batch_size=2))
+    assert migrated == 5
+    assert all(embedding_format(d["embedding"]) == "int8" for d in store.col.docs)
+    d = store.col.docs[3]
+    assert np.allclose(decode_embedding(d["embedding"], d["embedding_scale"]), [3.0, 1.0, 0.0], atol=0.02)
+    assert asyncio.run(store.migrate_embeddings("int8")) == 0
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services import embeddings as embeddings_service
+from app.services.embedding_cache import EmbeddingCache
+
+
+class CountingModel:
+    def __init__(self):
+        self.seen = []
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.seen.extend(texts)
+        return np.array([[float(len(t)), 0.5] for t in texts], dtype=np.float32)
+
+
+def test_embed_texts_skips_cached_texts(tmp_path, monkeypatch):
+    model = CountingModel()
+    path = str(tmp_path / "emb.sqlite3")
+    monkeypatch.setattr(embeddings_service, "get_model", lambda: model)
+    monkeypatch.setattr(embeddings_service, "_embedding_cache", EmbeddingCache(path, memory_items=8))
+
+    first = embeddings_service.embed_texts(["alpha", "beta", "alpha"])
+    second = embeddings_service.embed_texts(["beta", "gamma"])
+    assert first == [[5.0, 0.5], [4.0, 0.5], [5.0, 0.5]]
+    assert second == [[4.0, 0.5], [5.0, 0.5]]
+    assert model.seen == ["alpha", "beta", "gamma"]
+
+    # a fresh process (empty LRU) still hits the SQLite file
+    reopened = EmbeddingCache(path, memory_items=0)
+    vecs = reopened.get_many(embeddings_service.settings.EMBEDDING_MODEL, ["gamma", "delta"])
+    assert vecs[0].tolist() == [5.0, 0.5] and vecs[1] is None
+
+
+def test_query_vectors_stay_out_of_the_disk_cache(tmp_path, monkeypatch):
+    model = CountingModel()
+    path = str(tmp_path / "emb.sqlite3")
+    monkeypatch.setattr(embeddings_service, "get_model", lambda: model)
+    monkeypatch.setattr(embeddings_service, "_embedding_cache", EmbeddingCache(path, memory_items=8))
+
+    embeddings_service.embed_texts(["some user query"], persist=False)
+    embeddings_service.embed_texts(["some user query"], persist=False)
+    embeddings_service.embed_texts(["a document"])
+    assert model.seen == ["some user query", "a document"]  # LRU still serves repeated queries
+
+    reopened = EmbeddingCache(path, memory_items=0)
+    query, doc = reopened.get_many(embeddings_service.settings.EMBEDDING_MODEL, ["some user query", "a document"])
+    assert query is None and doc is not None
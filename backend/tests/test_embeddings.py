@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.services import embeddings as embeddings_service
+
+
+def test_query_batcher_coalesces_concurrent_queries(monkeypatch):
+    calls = []
+
+    def fake_embed_texts(texts, persist=True):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(embeddings_service, "embed_texts", fake_embed_texts)
+    batcher = embeddings_service.QueryBatcher(window_ms=20.0, max_batch=64)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed(q) for q in ["a", "bb", "ccc", "bb"]))
+
+    out = asyncio.run(run())
+    assert calls == [["a", "bb", "ccc"]]
+    assert out == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+
+
+def test_query_batcher_flushes_at_max_batch(monkeypatch):
+    calls = []
+
+    def fake_embed_texts(texts, persist=True):
+        calls.append(len(texts))
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(embeddings_service, "embed_texts", fake_embed_texts)
+    batcher = embeddings_service.QueryBatcher(window_ms=10_000.0, max_batch=2)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed(q) for q in ["a", "b", "c", "d"]))
+
+    assert len(asyncio.run(run())) == 4
+    assert calls == [2, 2]
+
+
+def test_queries_do_not_wait_behind_document_batches(monkeypatch):
+    import threading
+    import time
+
+    release = threading.Event()
+
+    def fake_embed_texts(texts, persist=True):
+        if len(texts) > 1:  # the ingest batch blocks until the query has been answered
+            release.wait(2.0)
+        return [[1.0] for _ in texts]
+
+    monkeypatch.setattr(embeddings_service, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(embeddings_service, "_batcher", embeddings_service.QueryBatcher(0.0, 8))
+
+    async def run():
+        docs = asyncio.ensure_future(embeddings_service.embed_documents(["d1", "d2", "d3"]))
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        await embeddings_service.embed_query("q")
+        waited = time.perf_counter() - start
+        release.set()
+        await docs
+        return waited
+
+    assert asyncio.run(run()) < 1.0
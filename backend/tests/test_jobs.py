@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.services import jobs as jobs_service
+
+
+def test_jobs_dedupe_inflight_video_and_report_progress(monkeypatch):
+    monkeypatch.setattr(jobs_service.settings, "INGEST_EXECUTOR", "thread")
+
+    def fake_load_transcript(url):
+        time.sleep(0.05)
+        return [{"start_time": 0.0, "end_time": 10.0, "text": "hello"}] * 4
+
+    async def fake_index_segments(video_id, title, segments, on_progress=None):
+        on_progress(len(segments))
+        return len(segments)
+
+    monkeypatch.setattr(jobs_service, "load_transcript", fake_load_transcript)
+    monkeypatch.setattr(jobs_service, "index_segments", fake_index_segments)
+    manager = jobs_service.IngestJobManager()
+
+    async def run():
+        first = manager.submit("vid", "https://youtu.be/vid", "T")
+        second = manager.submit("vid", "https://youtu.be/vid", "T")
+        while not first.finished:
+            await asyncio.sleep(0.01)
+        third = manager.submit("vid", "https://youtu.be/vid", "T")
+        await manager.shutdown()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first is second and third is not first
+    assert first.status == "done" and first.stage == "done"
+    assert first.segments_total == 4 and first.segments_indexed == 4
+
+
+def test_subtitle_upload_skips_videos_with_a_job_in_flight(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs_service.settings, "INGEST_EXECUTOR", "thread")
+    indexed = []
+
+    def fake_load_transcript(url):
+        time.sleep(0.1)
+        return [{"start_time": 0.0, "end_time": 10.0, "text": "hello"}]
+
+    async def fake_index_segments(video_id, title, segments, on_progress=None):
+        indexed.append(video_id)
+        return len(segments)
+
+    async def fake_index_videos(videos, on_progress=None):
+        async for video_id, _, _ in videos:
+            indexed.append(video_id)
+        return {}
+
+    monkeypatch.setattr(jobs_service, "load_transcript", fake_load_transcript)
+    monkeypatch.setattr(jobs_service, "index_segments", fake_index_segments)
+    monkeypatch.setattr(jobs_service, "index_videos", fake_index_videos)
+    monkeypatch.setattr(jobs_service.transcript_service, "load_subtitles", lambda path: [])
+    manager = jobs_service.IngestJobManager()
+    files = [("vid", "T", str(tmp_path / "a.vtt")), ("other", "O", str(tmp_path / "b.vtt"))]
+
+    async def run():
+        url_job = manager.submit("vid", "https://youtu.be/vid", "T")
+        bulk, skipped = manager.submit_subtitles(files, str(tmp_path / "work"))
+        # the URL job still owns "vid"; a second upload of only that video is a conflict
+        assert manager.submit("vid", "https://youtu.be/vid", "T") is url_job
+        try:
+            manager.submit_subtitles(files[:1], str(tmp_path / "work2"))
+            raise AssertionError("expected IngestConflict")
+        except jobs_service.IngestConflict:
+            pass
+        while not (url_job.finished and bulk.finished):
+            await asyncio.sleep(0.01)
+        await manager.shutdown()
+        return bulk, skipped
+
+    bulk, skipped = asyncio.run(run())
+    assert skipped == ["vid"] and bulk.videos == ["other"]
+    assert sorted(indexed) == ["other", "vid"]
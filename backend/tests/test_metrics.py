@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import threading
+
+from app.services import metrics
+
+
+def test_histogram_quantiles_are_accurate_and_bounded():
+    for v in range(1, 10001):
+        metrics.observe_histogram("t_hist:/q", v / 10.0)
+
+    summary = metrics.snapshot()["histograms"]["t_hist:/q"]
+    assert summary["count"] == 10000
+    assert abs(summary["p50"] - 500.0) / 500.0 < 0.03
+    assert abs(summary["p95"] - 950.0) / 950.0 < 0.03
+    assert abs(summary["p99"] - 990.0) / 990.0 < 0.03
+    assert summary["max"] == 1000.0
+    assert summary["last_60s"]["count"] == 10000
+
+    shard = metrics._shard()["t_hist:/q"]
+    assert len(shard.all.counts) < 400  # fixed bucket budget, not one entry per sample
+
+
+def test_sharded_recording_and_prometheus_text():
+    def work():
+        for _ in range(500):
+            metrics.observe_histogram("t_shard:/x", 2.0)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    metrics.inc_counter("t_requests_total:/x", 3)
+
+    assert metrics.snapshot()["histograms"]["t_shard:/x"]["count"] == 2000
+    text = metrics.prometheus_text()
+    assert 't_requests_total{key="/x"} 3' in text
+    assert 't_shard_count{key="/x"} 2000' in text
+    assert 't_shard{key="/x",quantile="0.99"}' in text
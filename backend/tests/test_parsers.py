@@ -31,4 +31,39 @@ Second line
     assert segs and segs[0]['start_time'] == 0.0
 
 
+def test_iter_segment_chunks_is_lazy():
+    from app.services.transcript import iter_segment_chunks
 
+    pulled = []
+
+    def sentences():
+        for i in range(1000):
+            pulled.append(i)
+            yield (i * 5.0, i * 5.0 + 5.0, f"sentence {i}")
+
+    chunks = iter_segment_chunks(sentences(), window=30.0, overlap=15.0)
+    first = next(chunks)
+    assert first["start_time"] == 0.0 and first["end_time"] == 30.0
+    assert len(pulled) < 20
+
+
+def test_hierarchical_segments_nest_without_overlap():
+    from app.services.transcript import iter_hierarchical_segments
+
+    sentences = [(i * 5.0, i * 5.0 + 5.0, f"sentence {i}") for i in range(144)]  # 12 minutes
+    leaves = list(iter_hierarchical_segments(sentences, levels=(15.0, 60.0, 300.0)))
+
+    assert all(l["end_time"] - l["start_time"] <= 15.0 for l in leaves)
+    assert sum(len(l["text"].split()) for l in leaves) == 2 * len(sentences)  # each sentence once
+    assert all(a["end_time"] <= b["start_time"] for a, b in zip(leaves, leaves[1:]))
+    for lvl, length in ((0, 60.0), (1, 300.0)):
+        groups = {}
+        for l in leaves:
+            groups.setdefault(l["hierarchy"][lvl], []).append(l)
+        assert all(g[-1]["end_time"] - g[0]["start_time"] <= length for g in groups.values())
+    # a parent never straddles two chapters
+    chapters = {}
+    for l in leaves:
+        chapters.setdefault(l["hierarchy"][0], set()).add(l["hierarchy"][1])
+    assert all(len(c) == 1 for c in chapters.values())
+    assert leaves[-1]["hierarchy"] == [11, 2]
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.services import rerank as rerank_service
+
+
+def _docs():
+    return [
+        {"video_id": "v", "start_time": float(i), "end_time": float(i + 1), "text": t, "score": 1.0 - i / 10}
+        for i, t in enumerate(["alpha", "beta", "gamma"])
+    ]
+
+
+def test_rerank_reorders_and_caches_pair_scores(monkeypatch):
+    calls = []
+
+    def fake_score_pairs(query, texts):
+        calls.append(list(texts))
+        return [float(len(t)) for t in texts]
+
+    monkeypatch.setattr(rerank_service, "score_pairs", fake_score_pairs)
+    out = asyncio.run(rerank_service.rerank("which one", _docs(), k=2, budget=3, deadline_ms=5000))
+    assert [d["text"] for d in out] == ["alpha", "gamma"]
+    assert out[0]["score"] == 1.0 and out[0]["rerank_score"] == 5.0
+    assert out[1]["score"] == 0.8 and out[1]["rerank_score"] == 5.0
+
+    again = asyncio.run(rerank_service.rerank("Which  one", _docs(), k=2, budget=3, deadline_ms=5000))
+    assert [d["text"] for d in again] == ["alpha", "gamma"]
+    assert len(calls) == 1
+
+
+def test_rerank_deadline_keeps_first_stage_order(monkeypatch):
+    def slow_score_pairs(query, texts):
+        time.sleep(0.3)
+        return [0.0 for _ in texts]
+
+    monkeypatch.setattr(rerank_service, "score_pairs", slow_score_pairs)
+    out = asyncio.run(rerank_service.rerank("slow query", _docs(), k=2, budget=3, deadline_ms=20))
+    assert [d["text"] for d in out] == ["alpha", "beta"]
+    assert "rerank_score" not in out[0]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.services import search as search_service
+from app.services.db import InMemoryStore
+
+
+def _doc(start, score):
+    return {"video_id": "v", "start_time": start, "end_time": start + 30.0, "text": f"t{start}", "score": score}
+
+
+def test_rrf_fusion_rewards_agreement():
+    vector = [_doc(0.0, 0.9), _doc(30.0, 0.8), _doc(60.0, 0.1)]
+    keyword = [_doc(30.0, 12.0), _doc(60.0, 4.0)]
+    fused = search_service.fuse_results(vector, keyword)
+    assert [d["start_time"] for d in fused] == [30.0, 60.0, 0.0]
+    assert fused[0]["vector_score"] == 0.8 and fused[0]["keyword_score"] == 12.0
+
+    only_vector = search_service.fuse_results(vector, keyword, weights=(1.0, 0.0))
+    assert [d["start_time"] for d in only_vector] == [0.0, 30.0, 60.0]
+
+    by_score = search_service.fuse_results(vector, keyword, method="score")
+    assert [d["start_time"] for d in by_score] == [30.0, 0.0, 60.0]
+
+
+def test_hybrid_search_uses_both_retrievers(search_backend):
+    store = search_backend(InMemoryStore(), embed_query=lambda text: [1.0, 0.0])
+
+    segs = [
+        {"start_time": 0.0, "end_time": 30.0, "text": "intro to the course", "embedding": [1.0, 0.0]},
+        {"start_time": 30.0, "end_time": 60.0, "text": "backpropagation explained", "embedding": [0.0, 1.0]},
+    ]
+
+    async def run():
+        await store.upsert_segments("hyb", "T", segs)
+        search_service._lexical.add_video("hyb", segs)
+        search_service.invalidate_video("hyb")
+        return await search_service.semantic_search("backpropagation", k=2, video_id="hyb", mode="hybrid")
+
+    out = asyncio.run(run())
+    assert {d["start_time"] for d in out} == {0.0, 30.0}
+    assert out[0]["start_time"] == 30.0
+
+
+def test_default_mode_scores_are_similarities(search_backend):
+    store = search_backend(InMemoryStore(), embed_query=lambda text: [1.0, 0.0])
+
+    segs = [
+        {"start_time": 0.0, "end_time": 30.0, "text": "intro to the course", "embedding": [1.0, 0.0]},
+        {"start_time": 30.0, "end_time": 60.0, "text": "backpropagation explained", "embedding": [0.6, 0.8]},
+    ]
+
+    async def run():
+        await store.upsert_segments("sim", "T", segs)
+        search_service.invalidate_video("sim")
+        return await search_service.semantic_search("intro", k=2, video_id="sim", rerank=False)
+
+    out = asyncio.run(run())
+    assert [round(d["score"], 3) for d in out] == [1.0, 0.6]
+
+
+def test_vector_mode_fuses_keyword_hits_when_similarity_is_weak(search_backend):
+    store = search_backend(InMemoryStore(), embed_query=lambda text: [1.0, 0.0])
+    segs = [
+        {"start_time": 0.0, "end_time": 30.0, "text": "intro to the course", "embedding": [0.1, 1.0]},
+        {"start_time": 30.0, "end_time": 60.0, "text": "backpropagation explained", "embedding": [0.05, 1.0]},
+    ]
+
+    async def run():
+        await store.upsert_segments("weak", "T", segs)
+        search_service._lexical.add_video("weak", segs)
+        search_service.invalidate_video("weak")
+        return await search_service.semantic_search("backpropagation", k=2, video_id="weak", rerank=False)
+
+    out = asyncio.run(run())
+    assert [d["start_time"] for d in out] == [30.0, 0.0]
+    assert 0.0 < out[0]["score"] < 0.1 and out[0]["keyword_score"] > 0  # still a similarity
+
+
+def test_index_segments_streams_in_batches(monkeypatch, search_backend):
+    batches = []
+
+    def embed_documents(texts):
+        batches.append(len(texts))
+        return [[1.0, float(i)] for i, _ in enumerate(texts)]
+
+    store = search_backend(InMemoryStore(), embed_documents)
+    monkeypatch.setattr(search_service.settings, "INGEST_BATCH_SIZE", 2)
+
+    def gen():
+        for i in range(5):
+            yield {"start_time": i * 10.0, "end_time": i * 10.0 + 10.0, "text": f"segment number {i}"}
+
+    progress = []
+    count = asyncio.run(search_service.index_segments("stream", "S", gen(), on_progress=progress.append))
+    assert count == 5
+    assert batches == [2, 2, 1]
+    assert progress == [2, 4, 5]
+    assert len(store) == 5
+    hits = search_service._lexical.search("number", 10, video_id="stream")
+    assert len(hits) == 5
+
+
+def test_index_segments_reembeds_only_changed_segments(search_backend):
+    embedded = []
+
+    def embed_documents(texts):
+        embedded.extend(texts)
+        return [[1.0, float(len(t))] for t in texts]
+
+    store = search_backend(InMemoryStore(), embed_documents)
+
+    def segs(texts):
+        return [{"start_time": i * 10.0, "end_time": i * 10.0 + 10.0, "text": t} for i, t in enumerate(texts)]
+
+    asyncio.run(search_service.index_segments("delta", "D", segs(["alpha one", "beta two", "gamma three"])))
+    embedded.clear()
+    count = asyncio.run(search_service.index_segments("delta", "D", segs(["alpha one", "beta two", "delta four"])))
+    assert count == 3
+    assert embedded == ["delta four"]
+    assert sorted(d["text"] for d in asyncio.run(store.list_segments("delta"))) == ["alpha one", "beta two", "delta four"]
+    assert search_service._lexical.search("gamma", 10, video_id="delta") == []
+    assert len(search_service._lexical.search("delta", 10, video_id="delta")) == 1
+
+    # BM25 lost the video (e.g. restart past LEXICAL_WARM_LIMIT): an unchanged re-ingest restores it
+    search_service._lexical.remove_video("delta")
+    asyncio.run(search_service.index_segments("delta", "D", segs(["alpha one", "beta two", "delta four", "eps five"])))
+    assert len(search_service._lexical.search("alpha", 10, video_id="delta")) == 1
+    assert len(search_service._lexical.search("eps", 10, video_id="delta")) == 1
+
+
+def test_semantic_search_many_embeds_once_and_matches_single(monkeypatch, search_backend):
+    import numpy as np
+
+    from app.services import embeddings as embeddings_service
+
+    calls = []
+    stored = []
+    vecs = {"backpropagation": [0.0, 1.0], "course intro": [1.0, 0.0]}
+
+    class FakeModel:
+        def encode(self, texts, normalize_embeddings=True):
+            calls.append(list(texts))
+            return np.asarray([vecs[t] for t in texts], dtype=np.float32)
+
+    class FakeCache:
+        def get_many(self, model, texts):
+            return [None] * len(texts)
+
+        def put_many(self, model, texts, vectors, persist=True):
+            stored.append((list(texts), persist))
+
+    # the batch goes through the real query embedding path; only the model and cache are faked
+    monkeypatch.setattr(embeddings_service, "get_model", lambda: FakeModel())
+    monkeypatch.setattr(embeddings_service, "get_embedding_cache", lambda: FakeCache())
+    store = search_backend(InMemoryStore(), embed_query=vecs.__getitem__)
+
+    segs = [
+        {"start_time": 0.0, "end_time": 30.0, "text": "intro to the course", "embedding": [1.0, 0.0]},
+        {"start_time": 30.0, "end_time": 60.0, "text": "backpropagation explained", "embedding": [0.0, 1.0]},
+    ]
+    queries = ["backpropagation", "course intro", "backpropagation"]
+
+    async def run():
+        await store.upsert_segments("many", "T", segs)
+        search_service._lexical.add_video("many", segs)
+        search_service.invalidate_video("many")
+        batch = await search_service.semantic_search_many(queries, k=2, video_id="many")
+        search_service.invalidate_video("many")
+        single = [await search_service.semantic_search(q, k=2, video_id="many") for q in queries]
+        return batch, single
+
+    batch, single = asyncio.run(run())
+    assert calls == [["backpropagation", "course intro"]]
+    assert stored == [(["backpropagation", "course intro"], False)]  # query vectors stay off disk
+    assert [[d["start_time"] for d in r] for r in batch] == [[d["start_time"] for d in r] for r in single]
+    assert batch[0][0]["start_time"] == 30.0 and batch[1][0]["start_time"] == 0.0
+
+
+def test_coarse_to_fine_search_scores_leaves_under_best_chapter(monkeypatch, search_backend):
+    from app.services.transcript import iter_hierarchical_segments
+
+    topics = ["algebra", "biology", "chemistry", "databases"]
+    # 4 five-minute chapters, one topic each; leaf vectors point at their chapter's topic axis
+    sentences = [(i * 5.0, i * 5.0 + 5.0, f"{topics[i // 60]} {i}") for i in range(240)]
+    leaves = list(iter_hierarchical_segments(sentences, levels=(15.0, 60.0, 300.0)))
+
+    def vec(text):
+        axis = topics.index(text.split()[0])
+        return [1.0 if j == axis else 0.05 for j in range(4)]
+
+    search_backend(InMemoryStore(), lambda texts: [vec(t) for t in texts], vec)
+    monkeypatch.setattr(search_service.settings, "HIERARCHY_BEAM", 1)
+    monkeypatch.setattr(search_service.settings, "SEGMENT_MODE", "hierarchical")
+
+    scored = []
+    real_search = search_service.Outline.search
+
+    def spy(self, query, k, beam, filters=None):
+        out = real_search(self, query, k, beam, filters)
+        scored.append(len(self))
+        return out
+
+    monkeypatch.setattr(search_service.Outline, "search", spy)
+
+    async def run():
+        await search_service.index_segments("lecture", "L", leaves)
+        hits = await search_service.semantic_search("chemistry", k=3, video_id="lecture", mode="vector")
+        flat = await search_service.semantic_search("chemistry", k=3, video_id=None, mode="vector")
+        return hits, flat
+
+    hits, flat = asyncio.run(run())
+    assert scored == [len(leaves)]  # scoped query went through the outline, unscoped did not
+    assert len(hits) == 3
+    assert all(600.0 <= h["start_time"] < 900.0 and h["end_time"] - h["start_time"] <= 15.0 for h in hits)
+    assert all(600.0 <= h["start_time"] < 900.0 for h in flat)
+
+
+def test_outline_is_loaded_lean_and_only_in_hierarchical_mode(monkeypatch, fake_mongo_store, search_backend):
+    store = search_backend(fake_mongo_store)
+    leaves = [
+        {"start_time": i * 15.0, "end_time": i * 15.0 + 15.0, "text": f"leaf {i}", "hierarchy": [i // 4, 0],
+         "embedding": [1.0, float(i)], "metadata": {"source": "vtt"}}
+        for i in range(8)
+    ]
+    asyncio.run(store.upsert_segments("lean", "L", leaves))
+    search_service.invalidate_video("lean")
+
+    monkeypatch.setattr(search_service.settings, "SEGMENT_MODE", "window")
+    store.col.find_calls.clear()
+    assert asyncio.run(search_service._outline(store, "lean")) is None
+    assert store.col.find_calls == []
+
+    monkeypatch.setattr(search_service.settings, "SEGMENT_MODE", "hierarchical")
+    outline = asyncio.run(search_service._outline(store, "lean"))
+    assert outline is not None and len(outline) == 8 and outline.levels == 2
+    (call,) = store.col.find_calls
+    assert call["projection"]["embedding"] == 1 and "metadata" not in call["projection"]
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.services import db
+
+
+def _no_mongo():
+    raise RuntimeError("mongo down")
+
+
+def test_registry_reuses_memory_fallback(monkeypatch):
+    monkeypatch.setattr(db, "create_mongo_client", _no_mongo)
+    registry = db.StoreRegistry()
+
+    async def run():
+        first = await registry.get()
+        await first.upsert_segments("v1", "t", [{"start_time": 0.0, "end_time": 1.0, "text": "x", "embedding": [1.0, 0.0]}])
+        second = await registry.get()
+        return first, second, await second.list_segments("v1")
+
+    first, second, items = asyncio.run(run())
+    assert first is second is registry.memory
+    assert len(items) == 1
+
+
+def _seg(start: float, emb):
+    return {"start_time": start, "end_time": start + 10.0, "text": f"t{start}", "embedding": emb}
+
+
+def test_memory_store_search_and_reupsert():
+    store = db.InMemoryStore()
+
+    async def run():
+        await store.upsert_segments("a", "A", [_seg(0.0, [1.0, 0.0]), _seg(10.0, [0.0, 1.0])])
+        await store.upsert_segments("b", "B", [_seg(0.0, [0.9, 0.1])])
+        all_hits = await store.search([1.0, 0.0], 2, None)
+        only_b = await store.search([1.0, 0.0], 5, "b")
+        # re-ingesting "a" must drop its old rows and keep "b" addressable
+        await store.upsert_segments("a", "A", [_seg(5.0, [0.0, 2.0])])
+        after = await store.search([0.0, 1.0], 5, None)
+        return all_hits, only_b, after
+
+    all_hits, only_b, after = asyncio.run(run())
+    assert [(d["video_id"], d["start_time"]) for d in all_hits] == [("a", 0.0), ("b", 0.0)]
+    assert all_hits[0]["score"] > all_hits[1]["score"]
+    assert len(only_b) == 1 and only_b[0]["title"] == "B"
+    assert len(store) == 2
+    assert after[0]["video_id"] == "a" and after[0]["start_time"] == 5.0
+    assert abs(after[0]["score"] - 1.0) < 1e-6
+
+
+def test_reupsert_only_writes_changed_windows(fake_mongo_store):
+    memory = db.InMemoryStore()
+    col = fake_mongo_store.col
+    old = [_seg(float(i), [1.0, float(i)]) for i in range(4)]
+    new = [dict(s) for s in old[:3]] + [_seg(9.0, [0.0, 1.0])]
+
+    async def run(store):
+        await store.upsert_segments("w", "W", [_seg(0.0, [0.5, 0.5])])
+        await store.upsert_segments("v", "V", [dict(s) for s in old])
+        ids = {d["start_time"]: d.get("_id") for d in await store.list_segments("v")}
+        await store.upsert_segments("v", "V2", new)
+        after = await store.list_segments("v")
+        return ids, after, await store.search([0.0, 1.0], 1, "v"), await store.list_segments("w")
+
+    for store in (memory, fake_mongo_store):
+        ids, after, top, other = asyncio.run(run(store))
+        assert sorted(d["start_time"] for d in after) == [0.0, 1.0, 2.0, 9.0]
+        assert {d["title"] for d in after} == {"V2"}
+        assert top[0]["start_time"] == 9.0
+        assert len(other) == 1
+    # unchanged windows keep their documents; only the changed one was rewritten
+    kept = {d["start_time"]: d["_id"] for d in col.docs if d["video_id"] == "v"}
+    assert all(kept[t] == ids[t] for t in (0.0, 1.0, 2.0))
+    assert len(col.docs) == 5
+    if fake_mongo_store.ann is not None:
+        assert len(fake_mongo_store.ann) == 5
+
+
+def test_memory_reingest_swaps_changed_windows_in_one_step():
+    store = db.InMemoryStore()
+
+    async def run():
+        await store.upsert_segments("v", "V", [_seg(0.0, [1.0, 0.0]), _seg(10.0, [0.0, 1.0])])
+        keep = set()
+        fresh = db.split_delta("v", [_seg(0.0, [1.0, 0.0]), _seg(20.0, [0.0, 1.0])], await store.segment_keys("v"), keep)
+        await store.append_segments("v", "V", fresh, staged=True)
+        during = await store.search([0.0, 1.0], 5, "v")
+        await store.prune_segments("v", "V", keep)
+        after = await store.search([0.0, 1.0], 5, "v")
+        return during, after
+
+    during, after = asyncio.run(run())
+    assert sorted(d["start_time"] for d in during) == [0.0, 10.0]
+    assert sorted(d["start_time"] for d in after) == [0.0, 20.0]
+    assert after[0]["start_time"] == 20.0
+
+
+def test_mongo_reingest_swaps_generations_without_mixing_versions(fake_mongo_store, fake_atlas_store):
+    for store in (fake_mongo_store, fake_atlas_store):
+        col = store.col
+        seen = []
+        update_many, delete_many = col.update_many, col.delete_many
+
+        async def search():
+            return sorted(d["start_time"] for d in await store.search([0.0, 1.0], 5, "v"))
+
+        async def spy_update(query, update):
+            await update_many(query, update)
+            seen.append(("retired", await search()))
+
+        async def spy_delete(query):
+            seen.append(("swapped", await search()))
+            await delete_many(query)
+
+        async def run():
+            await store.upsert_segments("v", "V", [_seg(0.0, [1.0, 0.0]), _seg(10.0, [0.0, 1.0])])
+            keep = set()
+            fresh = db.split_delta("v", [_seg(0.0, [1.0, 0.0]), _seg(20.0, [0.0, 1.0])], await store.segment_keys("v"), keep)
+            await store.append_segments("v", "V", fresh, staged=True)
+            seen.append(("staged", await search()))
+            col.update_many, col.delete_many = spy_update, spy_delete
+            await store.prune_segments("v", "V", keep)
+            col.update_many, col.delete_many = update_many, delete_many
+            seen.append(("after", await search()))
+
+        asyncio.run(run())
+        assert seen[0] == ("staged", [0.0, 10.0])
+        assert ("retired", [0.0, 10.0]) in seen
+        assert ("swapped", [0.0, 20.0]) in seen
+        assert seen[-1] == ("after", [0.0, 20.0])
+        assert sorted(d["start_time"] for d in col.docs) == [0.0, 20.0]
+        assert not store._hidden
+
+
+def test_mongo_scan_fallback_streams_ids_and_hydrates_topk(fake_mongo_store):
+    store = fake_mongo_store
+    col = store.col
+
+    async def run():
+        await store.upsert_segments("v", "V", [_seg(float(i), [1.0, i / 10.0]) for i in range(10)])
+        await store.upsert_segments("w", "W", [_seg(0.0, [1.0, 0.0])])
+        col.find_calls.clear()
+        return await store.search([1.0, 0.0], 3, "v")
+
+    hits = asyncio.run(run())
+    assert [d["start_time"] for d in hits] == [0.0, 1.0, 2.0]
+    assert all(d["video_id"] == "v" and "embedding" not in d for d in hits)
+    scan, hydrate = col.find_calls
+    assert scan["projection"] == {"embedding": 1}
+    assert len(hydrate["query"]["_id"]["$in"]) == 3
+
+
+def test_memory_search_many_matches_single_searches():
+    store = db.InMemoryStore()
+    queries = [[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]
+
+    async def run():
+        await store.upsert_segments("a", "A", [_seg(float(i), [1.0, i / 5.0]) for i in range(6)])
+        await store.upsert_segments("b", "B", [_seg(0.0, [0.2, 1.0])])
+        many = await store.search_many(queries, 3, None)
+        scoped = await store.search_many(queries, 3, "b")
+        singles = [await store.search(q, 3, None) for q in queries]
+        return many, scoped, singles
+
+    many, scoped, singles = asyncio.run(run())
+    assert [[(d["video_id"], d["start_time"]) for d in r] for r in many] == [
+        [(d["video_id"], d["start_time"]) for d in r] for r in singles
+    ]
+    assert all(len(r) == 1 and r[0]["video_id"] == "b" for r in scoped)
+
+
+def test_mongo_search_many_scans_once(fake_mongo_store):
+    store = fake_mongo_store
+    col = store.col
+
+    async def run():
+        await store.upsert_segments("v", "V", [_seg(float(i), [1.0, i / 10.0]) for i in range(10)])
+        col.find_calls.clear()
+        return await store.search_many([[1.0, 0.0], [0.0, 1.0]], 2, "v")
+
+    first, second = asyncio.run(run())
+    assert [d["start_time"] for d in first] == [0.0, 1.0]
+    assert [d["start_time"] for d in second] == [9.0, 8.0]
+    scan, hydrate = col.find_calls
+    assert scan["projection"] == {"embedding": 1}
+    assert len(hydrate["query"]["_id"]["$in"]) == 4
+
+
+def test_atlas_vector_search_filters_inside_first_stage(fake_atlas_store):
+    from app.services.filters import SegmentFilter
+
+    store = fake_atlas_store
+    col = store.col
+
+    async def run():
+        await store.upsert_segments("v", "V", [_seg(float(i * 10), [1.0, i / 10.0]) for i in range(10)])
+        await store.upsert_segments("w", "W", [_seg(0.0, [1.0, 0.0])])
+        col.find_calls.clear()
+        scoped = await store.search([1.0, 0.0], 3, "v")
+        ranged = await store.search([1.0, 0.0], 3, None, SegmentFilter(video_ids=("v", "w"), t_from=35.0, t_to=60.0))
+        return scoped, ranged
+
+    scoped, ranged = asyncio.run(run())
+    # stayed on the indexed path: no fallback scan
+    assert col.find_calls == []
+    assert [d["start_time"] for d in scoped] == [0.0, 10.0, 20.0]
+    assert [d["start_time"] for d in ranged] == [30.0, 40.0, 50.0]
+    first, second = col.aggregate_calls
+    assert all(next(iter(p[0])) == "$vectorSearch" for p in col.aggregate_calls)
+    assert first[0]["$vectorSearch"]["filter"] == {"video_id": {"$eq": "v"}}
+    assert second[0]["$vectorSearch"]["numCandidates"] >= second[0]["$vectorSearch"]["limit"]
+
+
+def test_memory_store_filters_by_videos_and_time():
+    from app.services.filters import SegmentFilter
+
+    store = db.InMemoryStore()
+
+    async def run():
+        await store.upsert_segments("a", "A", [_seg(float(i * 10), [1.0, 0.0]) for i in range(6)])
+        await store.upsert_segments("b", "B", [_seg(0.0, [1.0, 0.0])])
+        await store.upsert_segments("c", "C", [_seg(20.0, [1.0, 0.0])])
+        f = SegmentFilter(video_ids=("a", "c"), t_from=15.0, t_to=30.0)
+        return await store.search([1.0, 0.0], 10, None, f), await store.search_many([[1.0, 0.0]], 10, "a", f)
+
+    hits, (scoped,) = asyncio.run(run())
+    assert sorted((d["video_id"], d["start_time"]) for d in hits) == [("a", 10.0), ("a", 20.0), ("a", 30.0), ("c", 20.0)]
+    assert sorted(d["start_time"] for d in scoped) == [10.0, 20.0, 30.0]
+
+
+def test_search_hits_are_lean_unless_embedding_requested(fake_atlas_store, fake_mongo_store):
+    mem = db.InMemoryStore()
+
+    async def run():
+        out = {}
+        for name, store in (("atlas", fake_atlas_store), ("scan", fake_mongo_store), ("memory", mem)):
+            await store.upsert_segments("v", "V", [_seg(0.0, [1.0, 0.0]), _seg(10.0, [0.0, 1.0])])
+            out[name] = (await store.search([1.0, 0.0], 2, "v"), await store.search([1.0, 0.0], 1, "v", with_embedding=True))
+        return out
+
+    for name, (lean, full) in asyncio.run(run()).items():
+        assert set(lean[0]) <= set(db.RESULT_FIELDS) | {"score"}, name
+        assert lean[0]["start_time"] == 0.0 and "text" in lean[0]
+        assert [round(x, 5) for x in full[0]["embedding"]] == [1.0, 0.0], name
+    project = fake_atlas_store.col.aggregate_calls[0][1]["$project"]
+    assert project["_id"] == 0 and "embedding" not in project
@@ -0,0 +1,59 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.services import tracing
+from app.services.metrics import snapshot
+
+
+def test_span_records_on_current_trace_and_histogram():
+    async def run():
+        token = tracing.start_trace()
+        try:
+            with tracing.span("unit_stage"):
+                await asyncio.sleep(0)
+            # child tasks inherit the trace
+            async def child():
+                with tracing.span("unit_stage"):
+                    pass
+            await asyncio.gather(child(), child())
+            return tracing.current_trace()
+        finally:
+            tracing.end_trace(token)
+
+    trace = asyncio.run(run())
+    assert set(trace.timings) == {"unit_stage"}
+    assert trace.timings["unit_stage"] >= 0
+    assert tracing.current_trace() is None
+    assert snapshot()["histograms"]["stage_ms:unit_stage"]["count"] >= 3
+
+    header = trace.server_timing(12.5)
+    assert header.startswith("unit_stage;dur=")
+    assert header.endswith("total;dur=12.5")
+
+
+def test_span_without_trace_only_feeds_histogram():
+    with tracing.span("orphan_stage"):
+        pass
+    assert tracing.current_timings() == {}
+    assert "stage_ms:orphan_stage" in snapshot()["histograms"]
+
+
+def test_search_returns_timings_and_server_timing(monkeypatch):
+    from app.main import app
+
+    async def fake_search(query, **kwargs):
+        with tracing.span("retrieve"):
+            pass
+        return []
+
+    monkeypatch.setattr("app.api.routes.semantic_search", fake_search)
+    with TestClient(app) as client:
+        r = client.post("/api/search_timestamps", json={"query": "anything", "debug": True})
+        assert r.status_code == 200
+        body = r.json()
+        assert "retrieve" in body["timings"]
+        assert "retrieve;dur=" in r.headers["Server-Timing"]
+
+        r = client.post("/api/search_timestamps", json={"query": "anything"})
+        assert r.json()["timings"] is None
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services.transcript import _silence_split_points
+
+
+def test_silence_split_points_land_in_gaps():
+    sr = 100
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-1.0, 1.0, sr * 100).astype(np.float32)
+    # quiet gaps around 28s and 61s
+    for gap in (28, 61):
+        audio[gap * sr : (gap + 1) * sr] = 0.0
+
+    cuts = _silence_split_points(audio, sr, target_s=30.0, search_s=5.0, frame_s=0.1)
+    assert len(cuts) == 2
+    assert 28 * sr <= cuts[0] < 29 * sr
+    assert 61 * sr <= cuts[1] < 62 * sr
+
+
+def test_short_audio_is_not_split():
+    audio = np.ones(4000, dtype=np.float32)
+    assert _silence_split_points(audio, 100, target_s=30.0) == []
+
+
+def test_whisper_workers_share_cores_with_ingest_pool(monkeypatch):
+    from app.services import transcript
+
+    monkeypatch.setattr(transcript.os, "cpu_count", lambda: 16)
+    monkeypatch.setattr(transcript, "_cuda_available", lambda: False)
+    monkeypatch.setattr(transcript.settings, "INGEST_WORKERS", 4)
+    monkeypatch.setattr(transcript.settings, "INGEST_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(transcript.settings, "WHISPER_WORKERS", 0)
+    assert transcript._whisper_workers() == 8  # 2 concurrent transcriptions x 8 = 16 cores
+    monkeypatch.setattr(transcript.settings, "WHISPER_WORKERS", 32)
+    assert transcript._whisper_workers() == 8
+    monkeypatch.setattr(transcript, "_cuda_available", lambda: True)
+    assert transcript._whisper_workers() == 1
@@ -2,11 +2,24 @@ import axios from "axios";
 
 const API_BASE = "http://localhost:8000/api";
 
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+
+// Ingest runs as a background job; poll its status until it finishes.
+async function waitForIngestJob(jobId, intervalMs = 1000) {
+  for (;;) {
+    const res = await axios.get(`${API_BASE}/ingest_jobs/${jobId}`);
+    if (res.data.status === "done") return res.data;
+    if (res.data.status === "failed") throw new Error(res.data.error || "ingest failed");
+    await sleep(intervalMs);
+  }
+}
+
 
 export function useApi() {
   return {
     ingestVideo: async (url) => {
       const res = await axios.post(`${API_BASE}/ingest_video`, { video_url: url });
+      if (res.data.job_id) await waitForIngestJob(res.data.job_id);
       return res.data;
     },
     searchTimestamps: async ({ query, k, video_id }) => {